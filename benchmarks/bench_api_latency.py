@@ -0,0 +1,88 @@
+"""
+Compare query latency of the warm HTTP service with a cold CLI run.
+
+Every CLI run (python -m src.main --query ...) loads the embedding model,
+connects to Milvus and builds the pipeline before answering. The service
+(python -m src.api.app) does that once at startup; after it reports
+healthy, the same query is sent to /query repeatedly. Both paths answer
+the same query against the same collection, so the difference is the
+per-process startup cost.
+
+Needs a running Milvus and the configured models, like the CLI itself.
+
+Usage:
+    python -m benchmarks.bench_api_latency --runs 5 --query "What is retrieval-augmented generation?"
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import subprocess
+import statistics
+import httpx
+
+
+def free_port() -> int:
+    """Return a TCP port that is free on localhost."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def summarize(name: str, seconds: list):
+    """Print the mean, median and worst of a list of latencies."""
+    print(f"{name:<14}{len(seconds):>6}{statistics.mean(seconds):>10.2f}{statistics.median(seconds):>10.2f}"
+          f"{max(seconds):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark warm API requests against cold CLI queries")
+    parser.add_argument("--runs", type=int, default=5, help="Queries per mode")
+    parser.add_argument("--query", default="What is retrieval-augmented generation?", help="Query to send")
+    parser.add_argument("--startup-timeout", type=float, default=600, help="Seconds to wait for the service")
+    args = parser.parse_args()
+    
+    cold = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-m", "src.main", "--query", args.query],
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        cold.append(time.perf_counter() - start)
+        
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "src.api.app"], env=dict(os.environ, API_HOST="127.0.0.1",
+                              API_PORT=str(port)), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=None) as client:
+            while True:
+                if server.poll() is not None:
+                    raise RuntimeError("Service exited during startup")
+                if time.perf_counter() - start > args.startup_timeout:
+                    raise RuntimeError("Service did not become healthy in time")
+                try:
+                    if client.get("/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.2)
+            startup = time.perf_counter() - start
+            
+            warm = []
+            for _ in range(args.runs):
+                request_start = time.perf_counter()
+                client.post("/query", json={'query': args.query}).raise_for_status()
+                warm.append(time.perf_counter() - request_start)
+    finally:
+        server.terminate()
+        server.wait()
+        
+    print(f"Service startup (model load, Milvus connect, warm-up): {startup:.2f}s")
+    print(f"{'mode':<14}{'runs':>6}{'mean s':>10}{'p50 s':>10}{'max s':>10}")
+    summarize("cli (cold)", cold)
+    summarize("api (warm)", warm)
+
+
+if __name__ == "__main__":
+    main()
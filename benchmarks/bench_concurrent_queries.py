@@ -0,0 +1,92 @@
+"""
+Load test the blocking and async generation paths against a local stub endpoint.
+
+A stub Inference API answers every request after a fixed latency. The same
+number of queries is sent through LLMHandler.generate on a thread pool and
+through LLMHandler.agenerate on a single event loop, and the throughput of
+both is reported.
+
+Usage:
+    python -m benchmarks.bench_concurrent_queries --queries 500 --latency 0.5 --threads 16
+"""
+import json
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from src.generation.hf_client import HFInferenceClient
+from src.generation.llama_model import LlamaModel
+from src.generation.llm_handler import LLMHandler
+
+
+def start_stub(latency: float) -> ThreadingHTTPServer:
+    """Start a stub endpoint that answers after latency seconds."""
+    body = json.dumps([{"generated_text": "stub answer"}]).encode()
+    
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            
+        def log_message(self, *args):
+            pass
+            
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler, bind_and_activate=False)
+    server.request_queue_size = 4096
+    server.server_bind()
+    server.server_activate()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark blocking vs async query generation")
+    parser.add_argument("--queries", type=int, default=500, help="Number of queries per mode")
+    parser.add_argument("--latency", type=float, default=0.5, help="Stub endpoint latency in seconds")
+    parser.add_argument("--threads", type=int, default=16, help="Thread pool size for the blocking mode")
+    parser.add_argument("--concurrency", type=int, default=500, help="Maximum in-flight queries in async mode")
+    args = parser.parse_args()
+    
+    server = start_stub(args.latency)
+    api_base = f"http://127.0.0.1:{server.server_address[1]}"
+    client = HFInferenceClient("stub-model", api_base=api_base, pool_size=args.threads,
+                               async_max_connections=args.concurrency)
+    handler = LLMHandler(primary_model=LlamaModel("stub-model", client=client))
+    
+    print(f"{'mode':<10}{'queries':>9}{'in-flight':>11}{'seconds':>10}{'queries/s':>11}")
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(lambda i: handler.generate(f"query {i}", []), range(args.queries)))
+    seconds = time.perf_counter() - start
+    print(f"{'threads':<10}{args.queries:>9}{args.threads:>11}{seconds:>10.2f}{args.queries / seconds:>11.1f}")
+    
+    async def run_async():
+        limit = asyncio.Semaphore(args.concurrency)
+        
+        async def query(i):
+            async with limit:
+                return await handler.agenerate(f"query {i}", [])
+                
+        await asyncio.gather(*(query(i) for i in range(args.queries)))
+        await client.aclose()
+        
+    start = time.perf_counter()
+    asyncio.run(run_async())
+    seconds = time.perf_counter() - start
+    print(f"{'async':<10}{args.queries:>9}{args.concurrency:>11}{seconds:>10.2f}{args.queries / seconds:>11.1f}")
+    
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark HTML extraction backends in pages per second.
+
+Generates a corpus of synthetic web pages with navigation, scripts, styles and
+footers around the main content, extracts each page with every installed
+backend and checks the output against the html.parser reference.
+
+Usage:
+    python -m benchmarks.bench_html_extractors --pages 2000 --page-kb 40
+"""
+import time
+import random
+import argparse
+from src.utils.html_extractor import get_extractor, available_backends
+
+
+def make_page(index: int, size: int, rng: random.Random) -> str:
+    """Build one page of roughly size bytes."""
+    parts = [
+        f"<html><head><title>Page {index} &amp; friends</title>",
+        "<style>body { font-family: sans-serif } .nav a { margin: 4px }</style>",
+        "<script>window.dataLayer = window.dataLayer || [];</script></head><body>",
+        "<nav class='nav'>" + "".join(f"<a href='/section/{i}'>Section {i}</a>" for i in range(20)) + "</nav>",
+        "<main>"
+    ]
+    length = sum(len(part) for part in parts)
+    paragraph = 0
+    while length < size:
+        words = " ".join(f"word{rng.randrange(5000)}" for _ in range(rng.randrange(20, 80)))
+        part = (f"<h2>Heading {paragraph}</h2><p>{words} <b>bold {paragraph}</b> and "
+                f"<a href='/p/{index}/{paragraph}'>a link</a>.</p>"
+                f"<script>track({paragraph});</script>\n")
+        parts.append(part)
+        length += len(part)
+        paragraph += 1
+    parts.append("</main><footer>Copyright &copy; Example</footer></body></html>")
+    return "".join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML extraction backends")
+    parser.add_argument("--pages", type=int, default=2000, help="Number of pages in the corpus")
+    parser.add_argument("--page-kb", type=float, default=40, help="Approximate size of each page in KB")
+    args = parser.parse_args()
+    
+    rng = random.Random(0)
+    pages = [make_page(i, int(args.page_kb * 1024), rng) for i in range(args.pages)]
+    megabytes = sum(len(page) for page in pages) / (1024 * 1024)
+    
+    reference_extract = get_extractor('html.parser')
+    reference = None
+    
+    print(f"{'backend':<14}{'pages':>8}{'seconds':>10}{'pages/s':>10}{'MB/s':>10}{'mismatches':>12}")
+    for backend in reversed(available_backends()):
+        extract = get_extractor(backend)
+        start = time.perf_counter()
+        results = [extract(page) for page in pages]
+        seconds = time.perf_counter() - start
+        
+        if reference is None:
+            reference = results if extract is reference_extract else [reference_extract(page) for page in pages]
+        mismatches = sum(1 for result, expected in zip(results, reference) if result != expected)
+        
+        print(f"{backend:<14}{len(pages):>8}{seconds:>10.2f}{len(pages) / seconds:>10.1f}"
+              f"{megabytes / seconds:>10.1f}{mismatches:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Compare dense, sparse (BM25) and hybrid retrieval on an identifier-heavy corpus.
+
+A fixture corpus of support notes is generated, each note mentioning an
+error code, a part number or a function name among filler prose about
+similar topics. Every query asks about one identifier, and the note that
+defines it is the only correct answer. For each mode, recall@k (share of
+queries whose note is in the top k) and per-query latency are reported.
+
+Dense search uses the configured embedding model with an in-memory cosine
+search standing in for Milvus, so no Milvus server is needed.
+
+Usage:
+    python -m benchmarks.bench_hybrid_retrieval --documents 5000 --queries 300 --top-k 5
+    python -m benchmarks.bench_hybrid_retrieval --modes sparse
+"""
+import time
+import random
+import argparse
+import numpy as np
+from typing import List, Dict, Any
+from src.retrieval.sparse_index import BM25Index
+
+TOPICS = ["license server", "sync agent", "disk controller", "backup job", "auth gateway",
+          "print spooler", "cache node", "report builder", "upload queue", "billing export"]
+SYMPTOMS = ["stops responding", "rejects the request", "logs a warning", "retries forever",
+            "fails at startup", "returns stale data", "drops the connection", "runs out of memory"]
+FIXES = ["restart the service", "renew the certificate", "clear the local cache", "upgrade the firmware",
+         "increase the timeout", "re-run the migration", "rotate the credentials", "free disk space"]
+VERBS = ["parse", "flush", "sync", "resolve", "validate", "encode", "merge", "dispatch"]
+NOUNS = ["header", "batch", "token", "manifest", "record", "segment", "ledger", "payload"]
+
+
+def build_corpus(count: int, seed: int) -> List[Dict[str, Any]]:
+    """Generate support notes, each defining one unique identifier."""
+    rng = random.Random(seed)
+    documents = []
+    identifiers = set()
+    while len(documents) < count:
+        kind = rng.randrange(3)
+        if kind == 0:
+            identifier = f"E{rng.randrange(1000, 100000)}"
+        elif kind == 1:
+            identifier = f"PN-{rng.randrange(1000, 10000)}-{rng.choice('ABCDEFGH')}"
+        else:
+            identifier = f"{rng.choice(VERBS)}_{rng.choice(NOUNS)}_v{rng.randrange(1, 10)}"
+        if identifier in identifiers:
+            continue
+        identifiers.add(identifier)
+        
+        topic, symptom, fix = rng.choice(TOPICS), rng.choice(SYMPTOMS), rng.choice(FIXES)
+        subject = {0: f"Error {identifier}", 1: f"Part {identifier}", 2: f"The function {identifier}"}[kind]
+        content = (f"{subject} is reported when the {topic} {symptom}. To resolve it, {fix}. "
+                   f"If the {rng.choice(TOPICS)} still {rng.choice(SYMPTOMS)}, {rng.choice(FIXES)} as well.")
+        documents.append({'source': f"notes/{len(documents)}.txt", 'content': content,
+                          'metadata': {'chunk_index': 0}, 'identifier': identifier})
+    return documents
+
+
+def build_queries(documents: List[Dict[str, Any]], count: int, seed: int) -> List[Dict[str, Any]]:
+    """Ask about the identifier of randomly chosen notes."""
+    rng = random.Random(seed + 1)
+    templates = ["What does {} mean?", "How do I fix {}?", "{} keeps happening", "Where is {} used?"]
+    return [{'query': rng.choice(templates).format(document['identifier']), 'source': document['source']}
+            for document in rng.sample(documents, min(count, len(documents)))]
+
+
+class MemoryStorage:
+    """Brute-force cosine search over embedded documents, with the MilvusStorage.search interface."""
+    
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+        vectors = np.asarray([document['embedding'] for document in documents], dtype=np.float32)
+        self.vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        
+    def search(self, query_embedding: List[float], top_k: int = 5,
+               include_embeddings: bool = False) -> List[Dict[str, Any]]:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        scores = self.vectors @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        best = np.argsort(-scores)[:top_k]
+        return [{'id': int(i), 'source': self.documents[i]['source'], 'content': self.documents[i]['content'],
+                 'metadata': self.documents[i]['metadata'], 'score': float(scores[i])} for i in best]
+
+
+def run(name: str, search, queries: List[Dict[str, Any]], top_k: int):
+    """Time one search function over all queries and print recall and latency."""
+    hits = 0
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        results = search(query['query'], top_k)
+        latencies.append(time.perf_counter() - start)
+        hits += any(result['source'] == query['source'] for result in results[:top_k])
+    latencies = np.asarray(latencies) * 1000
+    print(f"{name:<8}{hits / len(queries):>11.3f}{np.percentile(latencies, 50):>10.2f}"
+          f"{np.percentile(latencies, 95):>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dense, sparse and hybrid retrieval")
+    parser.add_argument("--documents", type=int, default=5000, help="Number of notes in the corpus")
+    parser.add_argument("--queries", type=int, default=300, help="Number of identifier queries")
+    parser.add_argument("--top-k", type=int, default=5, help="Results per query")
+    parser.add_argument("--modes", default="dense,sparse,hybrid", help="Comma-separated modes to run")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed of the fixture corpus")
+    args = parser.parse_args()
+    modes = args.modes.split(",")
+    
+    documents = build_corpus(args.documents, args.seed)
+    queries = build_queries(documents, args.queries, args.seed)
+    
+    start = time.perf_counter()
+    index = BM25Index(path=None)
+    index.add(documents)
+    print(f"Indexed {len(documents)} notes in {time.perf_counter() - start:.2f}s: {index.stats()}")
+    
+    retriever = None
+    if "dense" in modes or "hybrid" in modes:
+        # Imported here, so the sparse mode runs without the embedding model installed
+        from src.ingestion.embedding_generator import EmbeddingGenerator
+        from src.retrieval.retriever import Retriever
+        embedder = EmbeddingGenerator()
+        retriever = Retriever(embedder, MemoryStorage(embedder.generate(documents)), index)
+        
+    print(f"{'mode':<8}{'recall@' + str(args.top_k):>11}{'p50 ms':>10}{'p95 ms':>10}")
+    if "dense" in modes:
+        run("dense", lambda query, k: retriever.retrieve(query, k, hybrid=False), queries, args.top_k)
+    if "sparse" in modes:
+        run("sparse", index.search, queries, args.top_k)
+    if "hybrid" in modes:
+        run("hybrid", lambda query, k: retriever.retrieve(query, k, hybrid=True), queries, args.top_k)
+
+
+if __name__ == "__main__":
+    main()
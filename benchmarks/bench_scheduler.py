@@ -0,0 +1,97 @@
+"""
+Measure query latency while a bulk ingest competes for the same resources.
+
+The embedding model and Milvus are simulated as a resource with a fixed
+number of slots: an ingestion batch holds a slot for --batch-ms and a
+query for --query-ms. Ingestion threads submit batches back to back
+while queries arrive at --rate per second. Three setups are compared:
+
+    idle      queries alone
+    fifo      queries and ingestion batches served first come, first served
+    priority  the PriorityScheduler: queries first, ingestion capped below capacity
+
+Usage:
+    python -m benchmarks.bench_scheduler --seconds 5 --ingest-threads 8 --rate 50
+"""
+import time
+import random
+import argparse
+import threading
+import numpy as np
+from typing import Tuple
+from src.utils.scheduler import PriorityScheduler, QUERY, INGEST
+
+
+def run(scheduler: PriorityScheduler, ingest_class: str, args: argparse.Namespace,
+        ingest: bool) -> Tuple[np.ndarray, int]:
+    """Return the query latencies in ms and the number of ingestion batches of one run."""
+    stop = threading.Event()
+    lock = threading.Lock()
+    batches = [0]
+    
+    def ingest_worker():
+        while not stop.is_set():
+            with scheduler.slot(ingest_class):
+                time.sleep(args.batch_ms / 1000)
+            with lock:
+                batches[0] += 1
+                
+    workers = [threading.Thread(target=ingest_worker) for _ in range(args.ingest_threads if ingest else 0)]
+    for worker in workers:
+        worker.start()
+        
+    latencies = []
+    
+    def query():
+        start = time.perf_counter()
+        with scheduler.slot(QUERY):
+            time.sleep(args.query_ms / 1000)
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+            
+    rng = random.Random(args.seed)
+    queries = []
+    end = time.perf_counter() + args.seconds
+    while time.perf_counter() < end:
+        thread = threading.Thread(target=query)
+        thread.start()
+        queries.append(thread)
+        time.sleep(rng.expovariate(args.rate))
+        
+    stop.set()
+    for thread in queries + workers:
+        thread.join()
+    return np.asarray(latencies), batches[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark query latency under a concurrent bulk ingest")
+    parser.add_argument("--seconds", type=float, default=5, help="Duration of each run")
+    parser.add_argument("--capacity", type=int, default=4, help="Concurrent slots of the shared resource")
+    parser.add_argument("--ingest-limit", type=int, default=2, help="Slots ingestion may hold with priorities")
+    parser.add_argument("--ingest-threads", type=int, default=8, help="Threads submitting ingestion batches")
+    parser.add_argument("--batch-ms", type=float, default=200, help="Time an ingestion batch holds a slot")
+    parser.add_argument("--query-ms", type=float, default=10, help="Time a query holds a slot")
+    parser.add_argument("--rate", type=float, default=50, help="Queries per second")
+    parser.add_argument("--seed", type=int, default=7, help="Random seed of query arrivals")
+    args = parser.parse_args()
+    
+    unbounded = {QUERY: 0, INGEST: 0}
+    setups = [
+        ("idle", PriorityScheduler(args.capacity, {QUERY: args.capacity}, unbounded), QUERY, False),
+        # One class for both workloads: a plain FIFO over the slots
+        ("fifo", PriorityScheduler(args.capacity, {QUERY: args.capacity}, unbounded, priorities=(QUERY,)),
+         QUERY, True),
+        ("priority", PriorityScheduler(args.capacity, {QUERY: args.capacity, INGEST: args.ingest_limit},
+                                       unbounded), INGEST, True)
+    ]
+    
+    print(f"{'setup':<10}{'queries':>8}{'p50 ms':>10}{'p99 ms':>10}{'batches/s':>11}")
+    for name, scheduler, ingest_class, ingest in setups:
+        latencies, batches = run(scheduler, ingest_class, args, ingest)
+        print(f"{name:<10}{len(latencies):>8}{np.percentile(latencies, 50):>10.1f}"
+              f"{np.percentile(latencies, 99):>10.1f}{batches / args.seconds:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
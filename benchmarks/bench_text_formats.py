@@ -0,0 +1,101 @@
+"""
+Benchmark TextProcessor throughput and chunk counts per structured text format.
+
+Generates synthetic CSV, HTML, Markdown and XML files of a given size and runs
+each through its dedicated handler and through the generic plain text handler
+for comparison.
+
+Usage:
+    python -m benchmarks.bench_text_formats --size-mb 20
+"""
+import os
+import time
+import argparse
+import tempfile
+from src.ingestion.text_processor import TextProcessor
+
+
+def write_csv(path: str, size: int):
+    with open(path, 'w') as f:
+        f.write("id,sku,name,description,price\n")
+        i = 0
+        while f.tell() < size:
+            f.write(f'{i},SKU-{i:08d},Widget {i},"A sturdy widget, model {i % 97}",{i % 1000}.99\n')
+            i += 1
+
+
+def write_html(path: str, size: int):
+    with open(path, 'w') as f:
+        f.write("<html><head><title>Benchmark page</title><style>p{color:red}</style></head><body>")
+        f.write("<nav><a href='/'>Home</a><a href='/docs'>Docs</a></nav><main>")
+        i = 0
+        while f.tell() < size:
+            f.write(f"<div class='section'><h2>Section {i}</h2><p>Paragraph {i} with <b>bold</b> "
+                    f"and <a href='/p/{i}'>a link</a>.</p><script>track({i});</script></div>\n")
+            i += 1
+        f.write("</main><footer>Copyright</footer></body></html>")
+
+
+def write_markdown(path: str, size: int):
+    with open(path, 'w') as f:
+        i = 0
+        while f.tell() < size:
+            f.write(f"# Chapter {i}\n\nIntroduction to chapter {i}.\n\n## Details\n\n"
+                    f"```python\n# code sample {i}\nprint({i})\n```\n\nSome more text about item {i}.\n\n")
+            i += 1
+
+
+def write_xml(path: str, size: int):
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<catalog>\n')
+        i = 0
+        while f.tell() < size:
+            f.write(f'  <item id="{i}"><name>Item {i}</name><category>C{i % 13}</category>'
+                    f'<description>Description of item {i}</description></item>\n')
+            i += 1
+        f.write('</catalog>\n')
+
+
+WRITERS = {
+    'csv': write_csv,
+    'html': write_html,
+    'md': write_markdown,
+    'xml': write_xml,
+}
+
+
+def run(processor: TextProcessor, path: str, generic: bool):
+    """Consume all documents for a file and return (seconds, chunk count)."""
+    start = time.perf_counter()
+    with open(path, 'rb') as f:
+        if generic:
+            documents = processor._process_as_text(f, path)
+        else:
+            documents = processor.iter_stream_documents(f, path)
+        count = sum(1 for _ in documents)
+    return time.perf_counter() - start, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark structured text handlers")
+    parser.add_argument("--size-mb", type=float, default=20, help="Size of each generated file in MB")
+    args = parser.parse_args()
+    
+    size = int(args.size_mb * 1024 * 1024)
+    processor = TextProcessor()
+    
+    print(f"{'format':<8}{'handler':<10}{'MB':>8}{'seconds':>10}{'MB/s':>10}{'chunks':>10}")
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for extension, writer in WRITERS.items():
+            path = os.path.join(temp_dir, f"bench.{extension}")
+            writer(path, size)
+            megabytes = os.path.getsize(path) / (1024 * 1024)
+            
+            for handler, generic in (('dedicated', False), ('generic', True)):
+                seconds, count = run(processor, path, generic)
+                print(f"{extension:<8}{handler:<10}{megabytes:>8.1f}{seconds:>10.2f}"
+                      f"{megabytes / seconds:>10.1f}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,6 @@ setup(
         "bs4",
         "pytesseract",
         "opencv-python",
-        "pydub",
         "speechrecognition",
         "fastapi",
         "uvicorn"
@@ -0,0 +1 @@
+# Empty __init__.py to make 'api' a proper package
\ No newline at end of file
@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import asyncio
+import uvicorn
+from contextlib import asynccontextmanager
+from typing import List, Dict, Any, Optional, Callable, AsyncIterator
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+from pydantic import BaseModel, Field
+from src.main import RAGSystem
+from src.utils.scheduler import BusyError
+from src.utils.logger import setup_logger
+from src.config import (
+    API_HOST, API_PORT, API_INGEST_CONCURRENCY, MAX_DOCUMENTS_RETURNED, QUERY_DEADLINE_SECONDS, CRAWL_MAX_DEPTH
+)
+
+logger = setup_logger(__name__)
+
+
+class QueryRequest(BaseModel):
+    """Body of /query and /query/stream."""
+    query: str = Field(..., min_length=1)
+    max_docs: int = Field(MAX_DOCUMENTS_RETURNED, ge=1, le=100)
+    deadline_seconds: float = Field(QUERY_DEADLINE_SECONDS, ge=0)
+
+
+class JobRequest(BaseModel):
+    """Body of /jobs: a server-side file or directory to ingest in the background."""
+    path: str
+    recursive: bool = True
+
+
+class IngestRequest(BaseModel):
+    """Body of /ingest: a server-side path, a single URL, or seed URLs and sitemaps to crawl."""
+    path: Optional[str] = None
+    recursive: bool = True
+    url: Optional[str] = None
+    urls: List[str] = []
+    sitemaps: List[str] = []
+    depth: int = Field(CRAWL_MAX_DEPTH, ge=0)
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def create_app(system_factory: Callable[[], RAGSystem] = RAGSystem) -> FastAPI:
+    """
+    Build the HTTP service around one long-lived RAGSystem.
+    
+    The system is created and warmed up once at startup, so requests do not
+    pay for loading the embedding model or connecting to Milvus. Queries run
+    on the event loop through the async pipeline, whose stages each admit a
+    bounded number of queries (QUERY_*_CONCURRENCY); ingestion requests are
+    limited to API_INGEST_CONCURRENCY at a time. Queries shed by the
+    scheduler because too many are waiting get a 503 with Retry-After.
+    Large ingestions go through /jobs instead, which run on background
+    workers started with the service and return progress while they run.
+    
+    Args:
+        system_factory: Builds the RAG system (default: RAGSystem)
+        
+    Returns:
+        The FastAPI application
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        start = time.perf_counter()
+        # Model loading and the Milvus connection block, so they run off the loop
+        system = await asyncio.to_thread(system_factory)
+        app.state.warm = False
+        try:
+            await asyncio.to_thread(system.warm_up)
+            app.state.warm = True
+        except Exception as e:
+            logger.error(f"Warm-up failed, first queries will be slow: {str(e)}")
+        app.state.system = system
+        app.state.ingest_slots = asyncio.Semaphore(API_INGEST_CONCURRENCY)
+        app.state.started = time.time()
+        system.start_jobs()
+        logger.info(f"API ready in {time.perf_counter() - start:.2f}s")
+        yield
+        # Running jobs stop at their next batch and resume on the next start
+        await asyncio.to_thread(system.stop_jobs)
+        
+    app = FastAPI(title="RAG System", lifespan=lifespan)
+    
+    @app.exception_handler(BusyError)
+    async def busy(request: Request, exc: BusyError) -> JSONResponse:
+        """Ask clients to retry shortly instead of queueing more requests."""
+        return JSONResponse(status_code=503, content={'detail': str(exc)}, headers={'Retry-After': '1'})
+        
+    @app.post("/query")
+    async def query(body: QueryRequest, request: Request) -> Dict[str, Any]:
+        """Answer a query with the retrieved documents and any degradations applied."""
+        return await request.app.state.system.aquery(body.query, body.max_docs, body.deadline_seconds)
+        
+    @app.post("/query/stream")
+    async def query_stream(body: QueryRequest, request: Request) -> StreamingResponse:
+        """
+        Stream an answer as server-sent events.
+        
+        A 'documents' event carries the retrieved documents, 'token' events
+        the response as it is generated, and a final 'done' event ends it.
+        """
+        result = await request.app.state.system.aquery_stream(body.query, body.max_docs)
+        
+        async def events() -> AsyncIterator[str]:
+            yield sse_event("documents", {'query': result['query'], 'documents': result['documents']})
+            async for token in result['response_stream']:
+                yield sse_event("token", {'token': token})
+            yield sse_event("done", {})
+            
+        return StreamingResponse(events(), media_type="text/event-stream",
+                                 headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+    @app.post("/ingest")
+    async def ingest(body: IngestRequest, request: Request) -> Dict[str, Any]:
+        """Ingest a file or directory on the server, a URL, or a crawl, and return the ingestion stats."""
+        crawl = bool(body.urls or body.sitemaps)
+        if sum([body.path is not None, body.url is not None, crawl]) != 1:
+            raise HTTPException(status_code=400, detail="Give exactly one of path, url or urls/sitemaps")
+        if body.path is not None and not os.path.exists(body.path):
+            raise HTTPException(status_code=404, detail=f"Path not found: {body.path}")
+            
+        system = request.app.state.system
+        async with request.app.state.ingest_slots:
+            if body.path is not None:
+                return await asyncio.to_thread(system.ingest_documents, body.path, body.recursive)
+            if body.url is not None:
+                return await asyncio.to_thread(system.ingest_url, body.url)
+            return await system.acrawl(body.urls, body.sitemaps, body.depth)
+            
+    @app.post("/jobs")
+    async def submit_job(body: JobRequest, request: Request) -> Dict[str, Any]:
+        """Queue an ingestion job and return its ID."""
+        if not os.path.exists(body.path):
+            raise HTTPException(status_code=404, detail=f"Path not found: {body.path}")
+        return {'job_id': await asyncio.to_thread(request.app.state.system.submit_ingest, body.path, body.recursive)}
+        
+    @app.get("/jobs")
+    async def list_jobs(request: Request) -> List[Dict[str, Any]]:
+        """List recent ingestion jobs, newest first."""
+        return await asyncio.to_thread(request.app.state.system.list_jobs)
+        
+    @app.get("/jobs/{job_id}")
+    async def job_status(job_id: int, request: Request) -> Dict[str, Any]:
+        """Return the status, stats, live progress (files, chunks/s, ETA) and failed sources of a job."""
+        job = await asyncio.to_thread(request.app.state.system.job_status, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"No ingestion job {job_id}")
+        return job
+        
+    @app.delete("/jobs/{job_id}")
+    async def cancel_job(job_id: int, request: Request) -> Dict[str, Any]:
+        """Cancel a queued or running job; a running one stops after its current batch."""
+        system = request.app.state.system
+        if await asyncio.to_thread(system.job_status, job_id) is None:
+            raise HTTPException(status_code=404, detail=f"No ingestion job {job_id}")
+        return {'job_id': job_id, 'cancelled': await asyncio.to_thread(system.cancel_job, job_id)}
+        
+    @app.get("/health")
+    async def health(request: Request) -> Dict[str, Any]:
+        """Report component state, model breakers and latencies, and cache statistics."""
+        state = request.app.state
+        return dict(state.system.health(), warm=state.warm, uptime_seconds=time.time() - state.started)
+        
+    return app
+
+
+def serve(host: str = API_HOST, port: int = API_PORT):
+    """
+    Run the service with uvicorn in this process.
+    
+    A single worker keeps one copy of the embedding model and one set of
+    caches; concurrency comes from the event loop.
+    
+    Args:
+        host: Interface to listen on
+        port: Port to listen on
+    """
+    uvicorn.run(create_app(), host=host, port=port)
+
+
+if __name__ == "__main__":
+    serve()
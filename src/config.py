@@ -19,6 +19,34 @@ EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM
 PRIMARY_LLM_MODEL = os.getenv("PRIMARY_LLM_MODEL", "meta-llama/Llama-3.3-70B")
 BACKUP_LLM_MODEL = os.getenv("BACKUP_LLM_MODEL", "deepseek-ai/deepseek-coder-33b-instruct")
 
+# LLM HTTP Client
+HF_API_BASE_URL = os.getenv("HF_API_BASE_URL", "https://api-inference.huggingface.co/models")
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "1"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "10"))
+LLM_ASYNC_MAX_CONNECTIONS = int(os.getenv("LLM_ASYNC_MAX_CONNECTIONS", "400"))
+LLM_ASYNC_POOL_SHARDS = int(os.getenv("LLM_ASYNC_POOL_SHARDS", "8"))
+
+# LLM Hedging
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+LLM_HEDGE_QUANTILE = float(os.getenv("LLM_HEDGE_QUANTILE", "0.95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "10"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_WORKERS = int(os.getenv("LLM_HEDGE_WORKERS", "32"))
+LLM_LATENCY_WINDOW = int(os.getenv("LLM_LATENCY_WINDOW", "500"))
+
+# LLM Circuit Breaker
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))
+LLM_BREAKER_SLOW_CALL_SECONDS = float(os.getenv("LLM_BREAKER_SLOW_CALL_SECONDS", "30"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "30"))
+LLM_BREAKER_HALF_OPEN_CALLS = int(os.getenv("LLM_BREAKER_HALF_OPEN_CALLS", "3"))
+
 # Logging
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 LOG_FILE = os.getenv("LOG_FILE", "rag_system.log")
@@ -27,6 +55,14 @@ LOG_FILE = os.getenv("LOG_FILE", "rag_system.log")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
 MAX_DOCUMENTS_RETURNED = int(os.getenv("MAX_DOCUMENTS_RETURNED", "5"))
+RETRIEVAL_MMR_ENABLED = os.getenv("RETRIEVAL_MMR_ENABLED", "false").lower() == "true"
+RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))
+RETRIEVAL_MMR_FETCH_FACTOR = int(os.getenv("RETRIEVAL_MMR_FETCH_FACTOR", "4"))
+RETRIEVAL_NEIGHBOUR_CHUNKS = int(os.getenv("RETRIEVAL_NEIGHBOUR_CHUNKS", "0"))
+RETRIEVAL_HYBRID_ENABLED = os.getenv("RETRIEVAL_HYBRID_ENABLED", "true").lower() == "true"
+RETRIEVAL_HYBRID_FETCH_FACTOR = int(os.getenv("RETRIEVAL_HYBRID_FETCH_FACTOR", "2"))
+RETRIEVAL_RRF_K = int(os.getenv("RETRIEVAL_RRF_K", "60"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
 
 # Temp Directory
 TEMP_DIR = os.getenv("TEMP_DIR", "temp")
@@ -34,4 +70,89 @@ os.makedirs(TEMP_DIR, exist_ok=True)
 
 # API Configuration
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
-API_PORT = int(os.getenv("API_PORT", "8000"))
\ No newline at end of file
+API_PORT = int(os.getenv("API_PORT", "8000"))
+API_INGEST_CONCURRENCY = int(os.getenv("API_INGEST_CONCURRENCY", "1"))
+QUERY_EMBED_CONCURRENCY = int(os.getenv("QUERY_EMBED_CONCURRENCY", "4"))
+QUERY_RETRIEVAL_CONCURRENCY = int(os.getenv("QUERY_RETRIEVAL_CONCURRENCY", "16"))
+QUERY_GENERATION_CONCURRENCY = int(os.getenv("QUERY_GENERATION_CONCURRENCY", "64"))
+
+# Archive Processing
+ARCHIVE_MAX_DEPTH = int(os.getenv("ARCHIVE_MAX_DEPTH", "2"))
+ARCHIVE_WORKERS = int(os.getenv("ARCHIVE_WORKERS", "4"))
+SPOOL_MAX_MEMORY = int(os.getenv("SPOOL_MAX_MEMORY", str(64 * 1024 * 1024)))
+
+# PDF Processing
+PDF_PARALLEL_PAGE_THRESHOLD = int(os.getenv("PDF_PARALLEL_PAGE_THRESHOLD", "50"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+
+# OCR
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+OCR_MAX_WIDTH = int(os.getenv("OCR_MAX_WIDTH", "2500"))
+OCR_TILE_HEIGHT = int(os.getenv("OCR_TILE_HEIGHT", "2000"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(TEMP_DIR, "ocr_cache"))
+
+# Audio Transcription
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+TRANSCRIPTION_WORKERS = int(os.getenv("TRANSCRIPTION_WORKERS", "4"))
+AUDIO_SILENCE_THRESHOLD_DB = float(os.getenv("AUDIO_SILENCE_THRESHOLD_DB", "-40"))
+AUDIO_MIN_SILENCE_MS = int(os.getenv("AUDIO_MIN_SILENCE_MS", "500"))
+AUDIO_MAX_SEGMENT_SECONDS = float(os.getenv("AUDIO_MAX_SEGMENT_SECONDS", "30"))
+
+# Web Crawling
+CRAWL_MAX_DEPTH = int(os.getenv("CRAWL_MAX_DEPTH", "1"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "500"))
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "16"))
+CRAWL_DOMAIN_CONCURRENCY = int(os.getenv("CRAWL_DOMAIN_CONCURRENCY", "4"))
+CRAWL_DOMAIN_RATE_LIMIT = float(os.getenv("CRAWL_DOMAIN_RATE_LIMIT", "5"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "10"))
+HTML_EXTRACTOR_BACKEND = os.getenv("HTML_EXTRACTOR_BACKEND", "auto")
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.join(TEMP_DIR, "http_cache.sqlite3"))
+
+# Response Cache
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", os.path.join(TEMP_DIR, "response_cache.sqlite3"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "10000"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "86400"))
+RESPONSE_CACHE_ALLOW_SAMPLED = os.getenv("RESPONSE_CACHE_ALLOW_SAMPLED", "false").lower() == "true"
+
+# Semantic Cache
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+
+# Context Packing
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+
+# Sparse Index
+SPARSE_INDEX_ENABLED = os.getenv("SPARSE_INDEX_ENABLED", "true").lower() == "true"
+SPARSE_INDEX_PATH = os.getenv("SPARSE_INDEX_PATH", os.path.join(TEMP_DIR, "sparse_index"))
+SPARSE_INDEX_K1 = float(os.getenv("SPARSE_INDEX_K1", "1.2"))
+SPARSE_INDEX_B = float(os.getenv("SPARSE_INDEX_B", "0.75"))
+SPARSE_INDEX_SEARCH_WORKERS = int(os.getenv("SPARSE_INDEX_SEARCH_WORKERS", "8"))
+
+# Query Deadline
+# Time budget of a query in seconds (0 = no deadline)
+QUERY_DEADLINE_SECONDS = float(os.getenv("QUERY_DEADLINE_SECONDS", "0"))
+DEADLINE_FAST_RETRIEVAL_SECONDS = float(os.getenv("DEADLINE_FAST_RETRIEVAL_SECONDS", "0.5"))
+DEADLINE_SEARCH_EF = int(os.getenv("DEADLINE_SEARCH_EF", "16"))
+DEADLINE_SEMANTIC_CACHE_THRESHOLD = float(os.getenv("DEADLINE_SEMANTIC_CACHE_THRESHOLD", "0.85"))
+
+# Query Coalescing
+QUERY_COALESCING_ENABLED = os.getenv("QUERY_COALESCING_ENABLED", "true").lower() == "true"
+
+# Scheduler
+# Slots of the embedding model and Milvus shared by queries and ingestion
+SCHEDULER_CAPACITY = int(os.getenv("SCHEDULER_CAPACITY", "4"))
+SCHEDULER_QUERY_CONCURRENCY = int(os.getenv("SCHEDULER_QUERY_CONCURRENCY", "4"))
+SCHEDULER_QUERY_QUEUE = int(os.getenv("SCHEDULER_QUERY_QUEUE", "64"))
+SCHEDULER_INGEST_CONCURRENCY = int(os.getenv("SCHEDULER_INGEST_CONCURRENCY", "2"))
+SCHEDULER_INGEST_QUEUE = int(os.getenv("SCHEDULER_INGEST_QUEUE", "0"))
+
+# Ingestion Jobs
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", os.path.join(TEMP_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "1"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
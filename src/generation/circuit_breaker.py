@@ -0,0 +1,160 @@
+import time
+import threading
+from collections import deque
+from typing import Dict, Any
+from src.utils.logger import setup_logger
+from src.config import (
+    LLM_BREAKER_WINDOW, LLM_BREAKER_MIN_CALLS, LLM_BREAKER_FAILURE_RATE,
+    LLM_BREAKER_SLOW_CALL_SECONDS, LLM_BREAKER_OPEN_SECONDS, LLM_BREAKER_HALF_OPEN_CALLS
+)
+
+logger = setup_logger(__name__)
+
+# Breaker states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one generation backend.
+    
+    While closed, the outcome of the last `window` calls is kept; a call is
+    bad if it failed or took longer than `slow_call_seconds`. Once at least
+    `min_calls` are in the window and the share of bad calls reaches
+    `failure_rate`, the breaker opens and calls are refused. After
+    `open_seconds` it goes half-open and lets `half_open_calls` trial calls
+    through: all of them succeeding closes it, any bad one opens it again.
+    Safe to use from several threads.
+    """
+    
+    def __init__(self, name: str, window: int = LLM_BREAKER_WINDOW, min_calls: int = LLM_BREAKER_MIN_CALLS,
+                 failure_rate: float = LLM_BREAKER_FAILURE_RATE,
+                 slow_call_seconds: float = LLM_BREAKER_SLOW_CALL_SECONDS,
+                 open_seconds: float = LLM_BREAKER_OPEN_SECONDS,
+                 half_open_calls: int = LLM_BREAKER_HALF_OPEN_CALLS):
+        """
+        Initialize the breaker in the closed state.
+        
+        Args:
+            name: Backend name used in logs and snapshots
+            window: Number of recent calls the error rate is computed over
+            min_calls: Calls needed in the window before the breaker can open
+            failure_rate: Share of bad calls that opens the breaker
+            slow_call_seconds: Calls slower than this count as bad (0 disables)
+            open_seconds: Time the breaker stays open before trial calls
+            half_open_calls: Trial calls that must succeed to close the breaker
+        """
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_calls = max(1, half_open_calls)
+        
+        self._outcomes = deque(maxlen=max(1, window))
+        self._state = CLOSED
+        self._opened_at = None
+        self._trials = 0
+        self._trial_successes = 0
+        self._lock = threading.Lock()
+        
+    @property
+    def state(self) -> str:
+        """Current state; an open breaker whose wait is over reports half-open."""
+        with self._lock:
+            self._check_half_open()
+            return self._state
+            
+    def allow(self) -> bool:
+        """
+        Ask to make a call.
+        
+        In the half-open state this takes one of the trial slots, so every
+        allowed call must be followed by record() or release().
+        
+        Returns:
+            True if the call may go ahead
+        """
+        with self._lock:
+            self._check_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._trials < self.half_open_calls:
+                self._trials += 1
+                return True
+            return False
+            
+    def record(self, seconds: float, success: bool):
+        """
+        Record the outcome of an allowed call.
+        
+        Args:
+            seconds: Duration of the call
+            success: Whether the call produced a usable result
+        """
+        bad = not success or (self.slow_call_seconds > 0 and seconds > self.slow_call_seconds)
+        with self._lock:
+            if self._state == HALF_OPEN:
+                if bad:
+                    self._open(f"trial call {'failed' if not success else f'took {seconds:.1f}s'}")
+                else:
+                    self._trial_successes += 1
+                    if self._trial_successes >= self.half_open_calls:
+                        self._state = CLOSED
+                        self._outcomes.clear()
+                        logger.warning(f"Circuit for {self.name} closed")
+                return
+                
+            if self._state == OPEN:
+                # A call allowed before the breaker opened
+                return
+                
+            self._outcomes.append(bad)
+            if len(self._outcomes) >= self.min_calls:
+                rate = sum(self._outcomes) / len(self._outcomes)
+                if rate >= self.failure_rate:
+                    self._open(f"{rate:.0%} of the last {len(self._outcomes)} calls failed or were slow")
+                    
+    def release(self):
+        """Give back the trial slot of an allowed call that was abandoned without an outcome."""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trials > self._trial_successes:
+                self._trials -= 1
+                
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Return the breaker state for monitoring.
+        
+        Returns:
+            Dict with 'name', 'state', 'calls' (in the window), 'error_rate'
+            and 'open_for' (seconds until trial calls, 0 unless open)
+        """
+        with self._lock:
+            self._check_half_open()
+            calls = len(self._outcomes)
+            open_for = 0.0
+            if self._state == OPEN:
+                open_for = max(0.0, self._opened_at + self.open_seconds - time.monotonic())
+            return {
+                'name': self.name,
+                'state': self._state,
+                'calls': calls,
+                'error_rate': sum(self._outcomes) / calls if calls else 0.0,
+                'open_for': open_for
+            }
+            
+    def _open(self, reason: str):
+        """Open the breaker; the lock must be held."""
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        logger.warning(f"Circuit for {self.name} opened: {reason}")
+        
+    def _check_half_open(self):
+        """Move from open to half-open once the wait is over; the lock must be held."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trials = 0
+            self._trial_successes = 0
+            logger.info(f"Circuit for {self.name} half-open, allowing trial calls")
@@ -0,0 +1,172 @@
+import re
+import math
+from typing import List, Dict, Any, Callable, Set
+from src.utils.logger import setup_logger
+from src.config import CONTEXT_MAX_TOKENS, CONTEXT_DUPLICATE_THRESHOLD, CHUNK_OVERLAP
+
+logger = setup_logger(__name__)
+
+# Rough characters per token of English text for BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+# Shortest suffix/prefix match treated as chunk overlap rather than coincidence
+MIN_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of tokens in text without loading a tokenizer.
+    
+    Args:
+        text: Text to measure
+        
+    Returns:
+        Estimated token count
+    """
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def overlap_length(previous: str, following: str, max_overlap: int = 2 * CHUNK_OVERLAP) -> int:
+    """
+    Length of the longest suffix of previous that is also a prefix of following.
+    
+    Args:
+        previous: Text of a chunk
+        following: Text of the next chunk of the same source
+        max_overlap: Longest overlap searched for
+        
+    Returns:
+        Number of overlapping characters (0 if shorter than MIN_OVERLAP)
+    """
+    for length in range(min(len(previous), len(following), max_overlap), MIN_OVERLAP - 1, -1):
+        if previous.endswith(following[:length]):
+            return length
+    return 0
+
+
+def _shingles(text: str, size: int = 3) -> Set[int]:
+    """Hashes of the word n-grams of text, used to spot near-duplicates."""
+    words = re.findall(r'\w+', text.lower())
+    if len(words) < size:
+        return {hash(tuple(words))} if words else set()
+    return {hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1)}
+
+
+def _similarity(a: Set[int], b: Set[int]) -> float:
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def pack_context(documents: List[Dict[str, Any]], max_tokens: int = CONTEXT_MAX_TOKENS,
+                 count_tokens: Callable[[str], int] = estimate_tokens,
+                 duplicate_threshold: float = CONTEXT_DUPLICATE_THRESHOLD) -> List[Dict[str, Any]]:
+    """
+    Select and merge retrieved chunks into passages that fit a token budget.
+    
+    Chunks are taken in score order. Near-duplicates of a chunk already taken
+    are dropped, and a chunk is skipped if it does not fit in what is left of
+    the budget. Taken chunks that are neighbours in the same source
+    (consecutive 'chunk_index' in their metadata) are merged into one passage
+    with the text they overlap on included once; overlap with a neighbour
+    already taken is not charged against the budget.
+    
+    Args:
+        documents: Retrieved document dictionaries with 'content', 'source',
+            'score' and optionally metadata 'chunk_index'
+        max_tokens: Token budget for the passage texts
+        count_tokens: Function counting the tokens of a text
+        duplicate_threshold: Word-trigram Jaccard similarity above which a chunk
+            counts as a duplicate
+            
+    Returns:
+        List of passage dicts with 'source', 'content', 'score' and
+        'chunk_indexes', best passage first
+    """
+    chunks = []
+    for position, doc in enumerate(documents):
+        content = doc.get('content') or ''
+        if not content.strip():
+            continue
+        metadata = doc.get('metadata') or {}
+        chunks.append({
+            'position': position,
+            'source': doc.get('source') or 'unknown',
+            'chunk_index': metadata.get('chunk_index') if isinstance(metadata, dict) else None,
+            'content': content,
+            'score': doc.get('score'),
+            'shingles': _shingles(content)
+        })
+        
+    # Retrieval order breaks ties and covers documents without scores
+    ranked = sorted(chunks, key=lambda chunk: (-(chunk['score'] or 0.0), chunk['position']))
+    
+    selected = {}
+    used = 0
+    duplicates = 0
+    skipped = 0
+    for chunk in ranked:
+        if any(_similarity(chunk['shingles'], other['shingles']) >= duplicate_threshold
+               for other in selected.values()):
+            duplicates += 1
+            continue
+            
+        text = chunk['content']
+        index = chunk['chunk_index']
+        if index is not None:
+            # Overlap with an already selected neighbour is paid for once
+            previous = selected.get((chunk['source'], index - 1))
+            following = selected.get((chunk['source'], index + 1))
+            if previous:
+                text = text[overlap_length(previous['content'], text):]
+            if following:
+                text = text[:len(text) - overlap_length(text, following['content'])]
+                
+        cost = count_tokens(text)
+        if used + cost > max_tokens:
+            skipped += 1
+            continue
+        used += cost
+        key = (chunk['source'], index) if index is not None else ('', chunk['position'])
+        selected[key] = chunk
+        
+    passages = _merge_neighbours(list(selected.values()))
+    logger.debug(f"Packed {len(selected)} of {len(chunks)} chunks into {len(passages)} passages "
+                 f"(~{used} tokens, {duplicates} near-duplicates dropped, {skipped} over budget)")
+    return passages
+
+
+def _merge_neighbours(chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Join chunks with consecutive indexes from the same source, removing their overlap."""
+    passages = []
+    previous = None
+    # Neighbours end up next to each other; chunks without an index stay on their own
+    ordered = sorted(chunks, key=lambda chunk: (
+        chunk['chunk_index'] is None, chunk['source'],
+        chunk['position'] if chunk['chunk_index'] is None else chunk['chunk_index']
+    ))
+    for chunk in ordered:
+        index = chunk['chunk_index']
+        if (previous is not None and index is not None and previous['chunk_index'] is not None
+                and chunk['source'] == previous['source'] and index == previous['chunk_index'] + 1):
+            passage = passages[-1]
+            passage['content'] += chunk['content'][overlap_length(previous['content'], chunk['content']):]
+            passage['chunk_indexes'].append(index)
+            if chunk['score'] is not None and (passage['score'] is None or chunk['score'] > passage['score']):
+                passage['score'] = chunk['score']
+            passage['position'] = min(passage['position'], chunk['position'])
+        else:
+            passages.append({
+                'source': chunk['source'],
+                'content': chunk['content'],
+                'score': chunk['score'],
+                'chunk_indexes': [index] if index is not None else [],
+                'position': chunk['position']
+            })
+        previous = chunk
+        
+    passages.sort(key=lambda passage: (-(passage['score'] or 0.0), passage['position']))
+    for passage in passages:
+        del passage['position']
+    return passages
@@ -0,0 +1,152 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Iterator
+from src.generation.hf_client import HFInferenceClient, GenerationError
+from src.generation.context_packer import pack_context, estimate_tokens
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Instructions given to every model ahead of the retrieved context
+RAG_INSTRUCTIONS = ("You are an intelligent AI assistant. Answer the user's question based on the provided context. "
+                    "If the context doesn't contain the relevant information, say that you don't know and avoid "
+                    "making up information.")
+
+class HFChatModel(ABC):
+    """
+    Base class of the chat models served by the Hugging Face Inference API.
+    
+    Subclasses set the display name used in log messages and the default
+    generation parameters, and implement the model's prompt template.
+    """
+    
+    # Display name of the model family in log messages
+    name = "Hugging Face"
+    
+    # Generation parameters of every request; the response cache only stores greedy ones
+    default_parameters: Dict[str, Any] = {}
+    
+    def __init__(self, model_name: str, client: Optional[HFInferenceClient] = None):
+        """
+        Initialize the model.
+        
+        Args:
+            model_name: Name of the model on Hugging Face
+            client: Inference API client (default: one created for model_name)
+        """
+        self.model_name = model_name
+        # Pooled keep-alive session with timeouts and 429/503 retries
+        self.client = client or HFInferenceClient(model_name)
+        self.api_url = self.client.api_url
+        self.parameters = dict(self.default_parameters)
+        logger.info(f"{self.name} model initialized with {model_name}")
+        
+    def generate(self, query: str, documents: List[Dict[str, Any]]) -> str:
+        """
+        Generate a response to the query based on retrieved documents.
+        
+        Args:
+            query: The query text
+            documents: List of retrieved document dictionaries
+            
+        Returns:
+            Generated response text
+            
+        Raises:
+            GenerationError: If the request fails or the model returns no text
+        """
+        try:
+            # Make API request
+            result = self.client.post(self._request_payload(query, documents))
+            return self._parse_result(result)
+            
+        except Exception as e:
+            logger.error(f"Error using {self.name} model: {str(e)}")
+            raise
+            
+    async def agenerate(self, query: str, documents: List[Dict[str, Any]]) -> str:
+        """
+        Async version of generate(); waits on the endpoint without blocking a thread.
+        
+        Args:
+            query: The query text
+            documents: List of retrieved document dictionaries
+            
+        Returns:
+            Generated response text
+            
+        Raises:
+            GenerationError: If the request fails or the model returns no text
+        """
+        try:
+            result = await self.client.apost(self._request_payload(query, documents))
+            return self._parse_result(result)
+            
+        except Exception as e:
+            logger.error(f"Error using {self.name} model: {str(e)}")
+            raise
+            
+    def generate_stream(self, query: str, documents: List[Dict[str, Any]]) -> Iterator[str]:
+        """
+        Generate a response, yielding tokens as the endpoint streams them.
+        
+        Args:
+            query: The query text
+            documents: List of retrieved document dictionaries
+            
+        Returns:
+            Iterator of token texts
+            
+        Raises:
+            GenerationError: If the request fails or the stream reports an error
+        """
+        payload = self._request_payload(query, documents)
+        payload["stream"] = True
+        for event in self.client.stream(payload):
+            token = event.get("token") or {}
+            if token.get("text") and not token.get("special"):
+                yield token["text"]
+                
+    def build_payload(self, query: str, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the request body for a query and its retrieved documents."""
+        # Fit the documents into the context budget, merging neighbouring chunks
+        passages = pack_context(documents)
+        context = "\n\n".join([
+            f"Document {i+1} (Source: {passage['source']}): {passage['content']}"
+            for i, passage in enumerate(passages)
+        ])
+        
+        # Create prompt
+        prompt = self._create_rag_prompt(query, context)
+        
+        return {
+            "inputs": prompt,
+            "parameters": dict(self.parameters)
+        }
+        
+    def _request_payload(self, query: str, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the request body of a call, logging the size of its prompt."""
+        payload = self.build_payload(query, documents)
+        logger.info(f"Prompt for {self.model_name}: ~{estimate_tokens(payload['inputs'])} tokens "
+                    f"from {len(documents)} retrieved documents")
+        return payload
+        
+    def _parse_result(self, result: Any) -> str:
+        """Extract the generated text from an API response, rejecting empty answers."""
+        # Handle different response formats from Hugging Face
+        if isinstance(result, list) and result:
+            if "generated_text" in result[0]:
+                text = result[0]["generated_text"]
+            else:
+                text = str(result[0])
+        elif isinstance(result, dict) and "generated_text" in result:
+            text = result["generated_text"]
+        else:
+            text = str(result)
+            
+        if not text or not str(text).strip():
+            raise GenerationError(f"Empty response from {self.model_name}")
+        return text
+            
+    @abstractmethod
+    def _create_rag_prompt(self, query: str, context: str) -> str:
+        """Create a prompt for RAG using the retrieved context."""
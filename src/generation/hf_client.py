@@ -0,0 +1,304 @@
+import json
+import math
+import time
+import random
+import asyncio
+import itertools
+import httpx
+import requests
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional, Iterator, Iterable
+from requests.adapters import HTTPAdapter
+from src.utils.logger import setup_logger
+from src.config import (
+    HUGGINGFACE_API_KEY, HF_API_BASE_URL, LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT,
+    LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX, LLM_POOL_SIZE,
+    LLM_ASYNC_MAX_CONNECTIONS, LLM_ASYNC_POOL_SHARDS
+)
+
+logger = setup_logger(__name__)
+
+# Status codes retried with backoff: rate limited, and model loading / overloaded
+RETRY_STATUS_CODES = (429, 503)
+
+
+class GenerationError(Exception):
+    """Raised when an inference request fails after all retries."""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def iter_sse_events(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Parse a server-sent events stream into the data of each event.
+    
+    Multi-line data fields are joined with newlines; comments and fields
+    other than data are ignored.
+    
+    Args:
+        lines: Decoded lines of the stream, without line endings
+        
+    Returns:
+        Iterator over event data strings
+    """
+    data = []
+    for line in lines:
+        if not line:
+            if data:
+                yield "\n".join(data)
+                data = []
+        elif line.startswith('data:'):
+            value = line[5:]
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data:
+        yield "\n".join(data)
+
+
+class HFInferenceClient:
+    """
+    HTTP client for one model on the Hugging Face Inference API.
+    
+    Keeps a pooled keep-alive session so repeated calls reuse connections,
+    applies separate connect and read timeouts, and retries rate limiting
+    and model loading responses with bounded exponential backoff.
+    
+    The a-prefixed methods do the same over an httpx.AsyncClient, so many
+    requests can be in flight on one event loop.
+    """
+    
+    def __init__(self, model_name: str, api_base: str = HF_API_BASE_URL,
+                 connect_timeout: float = LLM_CONNECT_TIMEOUT, read_timeout: float = LLM_READ_TIMEOUT,
+                 max_retries: int = LLM_MAX_RETRIES, backoff_base: float = LLM_BACKOFF_BASE,
+                 backoff_max: float = LLM_BACKOFF_MAX, pool_size: int = LLM_POOL_SIZE,
+                 async_max_connections: int = LLM_ASYNC_MAX_CONNECTIONS,
+                 async_pool_shards: int = LLM_ASYNC_POOL_SHARDS):
+        """
+        Initialize the client.
+        
+        Args:
+            model_name: Model ID on the Inference API
+            api_base: Base URL the model ID is appended to
+            connect_timeout: Seconds to wait for a connection
+            read_timeout: Seconds to wait between bytes of the response
+            max_retries: Retries after a 429/503 response
+            backoff_base: Delay before the first retry in seconds, doubled per retry
+            backoff_max: Upper bound on any single delay, including Retry-After
+            pool_size: Maximum number of pooled connections
+            async_max_connections: Maximum number of connections across the async clients
+            async_pool_shards: Number of async clients the connections are spread over
+        """
+        self.model_name = model_name
+        self.api_url = f"{api_base.rstrip('/')}/{model_name}"
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        
+        self.session = requests.Session()
+        # Retries are handled below so Retry-After and backoff bounds apply
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({"Authorization": f"Bearer {HUGGINGFACE_API_KEY}"})
+        
+        self.async_max_connections = async_max_connections
+        self.async_pool_shards = max(1, async_pool_shards)
+        self._async_clients = []
+        self._async_loop = None
+        self._next_client = itertools.count()
+        
+    def post(self, payload: Dict[str, Any]) -> Any:
+        """
+        Send a request and return the decoded JSON response.
+        
+        Args:
+            payload: JSON request body
+            
+        Returns:
+            Decoded response body
+            
+        Raises:
+            GenerationError: On timeouts, connection errors, or error responses
+                (429/503 only after the retries are used up)
+        """
+        response = self._request(payload)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise GenerationError(f"Invalid JSON from {self.model_name}: {str(e)}", response.status_code)
+            
+    async def apost(self, payload: Dict[str, Any]) -> Any:
+        """
+        Async version of post().
+        
+        Args:
+            payload: JSON request body
+            
+        Returns:
+            Decoded response body
+            
+        Raises:
+            GenerationError: On timeouts, connection errors, or error responses
+        """
+        response = await self._arequest(payload)
+        try:
+            return response.json()
+        except ValueError as e:
+            raise GenerationError(f"Invalid JSON from {self.model_name}: {str(e)}", response.status_code)
+            
+    async def aclose(self):
+        """Close the async client's connections."""
+        clients, self._async_clients, self._async_loop = self._async_clients, [], None
+        for client in clients:
+            await client.aclose()
+            
+    def stream(self, payload: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Send a streaming request and yield the decoded server-sent events.
+        
+        The read timeout applies between events, so a slow but steadily
+        streaming response is not cut off.
+        
+        Args:
+            payload: JSON request body, with "stream": true
+            
+        Returns:
+            Iterator of decoded event payloads
+            
+        Raises:
+            GenerationError: On request failures or an error event in the stream
+        """
+        response = self._request(payload, stream=True)
+        try:
+            # chunk_size=None hands over each chunk as it arrives instead of waiting for a full buffer
+            for data in iter_sse_events(response.iter_lines(chunk_size=None, decode_unicode=True)):
+                if data == '[DONE]':
+                    return
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    logger.warning(f"Skipping malformed event from {self.model_name}: {data[:100]}")
+                    continue
+                if isinstance(event, dict) and event.get('error'):
+                    raise GenerationError(f"{self.model_name} stream failed: {event['error']}")
+                yield event
+        except requests.RequestException as e:
+            raise GenerationError(f"Stream from {self.model_name} failed: {str(e)}")
+        finally:
+            response.close()
+            
+    def _request(self, payload: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """POST the payload, retrying 429/503 responses."""
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.api_url, json=payload, timeout=self.timeout, stream=stream)
+            except requests.Timeout as e:
+                raise GenerationError(f"Request to {self.model_name} timed out: {str(e)}")
+            except requests.RequestException as e:
+                raise GenerationError(f"Request to {self.model_name} failed: {str(e)}")
+                
+            if response.status_code == 200:
+                return response
+                
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                delay = self._retry_delay(response, attempt)
+                logger.warning(f"{self.model_name} returned {response.status_code}, "
+                               f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                # Read the short error body so the connection goes back to the pool
+                response.content
+                response.close()
+                time.sleep(delay)
+                attempt += 1
+                continue
+                
+            raise GenerationError(
+                f"API request to {self.model_name} failed with status code "
+                f"{response.status_code}: {response.text[:500]}",
+                response.status_code
+            )
+            
+    def _get_async_client(self) -> httpx.AsyncClient:
+        """
+        Return an async client for the running event loop, creating them on first use.
+        
+        httpcore scans its whole pool on every request and response, so one
+        pool with hundreds of busy connections costs more CPU than the requests
+        themselves. Connections are spread over several smaller pools instead,
+        used in turn.
+        """
+        loop = asyncio.get_running_loop()
+        # Connections belong to the loop that opened them
+        if not self._async_clients or self._async_loop is not loop:
+            connect_timeout, read_timeout = self.timeout
+            per_shard = math.ceil(self.async_max_connections / self.async_pool_shards)
+            self._async_clients = [
+                httpx.AsyncClient(
+                    headers={"Authorization": self.session.headers["Authorization"]},
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                    limits=httpx.Limits(max_connections=per_shard, max_keepalive_connections=per_shard)
+                )
+                for _ in range(self.async_pool_shards)
+            ]
+            self._async_loop = loop
+        return self._async_clients[next(self._next_client) % len(self._async_clients)]
+        
+    async def _arequest(self, payload: Dict[str, Any]) -> httpx.Response:
+        """Async version of _request()."""
+        client = self._get_async_client()
+        attempt = 0
+        while True:
+            try:
+                response = await client.post(self.api_url, json=payload)
+            except httpx.TimeoutException as e:
+                raise GenerationError(f"Request to {self.model_name} timed out: {str(e)}")
+            except httpx.HTTPError as e:
+                raise GenerationError(f"Request to {self.model_name} failed: {str(e)}")
+                
+            if response.status_code == 200:
+                return response
+                
+            if response.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                delay = self._retry_delay(response, attempt)
+                logger.warning(f"{self.model_name} returned {response.status_code}, "
+                               f"retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+                
+            raise GenerationError(
+                f"API request to {self.model_name} failed with status code "
+                f"{response.status_code}: {response.text[:500]}",
+                response.status_code
+            )
+            
+    def _retry_delay(self, response, attempt: int) -> float:
+        """
+        Seconds to wait before the next attempt.
+        
+        Works with requests and httpx responses. Uses Retry-After (seconds
+        or HTTP date) or the Inference API's
+        estimated_time for loading models when present, otherwise exponential
+        backoff with jitter. Always capped at backoff_max.
+        """
+        hint = None
+        retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                hint = float(retry_after)
+            except ValueError:
+                try:
+                    hint = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    hint = None
+        if hint is None and response.status_code == 503:
+            try:
+                hint = float(response.json().get('estimated_time'))
+            except (ValueError, TypeError, AttributeError):
+                hint = None
+                
+        if hint is None:
+            hint = self.backoff_base * (2 ** attempt) * random.uniform(0.5, 1.0)
+        return min(max(hint, 0.0), self.backoff_max)
@@ -1,58 +1,490 @@
-from typing import Optional, Dict, Any
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeoutError
+from typing import Optional, Dict, Any, Iterator, Tuple
 import logging
+from src.generation.hf_client import GenerationError
+from src.generation.circuit_breaker import CircuitBreaker, OPEN
+from src.generation.response_cache import ResponseCache
+from src.utils.metrics import LatencyTracker
+from src.utils.deadline import Deadline, DeadlineExceeded
+from src.config import (
+    LLM_HEDGE_ENABLED, LLM_HEDGE_QUANTILE, LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY, LLM_HEDGE_WORKERS
+)
 
 logger = logging.getLogger(__name__)
 
 class LLMHandler:
     """
     Handler for managing multiple LLM models with fallback capabilities.
+    
+    With hedging enabled, a primary model that has not answered by its recent
+    p95 latency gets the backup model started alongside it; whichever returns
+    a usable answer first wins. Errors and empty answers count as failures.
+    Latencies are tracked per model in self.latency, and each model has a
+    circuit breaker in self.breakers: while a model's circuit is open it is
+    skipped and queries go straight to the other model.
+    
+    With a response cache, repeated requests are answered from disk without
+    calling a model.
+    
+    Given a deadline, no call is started if the model's median latency no
+    longer fits in it, and waits end at the deadline with DeadlineExceeded;
+    the cache is still consulted first.
     """
     
-    def __init__(self, primary_model, backup_model=None):
+    def __init__(self, primary_model, backup_model=None, hedge: bool = LLM_HEDGE_ENABLED,
+                 hedge_quantile: float = LLM_HEDGE_QUANTILE, hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES,
+                 hedge_default_delay: float = LLM_HEDGE_DEFAULT_DELAY,
+                 hedge_min_delay: float = LLM_HEDGE_MIN_DELAY, latency: Optional[LatencyTracker] = None,
+                 cache: Optional[ResponseCache] = None):
         """
         Initialize the LLM handler with primary and optional backup models.
         
         Args:
             primary_model: The main LLM model to use
             backup_model: Backup model to use if primary fails
+            hedge: Start the backup when the primary is slow, not only when it fails
+            hedge_quantile: Percentile of the primary's latency used as the hedging deadline
+            hedge_min_samples: Primary calls needed before the percentile is trusted
+            hedge_default_delay: Deadline in seconds until then
+            hedge_min_delay: Lower bound on the deadline in seconds
+            latency: Tracker to record model latencies in (default: a new one)
+            cache: Cache of generated responses (None disables caching)
         """
         self.primary_model = primary_model
         self.backup_model = backup_model
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_default_delay = hedge_default_delay
+        self.hedge_min_delay = hedge_min_delay
+        self.latency = latency or LatencyTracker()
+        self.cache = cache
+        self.breakers = {
+            self._model_name(model): CircuitBreaker(self._model_name(model))
+            for model in (primary_model, backup_model) if model is not None
+        }
+        # Blocking calls are raced on worker threads; threads are only started when used
+        self._executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_WORKERS, thread_name_prefix="llm-hedge")
+        
+    def hedge_delay(self) -> float:
+        """Return the seconds to wait for the primary model before starting the backup."""
+        name = self._model_name(self.primary_model)
+        delay = None
+        if self.latency.count(name) >= self.hedge_min_samples:
+            delay = self.latency.percentile(name, self.hedge_quantile)
+        if delay is None:
+            delay = self.hedge_default_delay
+        return max(delay, self.hedge_min_delay)
+        
+    def expected_latency(self) -> Optional[float]:
+        """
+        Return the median latency of the model a query would go to.
+        
+        That is the primary, unless its circuit is open and there is a backup.
         
-    def generate(self, prompt: str, **kwargs) -> str:
+        Returns:
+            Seconds, or None until hedge_min_samples calls have succeeded
+        """
+        model = self.primary_model
+        if self.backup_model is not None and self._breaker(model).state == OPEN:
+            model = self.backup_model
+        name = self._model_name(model)
+        if self.latency.count(name) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(name, 0.5)
+        
+    def latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return success/failure counts and p50/p95/p99 latencies per model."""
+        return self.latency.summary()
+        
+    def breaker_states(self) -> Dict[str, Dict[str, Any]]:
+        """Return the circuit breaker snapshot of each model, keyed by model name."""
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+        
+    def cache_stats(self) -> Dict[str, Any]:
+        """Return the response cache's hit rate and time saved (empty without a cache)."""
+        return self.cache.stats() if self.cache else {}
+        
+    def generate(self, prompt: str, *args, deadline: Optional[Deadline] = None, **kwargs) -> str:
         """
         Generate text using the primary model, falling back to backup if needed.
         
+        When hedging, a primary that misses the deadline keeps running while
+        the backup starts; the first usable answer is returned. A blocking call
+        cannot be interrupted, so the losing request finishes in the background
+        and its latency is still recorded. The same holds for a call abandoned
+        at the query deadline.
+        
         Args:
             prompt: The input prompt for generation
+            *args: Additional arguments to pass to the model, e.g. retrieved documents
+            deadline: Time budget of the generation (None = no limit)
             **kwargs: Additional parameters to pass to the model
             
         Returns:
             Generated text response
             
         Raises:
+            DeadlineExceeded: If no answer can be generated within the deadline
             Exception: If all models fail to generate a response
         """
+        keys, cached = self._cache_lookup(prompt, args, kwargs)
+        if cached is not None:
+            return cached
+            
+        self._check_deadline(deadline)
         errors = []
+        backup_tried = False
         
-        # Try primary model first
-        try:
+        # Try primary model first, unless its circuit is open
+        if self._allow("Primary", self.primary_model, errors):
             logger.info("Generating response using primary model")
-            return self.primary_model.generate(prompt, **kwargs)
-        except Exception as e:
-            error_msg = f"Primary model failed: {str(e)}"
-            logger.warning(error_msg)
-            errors.append(error_msg)
+            if self.backup_model is None or not self.hedge:
+                try:
+                    return self._call_within(deadline, self.primary_model, prompt, args, kwargs, keys)
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    self._failed("Primary", e, errors)
+            else:
+                delay = self.hedge_delay()
+                pending = {self._executor.submit(self._call, self.primary_model, prompt, args, kwargs, keys): "Primary"}
+                done, _ = wait(pending, timeout=self._wait_timeout(delay, deadline))
+                if not done:
+                    self._check_expired(deadline)
+                    backup_tried = True
+                    if self._allow("Backup", self.backup_model, errors):
+                        logger.info(f"Primary model slower than {delay:.2f}s, hedging with backup model")
+                        pending[self._executor.submit(self._call, self.backup_model, prompt, args, kwargs, keys)] = "Backup"
+                        
+                while pending:
+                    done, _ = wait(pending, timeout=Deadline.time_left(deadline), return_when=FIRST_COMPLETED)
+                    if not done:
+                        raise DeadlineExceeded("No model answered within the deadline")
+                    for future in done:
+                        label = pending.pop(future)
+                        try:
+                            return future.result()
+                        except Exception as e:
+                            self._failed(label, e, errors)
+                            
+        # Try backup model if primary fails and backup exists
+        if self.backup_model is not None and not backup_tried:
+            # Checked before the breaker hands out a trial slot, which raising would leave taken
+            self._check_expired(deadline)
+            if self._allow("Backup", self.backup_model, errors):
+                try:
+                    logger.info("Falling back to backup model")
+                    return self._call_within(deadline, self.backup_model, prompt, args, kwargs, keys)
+                except DeadlineExceeded:
+                    raise
+                except Exception as e:
+                    self._failed("Backup", e, errors)
+                
+        # If we got here, all models failed
+        raise Exception(f"All LLM models failed: {'; '.join(errors)}")
+        
+    async def agenerate(self, prompt: str, *args, deadline: Optional[Deadline] = None, **kwargs) -> str:
+        """
+        Async version of generate(), using the models' agenerate().
+        
+        When hedging, the request that loses the race is cancelled, as are
+        requests still running at the deadline.
         
+        Args:
+            prompt: The input prompt for generation
+            *args: Additional arguments to pass to the model, e.g. retrieved documents
+            deadline: Time budget of the generation (None = no limit)
+            **kwargs: Additional parameters to pass to the model
+            
+        Returns:
+            Generated text response
+            
+        Raises:
+            DeadlineExceeded: If no answer can be generated within the deadline
+            Exception: If all models fail to generate a response
+        """
+        # SQLite lookups, and packing the context for the cache keys, would block the event loop
+        keys, cached = ({}, None) if self.cache is None else await asyncio.to_thread(
+            self._cache_lookup, prompt, args, kwargs)
+        if cached is not None:
+            return cached
+            
+        self._check_deadline(deadline)
+        errors = []
+        backup_tried = False
+        
+        # Try primary model first, unless its circuit is open
+        if self._allow("Primary", self.primary_model, errors):
+            logger.info("Generating response using primary model")
+            delay = self.hedge_delay() if self.backup_model is not None and self.hedge else None
+            pending = {asyncio.ensure_future(self._acall(self.primary_model, prompt, args, kwargs, keys)): "Primary"}
+            try:
+                done, _ = await asyncio.wait(pending, timeout=self._wait_timeout(delay, deadline))
+                if not done:
+                    self._check_expired(deadline)
+                    backup_tried = True
+                    if self._allow("Backup", self.backup_model, errors):
+                        logger.info(f"Primary model slower than {delay:.2f}s, hedging with backup model")
+                        pending[asyncio.ensure_future(self._acall(self.backup_model, prompt, args, kwargs, keys))] = "Backup"
+                        
+                while pending:
+                    done, _ = await asyncio.wait(pending, timeout=Deadline.time_left(deadline),
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        raise DeadlineExceeded("No model answered within the deadline")
+                    for task in done:
+                        label = pending.pop(task)
+                        try:
+                            return task.result()
+                        except Exception as e:
+                            self._failed(label, e, errors)
+            finally:
+                for task in pending:
+                    task.cancel()
+                    
         # Try backup model if primary fails and backup exists
+        if self.backup_model is not None and not backup_tried:
+            # Checked before the breaker hands out a trial slot, which raising would leave taken
+            self._check_expired(deadline)
+            if self._allow("Backup", self.backup_model, errors):
+                try:
+                    logger.info("Falling back to backup model")
+                    return await asyncio.wait_for(self._acall(self.backup_model, prompt, args, kwargs, keys),
+                                                  timeout=Deadline.time_left(deadline))
+                except asyncio.TimeoutError:
+                    raise DeadlineExceeded("Backup model did not answer within the deadline")
+                except Exception as e:
+                    self._failed("Backup", e, errors)
+                
+        # If we got here, all models failed
+        raise Exception(f"All LLM models failed: {'; '.join(errors)}")
+        
+    def generate_stream(self, prompt: str, *args, **kwargs) -> Iterator[str]:
+        """
+        Stream tokens from the primary model, falling back to backup if needed.
+        
+        Falling back is only possible until the first token has been yielded;
+        a failure after that is raised to the caller. Time to first token and
+        total latency are logged separately. A cached response is yielded as
+        a single token.
+        
+        Args:
+            prompt: The input prompt for generation
+            *args: Additional arguments to pass to the model, e.g. retrieved documents
+            **kwargs: Additional parameters to pass to the model
+            
+        Returns:
+            Iterator of generated tokens
+            
+        Raises:
+            Exception: If all models fail before producing a token, or a stream fails midway
+        """
+        keys, cached = self._cache_lookup(prompt, args, kwargs)
+        if cached is not None:
+            yield cached
+            return
+            
+        errors = []
+        models = [("primary", self.primary_model)]
         if self.backup_model is not None:
+            models.append(("backup", self.backup_model))
+            
+        for label, model in models:
+            if not self._allow(label.capitalize(), model, errors):
+                continue
+            breaker = self._breaker(model)
+            logger.info(f"Streaming response using {label} model")
+            start = time.perf_counter()
+            first_token = None
+            tokens = []
+            success = None
             try:
-                logger.info("Falling back to backup model")
-                return self.backup_model.generate(prompt, **kwargs)
+                for token in model.generate_stream(prompt, *args, **kwargs):
+                    if not tokens:
+                        first_token = time.perf_counter() - start
+                        logger.info(f"Time to first token ({label} model): {first_token:.3f}s")
+                    tokens.append(token)
+                    yield token
+                success = bool(tokens)
             except Exception as e:
-                error_msg = f"Backup model failed: {str(e)}"
-                logger.warning(error_msg)
-                errors.append(error_msg)
-        
+                success = False
+                if tokens:
+                    raise
+                self._failed(label.capitalize(), e, errors)
+                continue
+            finally:
+                if success is None and tokens:
+                    # The consumer stopped reading after tokens arrived
+                    success = True
+                if success is None:
+                    breaker.release()
+                else:
+                    # Streams are judged on time to first token, which is what the caller waits for
+                    breaker.record(first_token if success else time.perf_counter() - start, success)
+                    
+            if not tokens:
+                self._failed(label.capitalize(), GenerationError(f"Empty response from {self._model_name(model)}"), errors)
+                continue
+            seconds = time.perf_counter() - start
+            logger.info(f"Streamed {len(tokens)} tokens from {label} model in {seconds:.3f}s")
+            self._cache_put(model, keys, "".join(tokens), seconds)
+            return
+            
         # If we got here, all models failed
-        raise Exception(f"All LLM models failed: {'; '.join(errors)}")
\ No newline at end of file
+        raise Exception(f"All LLM models failed: {'; '.join(errors)}")
+        
+    def _call(self, model, prompt: str, args: tuple, kwargs: Dict[str, Any], keys: Dict[str, str]) -> str:
+        """Call a model's generate(), recording its latency, rejecting empty answers and caching the rest."""
+        name = self._model_name(model)
+        start = time.perf_counter()
+        try:
+            response = model.generate(prompt, *args, **kwargs)
+            if not response or not response.strip():
+                raise GenerationError(f"Empty response from {name}")
+        except Exception:
+            self._record(model, time.perf_counter() - start, success=False)
+            raise
+        seconds = time.perf_counter() - start
+        self._record(model, seconds, success=True)
+        self._cache_put(model, keys, response, seconds)
+        return response
+        
+    async def _acall(self, model, prompt: str, args: tuple, kwargs: Dict[str, Any], keys: Dict[str, str]) -> str:
+        """Async version of _call(); a cancelled call is not recorded."""
+        name = self._model_name(model)
+        start = time.perf_counter()
+        try:
+            response = await model.agenerate(prompt, *args, **kwargs)
+            if not response or not response.strip():
+                raise GenerationError(f"Empty response from {name}")
+        except asyncio.CancelledError:
+            self._breaker(model).release()
+            raise
+        except Exception:
+            self._record(model, time.perf_counter() - start, success=False)
+            raise
+        seconds = time.perf_counter() - start
+        self._record(model, seconds, success=True)
+        if keys:
+            await asyncio.to_thread(self._cache_put, model, keys, response, seconds)
+        return response
+        
+    def _call_within(self, deadline: Optional[Deadline], model, prompt: str, args: tuple,
+                     kwargs: Dict[str, Any], keys: Dict[str, str]) -> str:
+        """Run _call(), giving up at the deadline; without one the call runs on the calling thread."""
+        if deadline is None:
+            return self._call(model, prompt, args, kwargs, keys)
+        future = self._executor.submit(self._call, model, prompt, args, kwargs, keys)
+        try:
+            return future.result(timeout=deadline.remaining())
+        except FutureTimeoutError:
+            raise DeadlineExceeded(f"{self._model_name(model)} did not answer within the deadline")
+            
+    def _check_deadline(self, deadline: Optional[Deadline]):
+        """Refuse to start generating if the expected latency no longer fits in the deadline."""
+        if deadline is None:
+            return
+        self._check_expired(deadline)
+        expected = self.expected_latency()
+        if expected is not None and deadline.remaining() < expected:
+            raise DeadlineExceeded(f"{deadline.remaining():.2f}s left, but generation takes {expected:.2f}s "
+                                   f"at the median")
+        
+    @staticmethod
+    def _check_expired(deadline: Optional[Deadline]):
+        """Raise DeadlineExceeded if the deadline has passed."""
+        if deadline is not None and deadline.expired():
+            raise DeadlineExceeded("Deadline passed before generation finished")
+            
+    @staticmethod
+    def _wait_timeout(delay: Optional[float], deadline: Optional[Deadline]) -> Optional[float]:
+        """The shorter of a hedging delay and the time left, either of which may be None."""
+        timeouts = [timeout for timeout in (delay, Deadline.time_left(deadline)) if timeout is not None]
+        return min(timeouts) if timeouts else None
+        
+    def _cache_keys(self, prompt: str, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Cache key of a request for each model, keyed by model name.
+        
+        Models without build_payload(), and requests that sample while the
+        cache does not allow it, get no key. Sampling is checked before the
+        payload is built, so uncacheable requests do not pack their context.
+        """
+        if self.cache is None:
+            return {}
+        documents = args[0] if args else kwargs.get('documents') or []
+        # Re-ingested chunks get new IDs, so their old answers are never served
+        chunk_ids = [doc.get('id') for doc in documents]
+        keys = {}
+        for model in (self.primary_model, self.backup_model):
+            if model is None or not hasattr(model, 'build_payload'):
+                continue
+            parameters = getattr(model, 'parameters', None)
+            if isinstance(parameters, dict) and not self.cache.accepts(parameters):
+                continue
+            name = self._model_name(model)
+            key = self.cache.make_key(name, model.build_payload(prompt, *args, **kwargs), chunk_ids)
+            if key:
+                keys[name] = key
+        return keys
+        
+    def _cache_lookup(self, prompt: str, args: tuple,
+                      kwargs: Dict[str, Any]) -> Tuple[Dict[str, str], Optional[str]]:
+        """Return the cache keys of a request and a cached response for it, if any."""
+        keys = self._cache_keys(prompt, args, kwargs)
+        return keys, self._cache_get(keys)
+        
+    def _cache_get(self, keys: Dict[str, str]) -> Optional[str]:
+        """Return a cached response for any of the models, preferring the primary."""
+        if self.cache is None:
+            return None
+        if not keys:
+            self.cache.record_bypass()
+            return None
+        response = self.cache.get(list(keys.values()))
+        if response is not None:
+            logger.info("Serving response from cache")
+        return response
+        
+    def _cache_put(self, model, keys: Dict[str, str], response: str, seconds: float):
+        """Cache a model's response under its key, if the request has one."""
+        key = keys.get(self._model_name(model))
+        if self.cache is not None and key:
+            try:
+                self.cache.put(key, self._model_name(model), response, seconds)
+            except Exception as e:
+                logger.warning(f"Failed to cache response: {str(e)}")
+                
+    def _record(self, model, seconds: float, success: bool):
+        """Record a call's outcome in the latency tracker and the model's breaker."""
+        self.latency.record(self._model_name(model), seconds, success=success)
+        self._breaker(model).record(seconds, success)
+        
+    def _breaker(self, model) -> CircuitBreaker:
+        """Return the circuit breaker of a model."""
+        return self.breakers[self._model_name(model)]
+        
+    def _allow(self, label: str, model, errors: list) -> bool:
+        """Check a model's breaker, noting the skip in errors if its circuit is open."""
+        if self._breaker(model).allow():
+            return True
+        error_msg = f"{label} model skipped: circuit open"
+        logger.warning(error_msg)
+        errors.append(error_msg)
+        return False
+        
+    def _failed(self, label: str, error: Exception, errors: list):
+        """Log a model failure and add it to the list of errors."""
+        error_msg = f"{label} model failed: {str(error)}"
+        logger.warning(error_msg)
+        errors.append(error_msg)
+        
+    @staticmethod
+    def _model_name(model) -> str:
+        """Name a model is tracked under."""
+        name = getattr(model, 'model_name', None)
+        return name if isinstance(name, str) else type(model).__name__
@@ -0,0 +1,203 @@
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+from src.utils.logger import setup_logger
+from src.config import (
+    RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_ALLOW_SAMPLED
+)
+
+logger = setup_logger(__name__)
+
+
+def is_deterministic(parameters: Dict[str, Any]) -> bool:
+    """
+    Tell whether generation parameters give the same output for the same prompt.
+    
+    An explicit do_sample decides; without it, a temperature, top_k or top_p
+    turns sampling on.
+    
+    Args:
+        parameters: The "parameters" of an Inference API request
+        
+    Returns:
+        True for greedy decoding
+    """
+    if 'do_sample' in parameters:
+        return not parameters['do_sample']
+    return not any(parameters.get(name) for name in ('temperature', 'top_k', 'top_p'))
+
+
+class ResponseCache:
+    """
+    On-disk LRU cache of generated responses.
+    
+    Entries are keyed by model name, a hash of the whitespace-normalized
+    prompt, the generation parameters and the IDs of the retrieved chunks the
+    prompt was built from, so re-ingested content never serves a stale answer.
+    Entries expire after `ttl` seconds, and the least recently used ones are
+    evicted beyond `max_entries`. Requests that sample are not cached unless
+    `allow_sampled` is set, since a cached answer would hide their variation.
+    """
+    
+    def __init__(self, path: str = RESPONSE_CACHE_PATH, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl: float = RESPONSE_CACHE_TTL, allow_sampled: bool = RESPONSE_CACHE_ALLOW_SAMPLED):
+        """
+        Initialize the cache, creating the database if needed.
+        
+        Args:
+            path: Path of the SQLite database file
+            max_entries: Maximum number of cached responses
+            ttl: Seconds a response stays valid (0 = no expiry)
+            allow_sampled: Also cache requests with sampling enabled
+        """
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.allow_sampled = allow_sampled
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            
+        self._hits = 0
+        self._misses = 0
+        self._bypassed = 0
+        self._seconds_saved = 0.0
+        
+        # Shared by the threads and event loop serving queries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, "
+            "seconds REAL, created_at REAL, used_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at)")
+        self._conn.commit()
+        logger.info(f"Response cache initialized at {path}")
+        
+    def accepts(self, parameters: Dict[str, Any]) -> bool:
+        """Tell whether requests with these generation parameters may be cached."""
+        return self.allow_sampled or is_deterministic(parameters)
+        
+    def make_key(self, model_name: str, payload: Dict[str, Any], chunk_ids: List[Any]) -> Optional[str]:
+        """
+        Build the cache key of a request.
+        
+        Args:
+            model_name: Model the request is sent to
+            payload: Request body with "inputs" and "parameters"
+            chunk_ids: IDs of the retrieved chunks, in prompt order
+            
+        Returns:
+            Hex key, or None if the request must not be cached
+        """
+        parameters = payload.get('parameters') or {}
+        if not self.accepts(parameters):
+            return None
+            
+        prompt = re.sub(r'\s+', ' ', str(payload.get('inputs', ''))).strip()
+        fingerprint = json.dumps({
+            'model': model_name,
+            'prompt': hashlib.sha256(prompt.encode('utf-8')).hexdigest(),
+            'parameters': {name: value for name, value in parameters.items() if name != 'stream'},
+            'chunks': [str(chunk_id) for chunk_id in chunk_ids]
+        }, sort_keys=True)
+        return hashlib.sha256(fingerprint.encode('utf-8')).hexdigest()
+        
+    def get(self, keys: List[str]) -> Optional[str]:
+        """
+        Look up the first cached response among keys, counting one hit or miss.
+        
+        Args:
+            keys: Keys from make_key() in order of preference, e.g. one per model
+            
+        Returns:
+            Cached response, or None if all are missing or expired
+        """
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                row = self._conn.execute(
+                    "SELECT response, seconds, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    continue
+                if self.ttl and now - row[2] > self.ttl:
+                    with self._conn:
+                        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    continue
+                    
+                with self._conn:
+                    self._conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+                self._hits += 1
+                self._seconds_saved += row[1] or 0.0
+                return row[0]
+                
+            self._misses += 1
+            return None
+            
+    def record_bypass(self):
+        """Count a request that was not looked up because it cannot be cached."""
+        with self._lock:
+            self._bypassed += 1
+            
+    def put(self, key: str, model_name: str, response: str, seconds: float):
+        """
+        Store a response, evicting the least recently used entries if full.
+        
+        Args:
+            key: Key from make_key()
+            model_name: Model that generated the response
+            response: Generated text
+            seconds: Time the generation took, reported as saved on later hits
+        """
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, response, seconds, created_at, used_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (key, model_name, response, seconds, now, now)
+                )
+                count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY used_at LIMIT ?)", (count - self.max_entries,)
+                    )
+                    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return cache statistics since startup.
+        
+        Returns:
+            Dict with 'entries', 'hits', 'misses', 'bypassed' (sampled requests),
+            'hit_rate' and 'seconds_saved' (generation time of the hits)
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self._hits + self._misses
+            return {
+                'entries': entries,
+                'hits': self._hits,
+                'misses': self._misses,
+                'bypassed': self._bypassed,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'seconds_saved': self._seconds_saved
+            }
+            
+    def clear(self):
+        """Remove all cached responses."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM responses")
+                
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -3,6 +3,6 @@ from .image_processor import ImageProcessor
 from .video_processor import VideoProcessor
 from .web_scraper import WebScraper
 from .embedding_generator import EmbeddingGenerator
-from .storage import Storage
+from .storage import MilvusStorage
 
-__all__ = ["TextProcessor", "ImageProcessor", "VideoProcessor", "WebScraper", "EmbeddingGenerator", "Storage"]
+__all__ = ["TextProcessor", "ImageProcessor", "VideoProcessor", "WebScraper", "EmbeddingGenerator", "MilvusStorage"]
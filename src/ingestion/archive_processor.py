@@ -0,0 +1,169 @@
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+import tempfile
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Any, BinaryIO, Iterator
+from src.utils.logger import setup_logger
+from src.utils.helper import is_archive_file
+from src.config import ARCHIVE_MAX_DEPTH, ARCHIVE_WORKERS, SPOOL_MAX_MEMORY, TEMP_DIR
+
+logger = setup_logger(__name__)
+
+# Separator between an archive and the path of a member inside it
+MEMBER_SEPARATOR = "!"
+
+# Metadata entries written by archivers that never contain documents
+SKIPPED_PREFIXES = ('__MACOSX/',)
+
+
+class _TarStreamMember(io.RawIOBase):
+    """
+    Read-only, non-seekable view of a member of a tar read in stream mode.
+    
+    The file objects tarfile returns in stream mode fail on seekable(), which
+    io.TextIOWrapper and friends call, so members are exposed through this.
+    """
+    
+    def __init__(self, fileobj: BinaryIO):
+        self._fileobj = fileobj
+        
+    def readable(self) -> bool:
+        return True
+        
+    def readinto(self, buffer) -> int:
+        data = self._fileobj.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+@contextmanager
+def member_file(stream: BinaryIO, source: str) -> Iterator[str]:
+    """
+    Copy a single archive member to a uniquely named temporary file.
+    
+    Used for processors that can only read from a path. The file keeps the
+    member's extension and is removed on exit.
+    
+    Args:
+        stream: Readable binary stream with the member content
+        source: Source identifier of the member
+        
+    Returns:
+        Path of the temporary file
+    """
+    fd, temp_path = tempfile.mkstemp(suffix=os.path.splitext(source)[1], dir=TEMP_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            shutil.copyfileobj(stream, f)
+        yield temp_path
+    finally:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+class ArchiveProcessor:
+    """
+    Streams the members of zip and tar archives to a member handler without
+    extracting the archive to disk.
+    """
+    
+    def __init__(self, max_depth: int = ARCHIVE_MAX_DEPTH, max_workers: int = ARCHIVE_WORKERS):
+        """
+        Initialize the archive processor.
+        
+        Args:
+            max_depth: Maximum nesting depth of archives inside archives (1 = no nesting)
+            max_workers: Number of zip members processed in parallel
+        """
+        self.max_depth = max_depth
+        self.max_workers = max(1, max_workers)
+        logger.info("Archive processor initialized")
+        
+    def process(self, archive_path: str, handle_member: Callable[[BinaryIO, str], Any]) -> int:
+        """
+        Stream every file in an archive to handle_member.
+        
+        Members are identified as "archive_path!member" ("a.zip!b.tar!c.txt" for
+        nested archives). Zip members are handled in parallel since the format
+        allows random access; tar members are handled in archive order.
+        
+        Args:
+            archive_path: Path to the archive
+            handle_member: Callable receiving (stream, source) for each member
+            
+        Returns:
+            Number of members passed to handle_member
+        """
+        logger.info(f"Processing archive: {archive_path}")
+        with open(archive_path, 'rb') as f:
+            return self._process_archive(f, archive_path, handle_member, depth=1)
+            
+    def _process_archive(self, stream: BinaryIO, source: str,
+                         handle_member: Callable[[BinaryIO, str], Any], depth: int) -> int:
+        """Dispatch on the archive format."""
+        if source.lower().endswith('.zip'):
+            return self._process_zip(stream, source, handle_member, depth)
+        return self._process_tar(stream, source, handle_member, depth)
+        
+    def _process_zip(self, stream: BinaryIO, source: str,
+                     handle_member: Callable[[BinaryIO, str], Any], depth: int) -> int:
+        """Handle zip members in parallel, each worker reading its own member stream."""
+        if not stream.seekable():
+            # Zip needs random access; nested zips inside tar streams are spooled
+            spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+            shutil.copyfileobj(stream, spooled)
+            spooled.seek(0)
+            stream = spooled
+            
+        with zipfile.ZipFile(stream) as zf:
+            members = [
+                info for info in zf.infolist()
+                if not info.is_dir() and not info.filename.startswith(SKIPPED_PREFIXES)
+            ]
+            
+            def handle(info):
+                with zf.open(info) as member:
+                    return self._handle(member, f"{source}{MEMBER_SEPARATOR}{info.filename}",
+                                        handle_member, depth)
+                                        
+            # Nested archives run inside a worker already, so keep them sequential
+            workers = self.max_workers if depth == 1 else 1
+            if workers == 1 or len(members) < 2:
+                return sum(handle(info) for info in members)
+                
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return sum(executor.map(handle, members))
+                
+    def _process_tar(self, stream: BinaryIO, source: str,
+                     handle_member: Callable[[BinaryIO, str], Any], depth: int) -> int:
+        """Handle tar members sequentially; compressed tars can only be read front to back."""
+        count = 0
+        with tarfile.open(fileobj=stream, mode='r|*') as tf:
+            for info in tf:
+                if not info.isfile() or info.name.startswith(SKIPPED_PREFIXES):
+                    continue
+                member = tf.extractfile(info)
+                if member is None:
+                    continue
+                with io.BufferedReader(_TarStreamMember(member)) as reader:
+                    count += self._handle(reader, f"{source}{MEMBER_SEPARATOR}{info.name}",
+                                          handle_member, depth)
+        return count
+        
+    def _handle(self, member: BinaryIO, source: str,
+                handle_member: Callable[[BinaryIO, str], Any], depth: int) -> int:
+        """Pass a member to handle_member, descending into nested archives."""
+        if is_archive_file(source):
+            if depth >= self.max_depth:
+                logger.warning(f"Skipping nested archive beyond depth {self.max_depth}: {source}")
+                return 0
+            return self._process_archive(member, source, handle_member, depth + 1)
+            
+        handle_member(member, source)
+        return 1
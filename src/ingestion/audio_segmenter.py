@@ -0,0 +1,102 @@
+from typing import Iterable, Iterator, Dict, Any
+import numpy as np
+from src.config import AUDIO_SILENCE_THRESHOLD_DB, AUDIO_MIN_SILENCE_MS, AUDIO_MAX_SEGMENT_SECONDS
+
+# Bytes per sample of the 16-bit PCM the segmenter works on
+SAMPLE_WIDTH = 2
+
+
+def _dbfs(window: bytes) -> float:
+    """Loudness of a window of 16-bit PCM relative to full scale."""
+    samples = np.frombuffer(window, dtype=np.int16).astype(np.float64)
+    if samples.size == 0:
+        return -np.inf
+    rms = np.sqrt(np.mean(samples * samples))
+    return 20 * np.log10(rms / 32768) if rms > 0 else -np.inf
+
+
+def segment_pcm(frames: Iterable[bytes], sample_rate: int, frame_ms: int = 30,
+                silence_threshold_db: float = AUDIO_SILENCE_THRESHOLD_DB,
+                min_silence_ms: int = AUDIO_MIN_SILENCE_MS,
+                max_segment_seconds: float = AUDIO_MAX_SEGMENT_SECONDS) -> Iterator[Dict[str, Any]]:
+    """
+    Split a stream of mono 16-bit PCM into speech segments at pauses.
+    
+    Frames may have any size; they are analysed in windows of frame_ms. A
+    segment ends after min_silence_ms of audio below silence_threshold_db, or
+    when it reaches max_segment_seconds. Leading and trailing silence is
+    dropped. Only the segment being built is held in memory.
+    
+    Args:
+        frames: Iterable of raw PCM byte strings
+        sample_rate: Sample rate in Hz
+        frame_ms: Analysis window length in milliseconds
+        silence_threshold_db: Windows quieter than this (dBFS) count as silence
+        min_silence_ms: Length of the pause that ends a segment
+        max_segment_seconds: Upper bound on segment length
+        
+    Returns:
+        Iterator of dicts with 'index', 'start' and 'end' (seconds) and 'pcm' (bytes)
+    """
+    window_size = int(sample_rate * frame_ms / 1000) * SAMPLE_WIDTH
+    bytes_per_second = sample_rate * SAMPLE_WIDTH
+    max_segment_bytes = int(max_segment_seconds * bytes_per_second)
+    silence_windows = max(1, min_silence_ms // frame_ms)
+    
+    pending = b""
+    position = 0        # Bytes of audio consumed so far
+    segment = bytearray()
+    segment_start = 0
+    voiced_length = 0   # Segment length up to its last voiced window
+    silent_run = 0
+    index = 0
+    
+    def emit():
+        nonlocal segment, index
+        result = {
+            'index': index,
+            'start': segment_start / bytes_per_second,
+            'end': (segment_start + voiced_length) / bytes_per_second,
+            'pcm': bytes(segment[:voiced_length])
+        }
+        segment = bytearray()
+        index += 1
+        return result
+        
+    def windows():
+        nonlocal pending
+        for frame in frames:
+            pending += frame
+            offset = 0
+            while len(pending) - offset >= window_size:
+                yield pending[offset:offset + window_size]
+                offset += window_size
+            pending = pending[offset:]
+        if pending:
+            yield pending
+            
+    for window in windows():
+        voiced = _dbfs(window) >= silence_threshold_db
+        
+        if not segment and not voiced:
+            # Skip silence between segments
+            position += len(window)
+            continue
+            
+        if not segment:
+            segment_start = position
+            silent_run = 0
+        segment += window
+        position += len(window)
+        
+        if voiced:
+            voiced_length = len(segment)
+            silent_run = 0
+        else:
+            silent_run += 1
+            
+        if silent_run >= silence_windows or len(segment) >= max_segment_bytes:
+            yield emit()
+            
+    if segment and voiced_length:
+        yield emit()
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional
+from src.utils.logger import setup_logger
+from src.config import HTTP_CACHE_PATH
+
+logger = setup_logger(__name__)
+
+
+class HTTPCache:
+    """
+    SQLite store of the validators and content hash of fetched pages.
+    
+    Used to make conditional requests when pages are fetched again. Only
+    metadata is stored, not page bodies, so the cache stays small for large
+    crawls. The links found on a page are kept too, so a crawl can continue
+    past pages that have not changed.
+    """
+    
+    def __init__(self, path: str = HTTP_CACHE_PATH):
+        """
+        Initialize the cache, creating the database if needed.
+        
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            
+        # Shared by the crawler's event loop and the threads that store pages
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, "
+            "content_hash TEXT, links TEXT, fetched_at REAL)"
+        )
+        self._conn.commit()
+        logger.info(f"HTTP cache initialized at {path}")
+        
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up the cached entry for a URL.
+        
+        Args:
+            url: Page URL
+            
+        Returns:
+            Dict with 'url', 'etag', 'last_modified', 'content_hash', 'links'
+            and 'fetched_at', or None if the URL has not been stored
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT url, etag, last_modified, content_hash, links, fetched_at "
+                "FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'url': row[0],
+            'etag': row[1],
+            'last_modified': row[2],
+            'content_hash': row[3],
+            'links': json.loads(row[4]) if row[4] else [],
+            'fetched_at': row[5]
+        }
+        
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Return If-None-Match / If-Modified-Since headers for a cached URL."""
+        entry = self.get(url)
+        headers = {}
+        if entry:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+        
+    def put_many(self, entries: List[Dict[str, Any]]):
+        """
+        Insert or replace entries in a single transaction.
+        
+        Args:
+            entries: Dicts with 'url' and optionally 'etag', 'last_modified',
+                'content_hash' and 'links'
+        """
+        if not entries:
+            return
+        now = time.time()
+        rows = [
+            (entry['url'], entry.get('etag'), entry.get('last_modified'),
+             entry.get('content_hash'), json.dumps(entry.get('links') or []), now)
+            for entry in entries
+        ]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO responses "
+                    "(url, etag, last_modified, content_hash, links, fetched_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                
+    def put(self, entry: Dict[str, Any]):
+        """Insert or replace a single entry."""
+        self.put_many([entry])
+        
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
@@ -1,110 +1,255 @@
 import os
-import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Dict, Any, Optional
-import moviepy.editor as mp
-import speech_recognition as sr
+import numpy as np
+import pytesseract
+from PIL import Image, ImageSequence
 from src.utils.logger import setup_logger
 from src.utils.chunker import chunk_text
-from src.config import TEMP_DIR
+from src.utils.helper import get_file_hash
+from src.config import OCR_LANGUAGE, OCR_MAX_WIDTH, OCR_TILE_HEIGHT, OCR_WORKERS, OCR_CACHE_DIR
 
 logger = setup_logger(__name__)
 
-class VideoProcessor:
+# How far above a tile boundary to look for a blank row to cut at
+TILE_SEARCH_FRACTION = 0.1
+
+
+def _init_ocr_worker():
+    """Keep each Tesseract call single-threaded; parallelism comes from the pool."""
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+
+def _binarize(image: Image.Image, max_width: int) -> Image.Image:
+    """Convert to grayscale, downscale to max_width and binarize with Otsu's threshold."""
+    gray = image.convert('L')
+    
+    if gray.width > max_width:
+        height = max(1, round(gray.height * max_width / gray.width))
+        gray = gray.resize((max_width, height), Image.LANCZOS)
+        
+    # Otsu: pick the threshold that maximizes the between-class variance
+    histogram = np.array(gray.histogram(), dtype=np.float64)
+    levels = np.arange(256)
+    weight_bg = np.cumsum(histogram)
+    weight_fg = weight_bg[-1] - weight_bg
+    sum_bg = np.cumsum(histogram * levels)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+    threshold = int(np.argmax(weight_bg * weight_fg * (mean_bg - mean_fg) ** 2))
+    
+    return gray.point([0] * (threshold + 1) + [255] * (255 - threshold))
+
+
+def _tile_bounds(image: Image.Image, tile_height: int) -> List[tuple]:
+    """
+    Split a tall image into horizontal strips of about tile_height pixels.
+    
+    Each cut is moved up to the emptiest row just above the boundary, so
+    lines of text are not cut in half and strips do not need to overlap.
+    """
+    if image.height <= tile_height * 1.5:
+        return [(0, image.height)]
+        
+    ink_per_row = (np.asarray(image) == 0).sum(axis=1)
+    search = max(1, int(tile_height * TILE_SEARCH_FRACTION))
+    
+    bounds = []
+    top = 0
+    while image.height - top > tile_height * 1.5:
+        target = top + tile_height
+        window = ink_per_row[target - search:target]
+        cut = target - search + int(np.argmin(window))
+        bounds.append((top, cut))
+        top = cut
+    bounds.append((top, image.height))
+    return bounds
+
+
+def _ocr_image(file_path: str, language: str, max_width: int, tile_height: int) -> str:
     """
-    Processes video and audio files and extracts text through transcription.
+    Preprocess and OCR every frame of an image file.
+    
+    Runs in worker processes.
+    
+    Args:
+        file_path: Path to the image
+        language: Tesseract language code
+        max_width: Width images are downscaled to before OCR
+        tile_height: Approximate height of the strips tall images are split into
+        
+    Returns:
+        Extracted text
+    """
+    texts = []
+    with Image.open(file_path) as image:
+        # Multi-page TIFFs and animated GIFs have several frames
+        for frame in ImageSequence.Iterator(image):
+            binary = _binarize(frame, max_width)
+            for top, bottom in _tile_bounds(binary, tile_height):
+                tile = binary.crop((0, top, binary.width, bottom))
+                text = pytesseract.image_to_string(tile, lang=language)
+                if text.strip():
+                    texts.append(text.strip())
+    return "\n\n".join(texts)
+
+
+class ImageProcessor:
+    """
+    Processes images and extracts text through OCR.
     """
     
-    def __init__(self):
-        """Initialize the video processor."""
-        self.recognizer = sr.Recognizer()
-        logger.info("Video processor initialized")
+    def __init__(self, language: str = OCR_LANGUAGE, max_workers: int = OCR_WORKERS,
+                 cache_dir: Optional[str] = OCR_CACHE_DIR):
+        """
+        Initialize the image processor.
+        
+        Args:
+            language: Tesseract language code
+            max_workers: Number of Tesseract worker processes
+            cache_dir: Directory for cached OCR results (None disables caching)
+        """
+        self.language = language
+        self.max_workers = max(1, max_workers)
+        self.cache_dir = cache_dir
+        self._executor = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        logger.info("Image processor initialized")
         
     def process(self, file_path: str) -> List[Dict[str, Any]]:
         """
-        Process a video or audio file and extract transcribed text.
+        Process an image file and extract text through OCR.
         
         Args:
-            file_path: Path to the video/audio file
+            file_path: Path to the image file
             
         Returns:
             List of document dictionaries with extracted text
         """
-        logger.info(f"Processing video/audio file: {file_path}")
+        return self.process_batch([file_path]).get(file_path, [])
+        
+    def process_batch(self, file_paths: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        OCR several images in parallel across the worker pool.
         
-        video_formats = ['.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv']
-        audio_formats = ['.mp3', '.wav', '.ogg', '.flac', '.aac']
-        file_extension = os.path.splitext(file_path)[1].lower()
+        Images whose content hash is already in the cache are not OCR'd again.
         
-        try:
-            if file_extension in video_formats:
-                return self._process_video(file_path)
-            elif file_extension in audio_formats:
-                return self._process_audio(file_path)
+        Args:
+            file_paths: Paths to the image files
+            
+        Returns:
+            Dict mapping each file path to its list of document dictionaries
+        """
+        logger.info(f"Processing {len(file_paths)} image(s)")
+        start_time = time.perf_counter()
+        
+        texts = {}
+        pending = {}
+        for file_path in file_paths:
+            cache_path = self._cache_path(file_path)
+            cached = self._read_cache(cache_path)
+            if cached is not None:
+                texts[file_path] = cached
             else:
-                logger.warning(f"Unsupported video/audio format: {file_extension}")
-                return []
-        except Exception as e:
-            logger.error(f"Error processing video/audio file {file_path}: {str(e)}")
-            return []
+                pending[file_path] = cache_path
+                
+        if pending:
+            executor = self._get_executor()
+            futures = {
+                file_path: executor.submit(_ocr_image, file_path, self.language,
+                                           OCR_MAX_WIDTH, OCR_TILE_HEIGHT)
+                for file_path in pending
+            }
+            for file_path, future in futures.items():
+                try:
+                    texts[file_path] = future.result()
+                    self._write_cache(pending[file_path], texts[file_path])
+                except BrokenProcessPool as e:
+                    # A worker died (e.g. killed for memory); the next batch gets a new pool
+                    logger.error(f"OCR worker pool broke on image {file_path}: {str(e)}")
+                    self._discard_executor(executor)
+                except Exception as e:
+                    logger.error(f"Error running OCR on image {file_path}: {str(e)}")
+                    
+        elapsed = time.perf_counter() - start_time
+        if pending and elapsed > 0:
+            workers = min(self.max_workers, len(pending))
+            rate = len(pending) / elapsed
+            logger.info(f"OCR of {len(pending)} image(s) took {elapsed:.2f}s: {rate:.2f} images/sec, "
+                        f"{rate / workers:.2f} images/sec per core ({workers} workers, "
+                        f"{len(file_paths) - len(pending)} served from cache)")
+                        
+        return {file_path: self._to_documents(file_path, texts[file_path])
+                for file_path in file_paths if file_path in texts}
+                
+    def close(self):
+        """Shut down the worker pool."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
             
-    def _process_video(self, file_path: str) -> List[Dict[str, Any]]:
-        """Extract audio from video and transcribe it."""
-        logger.info(f"Extracting audio from video: {file_path}")
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the worker pool on first use and keep it for later batches."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 initializer=_init_ocr_worker)
+        return self._executor
         
-        # Create a unique temporary file path
-        temp_audio_path = os.path.join(TEMP_DIR, f"{os.path.basename(file_path)}.wav")
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """Drop a broken worker pool so that _get_executor creates a new one."""
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False)
         
-        try:
-            # Extract audio from video
-            video = mp.VideoFileClip(file_path)
-            video.audio.write_audiofile(temp_audio_path, verbose=False, logger=None)
-            
-            # Process the extracted audio
-            result = self._process_audio(temp_audio_path)
-            
-            # Update metadata
-            for doc in result:
-                doc['metadata']['file_type'] = 'video'
-                doc['metadata']['original_file'] = os.path.basename(file_path)
-                doc['source'] = file_path
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error extracting audio from video {file_path}: {str(e)}")
+    def _to_documents(self, file_path: str, text: str) -> List[Dict[str, Any]]:
+        """Chunk OCR output into documents."""
+        if not text.strip():
+            logger.warning(f"No text extracted from image: {file_path}")
             return []
-        finally:
-            # Clean up temporary file
-            if os.path.exists(temp_audio_path):
-                try:
-                    os.remove(temp_audio_path)
-                except:
-                    pass
             
-    def _process_audio(self, file_path: str) -> List[Dict[str, Any]]:
-        """Transcribe audio to text."""
-        logger.info(f"Transcribing audio: {file_path}")
+        chunks = chunk_text(text)
+        return [{
+            'source': file_path,
+            'content': chunk,
+            'metadata': {
+                'file_type': 'image',
+                'filename': os.path.basename(file_path),
+                'chunk_index': i
+            }
+        } for i, chunk in enumerate(chunks)]
         
+    def _cache_path(self, file_path: str) -> Optional[str]:
+        """Cache file for an image, keyed by content hash and OCR settings."""
+        if not self.cache_dir:
+            return None
+        file_hash = get_file_hash(file_path)
+        if not file_hash:
+            return None
+        key = f"{file_hash}-{self.language}-{OCR_MAX_WIDTH}-{OCR_TILE_HEIGHT}"
+        return os.path.join(self.cache_dir, f"{key}.txt")
+        
+    def _read_cache(self, cache_path: Optional[str]) -> Optional[str]:
+        """Return cached OCR text, or None on a cache miss."""
+        if not cache_path or not os.path.exists(cache_path):
+            return None
         try:
-            with sr.AudioFile(file_path) as source:
-                audio_data = self.recognizer.record(source)
-                text = self.recognizer.recognize_google(audio_data)
-                
-                if not text.strip():
-                    logger.warning(f"No text transcribed from audio: {file_path}")
-                    return []
-                
-                chunks = chunk_text(text)
-                return [{
-                    'source': file_path,
-                    'content': chunk,
-                    'metadata': {
-                        'file_type': 'audio',
-                        'filename': os.path.basename(file_path),
-                        'chunk_index': i
-                    }
-                } for i, chunk in enumerate(chunks)]
-                
-        except Exception as e:
-            logger.error(f"Error transcribing audio {file_path}: {str(e)}")
-            return []
\ No newline at end of file
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError as e:
+            logger.warning(f"Could not read OCR cache {cache_path}: {str(e)}")
+            return None
+            
+    def _write_cache(self, cache_path: Optional[str], text: str):
+        """Store OCR text; written to a temp file first so readers never see partial results."""
+        if not cache_path:
+            return
+        try:
+            temp_path = f"{cache_path}.{os.getpid()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Could not write OCR cache {cache_path}: {str(e)}")
@@ -0,0 +1,52 @@
+from abc import ABC, abstractmethod
+import speech_recognition as sr
+from src.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class SpeechRecognizer(ABC):
+    """
+    Interface for speech-to-text engines used by the video processor.
+    
+    Implementations receive one segment of mono 16-bit PCM at a time and may
+    be called from several threads at once.
+    """
+    
+    @abstractmethod
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        """
+        Transcribe a segment of audio.
+        
+        Args:
+            pcm: Mono 16-bit little-endian PCM
+            sample_rate: Sample rate in Hz
+            
+        Returns:
+            Transcribed text ("" if no speech was recognized)
+        """
+
+
+class GoogleSpeechRecognizer(SpeechRecognizer):
+    """
+    Transcribes audio with the Google Web Speech API via SpeechRecognition.
+    """
+    
+    def __init__(self, language: str = "en-US"):
+        """
+        Initialize the recognizer.
+        
+        Args:
+            language: Language tag passed to the API
+        """
+        self.language = language
+        self.recognizer = sr.Recognizer()
+        
+    def transcribe(self, pcm: bytes, sample_rate: int) -> str:
+        """Transcribe a segment of audio with Google's API."""
+        audio_data = sr.AudioData(pcm, sample_rate, 2)
+        try:
+            return self.recognizer.recognize_google(audio_data, language=self.language)
+        except sr.UnknownValueError:
+            # The segment contained no intelligible speech
+            return ""
@@ -1,5 +1,5 @@
 import time
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import numpy as np
 from pymilvus import (
     connections,
@@ -12,6 +12,11 @@ from src.config import MILVUS_HOST, MILVUS_PORT, MILVUS_COLLECTION
 
 logger = setup_logger(__name__)
 
+def _quote(value: str) -> str:
+    """Quote a string for use in a Milvus boolean expression."""
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
 class MilvusStorage:
     """
     Storage service using Milvus vector database.
@@ -118,14 +123,35 @@ class MilvusStorage:
             logger.error(f"Failed to store documents in Milvus: {str(e)}")
             return False
     
+    def delete_by_source(self, source: str) -> bool:
+        """
+        Delete all chunks of a source, e.g. before storing an updated page.
+        
+        Args:
+            source: Source identifier of the chunks
+            
+        Returns:
+            True if successful
+        """
+        try:
+            self.collection.delete(f'source == {_quote(source)}')
+            self.collection.flush()
+            logger.info(f"Deleted chunks of {source} from Milvus")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to delete chunks of {source} from Milvus: {str(e)}")
+            return False
     
-       def search(self, query_embedding: List[float], top_k: int = 5) -> List[Dict[str, Any]]:
+    def search(self, query_embedding: List[float], top_k: int = 5,
+               include_embeddings: bool = False, ef: int = 64) -> List[Dict[str, Any]]:
         """
         Search for similar documents in Milvus.
         
         Args:
             query_embedding: Embedding vector to search for
             top_k: Number of results to return
+            include_embeddings: Also return each document's 'embedding'
+            ef: HNSW candidate list size; lower is faster but may miss neighbours
             
         Returns:
             List of document dictionaries with content, source, metadata, and score
@@ -138,29 +164,37 @@ class MilvusStorage:
             # Search parameters
             search_params = {
                 "metric_type": "COSINE",
-                "params": {"ef": 64}
+                # HNSW needs ef >= limit
+                "params": {"ef": max(ef, top_k)}
             }
             
+            output_fields = ["source", "content", "metadata"]
+            if include_embeddings:
+                output_fields.append("embedding")
+                
             # Perform search
             results = self.collection.search(
                 data=[query_embedding],
                 anns_field="embedding",
                 param=search_params,
                 limit=top_k,
-                output_fields=["source", "content", "metadata"]
+                output_fields=output_fields
             )
             
             # Format results
             documents = []
             for hits in results:
                 for hit in hits:
-                    documents.append({
+                    document = {
                         'id': hit.id,
                         'content': hit.entity.get('content'),
                         'source': hit.entity.get('source'),
                         'metadata': hit.entity.get('metadata'),
                         'score': hit.score
-                    })
+                    }
+                    if include_embeddings:
+                        document['embedding'] = hit.entity.get('embedding')
+                    documents.append(document)
             
             logger.info(f"Retrieved {len(documents)} documents from Milvus")
             return documents
@@ -169,6 +203,40 @@ class MilvusStorage:
             logger.error(f"Failed to search documents in Milvus: {str(e)}")
             return []
     
+    def get_chunks(self, keys: List[Tuple[str, int]]) -> List[Dict[str, Any]]:
+        """
+        Fetch chunks by source and chunk index in a single query.
+        
+        Args:
+            keys: (source, chunk_index) pairs
+            
+        Returns:
+            List of document dictionaries with id, content, source and metadata
+            (in no particular order; missing chunks are left out)
+        """
+        if not keys:
+            return []
+            
+        indexes = {}
+        for source, chunk_index in keys:
+            indexes.setdefault(source, set()).add(int(chunk_index))
+        expr = " or ".join(
+            f'(source == {_quote(source)} and metadata["chunk_index"] in {sorted(chunk_indexes)})'
+            for source, chunk_indexes in indexes.items()
+        )
+        
+        try:
+            rows = self.collection.query(expr=expr, output_fields=["source", "content", "metadata"])
+            return [{
+                'id': row.get('id'),
+                'content': row.get('content'),
+                'source': row.get('source'),
+                'metadata': row.get('metadata')
+            } for row in rows]
+        except Exception as e:
+            logger.error(f"Failed to fetch chunks from Milvus: {str(e)}")
+            return []
+            
     def clear(self) -> bool:
         """
         Clear all data in the collection.
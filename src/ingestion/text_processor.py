@@ -1,20 +1,73 @@
 import os
+import io
+import re
+import csv
 import json
-from typing import List, Dict, Any, Optional
+import time
+import shutil
+import tempfile
+import itertools
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Iterator, Tuple, BinaryIO, TextIO
 import PyPDF2
 import docx
 from src.utils.logger import setup_logger
-from src.utils.chunker import chunk_text
+from src.utils.helper import get_file_name
+from src.utils.chunker import chunk_text, chunk_records, stream_chunks
+from src.utils.html_extractor import HTMLTextExtractor
+from src.utils.json_stream import iter_json_records
+from src.config import PDF_PARALLEL_PAGE_THRESHOLD, PDF_PAGES_PER_TASK, PDF_WORKERS, SPOOL_MAX_MEMORY
 
 logger = setup_logger(__name__)
 
+# Characters read per block by the streaming handlers
+READ_BLOCK_SIZE = 65536
+
+MARKDOWN_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+MARKDOWN_FENCE = re.compile(r'^\s*(```|~~~)')
+
+
+def _extract_pdf_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Extract the text of a range of PDF pages.
+    
+    Runs inside worker processes, so each call opens its own reader.
+    
+    Args:
+        file_path: Path to the PDF file
+        start: Index of the first page to extract
+        end: Index one past the last page to extract
+        
+    Returns:
+        List of (page_index, page_text) tuples
+    """
+    pages = []
+    with open(file_path, 'rb') as f:
+        pdf_reader = PyPDF2.PdfReader(f)
+        for page_num in range(start, end):
+            pages.append((page_num, pdf_reader.pages[page_num].extract_text() or ""))
+    return pages
+
+
 class TextProcessor:
     """
-    Processes text-based files (TXT, JSON, DOCX, PDF) and extracts text content.
+    Processes text-based files (TXT, CSV, HTML, Markdown, XML, JSON, JSON Lines,
+    DOCX, PDF) and extracts text content.
     """
     
-    def __init__(self):
-        """Initialize the text processor."""
+    def __init__(self, pdf_parallel_threshold: int = PDF_PARALLEL_PAGE_THRESHOLD,
+                 pdf_workers: int = PDF_WORKERS):
+        """
+        Initialize the text processor.
+        
+        Args:
+            pdf_parallel_threshold: Page count from which PDFs are extracted across a process pool
+            pdf_workers: Number of worker processes used for large PDFs
+        """
+        self.pdf_parallel_threshold = pdf_parallel_threshold
+        self.pdf_workers = max(1, pdf_workers)
         logger.info("Text processor initialized")
         
     def process(self, file_path: str) -> List[Dict[str, Any]]:
@@ -27,118 +80,390 @@ class TextProcessor:
         Returns:
             List of document dictionaries with extracted text
         """
-        logger.info(f"Processing text file: {file_path}")
-        file_extension = os.path.splitext(file_path)[1].lower()
-        
         try:
-            if file_extension == '.txt':
-                return self._process_txt(file_path)
-            elif file_extension == '.json':
-                return self._process_json(file_path)
-            elif file_extension == '.pdf':
-                return self._process_pdf(file_path)
-            elif file_extension == '.docx':
-                return self._process_docx(file_path)
-            else:
-                logger.warning(f"Unsupported text file format: {file_extension}")
-                return self._process_as_text(file_path)
+            return list(self.iter_documents(file_path))
         except Exception as e:
             logger.error(f"Error processing text file {file_path}: {str(e)}")
             return []
+    
+    def iter_documents(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily extract documents from a text-based file.
+        
+        Streaming formats (plain text, CSV, Markdown, XML, JSON, JSON Lines, PDF)
+        yield chunks while the file is still being read, so callers can embed
+        and store them in batches.
+        
+        Args:
+            file_path: Path to the file
             
-    def _process_txt(self, file_path: str) -> List[Dict[str, Any]]:
-        """Process a TXT file."""
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            text = f.read()
+        Returns:
+            Iterator of document dictionaries with extracted text
+        """
+        with open(file_path, 'rb') as f:
+            yield from self.iter_stream_documents(f, file_path)
+    
+    def iter_stream_documents(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """
+        Lazily extract documents from a binary stream, e.g. an archive member.
         
-        chunks = chunk_text(text)
-        return [{
-            'source': file_path,
-            'content': chunk,
-            'metadata': {
-                'file_type': 'txt',
-                'filename': os.path.basename(file_path),
-                'chunk_index': i
-            }
-        } for i, chunk in enumerate(chunks)]
+        Args:
+            stream: Readable binary stream with the file content
+            source: Source identifier; its extension selects the handler
             
-    def _process_json(self, file_path: str) -> List[Dict[str, Any]]:
-        """Process a JSON file."""
-        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-            data = json.load(f)
+        Returns:
+            Iterator of document dictionaries with extracted text
+        """
+        logger.info(f"Processing text file: {source}")
+        file_extension = os.path.splitext(source)[1].lower()
         
-        if isinstance(data, dict):
-            text = json.dumps(data, indent=2)
-        elif isinstance(data, list):
-            text = '\n'.join(json.dumps(item, indent=2) for item in data)
+        if file_extension == '.txt':
+            yield from self._process_txt(stream, source)
+        elif file_extension == '.csv':
+            yield from self._process_csv(stream, source)
+        elif file_extension in ('.html', '.htm'):
+            yield from self._process_html(stream, source)
+        elif file_extension in ('.md', '.markdown'):
+            yield from self._process_markdown(stream, source)
+        elif file_extension == '.xml':
+            yield from self._process_xml(stream, source)
+        elif file_extension == '.json':
+            yield from self._process_json(stream, source)
+        elif file_extension in ('.jsonl', '.ndjson'):
+            yield from self._process_jsonl(stream, source)
+        elif file_extension == '.pdf':
+            yield from self._process_pdf(self._seekable(stream), source)
+        elif file_extension == '.docx':
+            yield from self._process_docx(self._seekable(stream), source)
         else:
-            text = str(data)
+            logger.warning(f"Unsupported text file format: {file_extension}")
+            yield from self._process_as_text(stream, source)
+            
+    def _text_stream(self, stream: BinaryIO, newline: Optional[str] = None) -> TextIO:
+        """Decode a binary stream as UTF-8 text, replacing invalid bytes."""
+        return io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline=newline)
+    
+    def _seekable(self, stream: BinaryIO) -> BinaryIO:
+        """Return a seekable version of stream, spooling it if necessary (e.g. tar members)."""
+        if stream.seekable():
+            return stream
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        shutil.copyfileobj(stream, spooled)
+        spooled.seek(0)
+        return spooled
+            
+    def _process_txt(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """Process a TXT file block by block."""
+        yield from self._stream_text_documents(stream, source, 'txt')
+            
+    def _process_csv(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """Process a CSV file in groups of rows, repeating the header in every chunk."""
+        with self._text_stream(stream, newline='') as f:
+            # Sniff the dialect from the first lines without seeking back,
+            # so non-seekable streams work too
+            sample = []
+            sample_size = 0
+            for line in f:
+                sample.append(line)
+                sample_size += len(line)
+                if sample_size >= READ_BLOCK_SIZE:
+                    break
+            try:
+                dialect = csv.Sniffer().sniff("".join(sample), delimiters=',;\t|')
+            except csv.Error:
+                dialect = csv.excel
+            
+            reader = csv.reader(itertools.chain(sample, f), dialect)
+            header = next(reader, None)
+            if header is None:
+                return
+            
+            # Serialize rows back to single CSV lines through a reusable buffer
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator='')
+            
+            def serialize(row):
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow(row)
+                return buffer.getvalue()
+            
+            rows = ((row_num, serialize(row)) for row_num, row in enumerate(reader, start=1) if row)
+            for i, group in enumerate(chunk_records(rows, header=serialize(header))):
+                yield {
+                    'source': source,
+                    'content': group['content'],
+                    'metadata': {
+                        'file_type': 'csv',
+                        'filename': get_file_name(source),
+                        'row_start': group['first_key'],
+                        'row_end': group['last_key'],
+                        'chunk_index': i
+                    }
+                }
+            
+    def _process_html(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """Process an HTML file, stripping markup and boilerplate in a single pass."""
+        extractor = HTMLTextExtractor()
         
-        chunks = chunk_text(text)
-        return [{
-            'source': file_path,
-            'content': chunk,
-            'metadata': {
-                'file_type': 'json',
-                'filename': os.path.basename(file_path),
+        def lines():
+            # Lines inside <main> are chunked while the rest is still being parsed
+            with self._text_stream(stream) as f:
+                for block in iter(lambda: f.read(READ_BLOCK_SIZE), ''):
+                    extractor.feed(block)
+                    yield from extractor.drain()
+            extractor.close()
+            yield from extractor.content_lines()
+            
+        for i, chunk in enumerate(stream_chunks(line + "\n" for line in lines())):
+            yield {
+                'source': source,
+                'content': chunk,
+                'metadata': {
+                    'file_type': 'html',
+                    'filename': get_file_name(source),
+                    'title': extractor.title or get_file_name(source),
+                    'chunk_index': i
+                }
+            }
+            
+    def _process_markdown(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """Process a Markdown file section by section, keyed by its heading path."""
+        def sections(f):
+            headings = []
+            lines = []
+            in_fence = False
+            for line in f:
+                if MARKDOWN_FENCE.match(line):
+                    in_fence = not in_fence
+                match = None if in_fence else MARKDOWN_HEADING.match(line)
+                if match:
+                    if any(l.strip() for l in lines):
+                        yield " > ".join(headings), "".join(lines).strip()
+                    level = len(match.group(1))
+                    headings = headings[:level - 1] + [match.group(2)]
+                    lines = []
+                lines.append(line)
+            if any(l.strip() for l in lines):
+                yield " > ".join(headings), "".join(lines).strip()
+        
+        with self._text_stream(stream) as f:
+            for i, group in enumerate(chunk_records(sections(f))):
+                metadata = {
+                    'file_type': 'markdown',
+                    'filename': get_file_name(source),
+                    'section': group['first_key'],
+                    'chunk_index': i
+                }
+                if group['last_key'] != group['first_key']:
+                    metadata['section_end'] = group['last_key']
+                yield {
+                    'source': source,
+                    'content': group['content'],
+                    'metadata': metadata
+                }
+            
+    def _process_xml(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """
+        Process an XML file with iterparse, one record per child of the root element.
+        
+        Records are rendered as "tag attr=value: text" lines and cleared from
+        the tree as soon as they are serialized, so memory stays bounded.
+        """
+        def local_name(tag):
+            return tag.rsplit('}', 1)[-1] if isinstance(tag, str) else str(tag)
+        
+        def render(elem):
+            lines = []
+            for el in elem.iter():
+                if not isinstance(el.tag, str):
+                    continue
+                text = (el.text or "").strip()
+                attrs = " ".join(f"{local_name(k)}={v}" for k, v in el.attrib.items())
+                if text or attrs:
+                    label = f"{local_name(el.tag)} {attrs}".strip()
+                    lines.append(f"{label}: {text}" if text else label)
+            return "\n".join(lines)
+        
+        def records(f):
+            root = None
+            depth = 0
+            index = 0
+            for event, elem in ET.iterparse(f, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = elem
+                    depth += 1
+                    continue
+                depth -= 1
+                if depth == 1:
+                    text = render(elem)
+                    if text:
+                        yield f"/{local_name(root.tag)}/{local_name(elem.tag)}[{index}]", text
+                    index += 1
+                    root.clear()
+                elif depth == 0 and index == 0:
+                    # Root without child elements
+                    text = render(elem)
+                    if text:
+                        yield f"/{local_name(elem.tag)}", text
+        
+        for i, group in enumerate(chunk_records(records(stream))):
+            metadata = {
+                'file_type': 'xml',
+                'filename': get_file_name(source),
+                'xml_path': group['first_key'],
+                'record_count': group['record_count'],
                 'chunk_index': i
             }
-        } for i, chunk in enumerate(chunks)]
+            if group['last_key'] != group['first_key']:
+                metadata['xml_path_end'] = group['last_key']
+            yield {
+                'source': source,
+                'content': group['content'],
+                'metadata': metadata
+            }
             
-    def _process_pdf(self, file_path: str) -> List[Dict[str, Any]]:
-        """Process a PDF file."""
-        text = ""
-        with open(file_path, 'rb') as f:
-            pdf_reader = PyPDF2.PdfReader(f)
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                if page_text:
-                    text += f"Page {page_num + 1}:\n{page_text}\n\n"
+    def _stream_text_documents(self, stream: BinaryIO, source: str, file_type: str) -> Iterator[Dict[str, Any]]:
+        """Chunk a plain text file block by block without reading it into memory."""
+        with self._text_stream(stream) as f:
+            blocks = iter(lambda: f.read(READ_BLOCK_SIZE), '')
+            for i, chunk in enumerate(stream_chunks(blocks)):
+                yield {
+                    'source': source,
+                    'content': chunk,
+                    'metadata': {
+                        'file_type': file_type,
+                        'filename': get_file_name(source),
+                        'chunk_index': i
+                    }
+                }
+            
+    def _process_json(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """Stream a JSON file record by record into compact chunks."""
+        with self._text_stream(stream) as f:
+            records = (
+                (path, json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+                for path, value in iter_json_records(f)
+            )
+            yield from self._record_documents(source, 'json', records)
+            
+    def _process_jsonl(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """Stream a JSON Lines file, one record per line, into compact chunks."""
+        def records(f):
+            for line_num, line in enumerate(f):
+                if not line.strip():
+                    continue
+                try:
+                    value = json.loads(line)
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Skipping invalid JSON on line {line_num + 1} of {source}: {str(e)}")
+                    continue
+                yield f"$[{line_num}]", json.dumps(value, ensure_ascii=False, separators=(',', ':'))
         
-        chunks = chunk_text(text)
-        return [{
-            'source': file_path,
-            'content': chunk,
-            'metadata': {
-                'file_type': 'pdf',
-                'filename': os.path.basename(file_path),
+        with self._text_stream(stream) as f:
+            yield from self._record_documents(source, 'jsonl', records(f))
+            
+    def _record_documents(self, source: str, file_type: str,
+                          records: Iterator[Tuple[str, str]]) -> Iterator[Dict[str, Any]]:
+        """Group (json_path, text) records into chunks and wrap them as documents."""
+        for i, group in enumerate(chunk_records(records)):
+            metadata = {
+                'file_type': file_type,
+                'filename': get_file_name(source),
+                'json_path': group['first_key'],
+                'record_count': group['record_count'],
                 'chunk_index': i
             }
-        } for i, chunk in enumerate(chunks)]
+            if group['last_key'] != group['first_key']:
+                metadata['json_path_end'] = group['last_key']
+            yield {
+                'source': source,
+                'content': group['content'],
+                'metadata': metadata
+            }
+            
+    def _process_pdf(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
+        """Process a PDF file, chunking each page as soon as it is extracted."""
+        start_time = time.perf_counter()
+        chunk_index = 0
+        
+        for page_num, page_text in self._iter_pdf_pages(stream, source):
+            if not page_text.strip():
+                continue
+            for chunk in chunk_text(page_text):
+                yield {
+                    'source': source,
+                    'content': chunk,
+                    'metadata': {
+                        'file_type': 'pdf',
+                        'filename': get_file_name(source),
+                        'page': page_num + 1,
+                        'chunk_index': chunk_index
+                    }
+                }
+                chunk_index += 1
+        
+        logger.info(f"Extracted {chunk_index} chunks from {source} "
+                    f"in {time.perf_counter() - start_time:.2f}s")
+    
+    def _iter_pdf_pages(self, stream: BinaryIO, source: str) -> Iterator[Tuple[int, str]]:
+        """
+        Yield (page_index, page_text) in page order.
+        
+        Small PDFs are read in-process; from `pdf_parallel_threshold` pages on,
+        page ranges are extracted across a process pool and yielded as each
+        range completes.
+        """
+        pdf_reader = PyPDF2.PdfReader(stream)
+        num_pages = len(pdf_reader.pages)
+        
+        # Worker processes reopen the file, so streams without a path stay in-process
+        if (num_pages < self.pdf_parallel_threshold or self.pdf_workers == 1
+                or not os.path.isfile(source)):
+            for page_num in range(num_pages):
+                yield page_num, pdf_reader.pages[page_num].extract_text() or ""
+            return
+        
+        # Split the document into page ranges, one task per range
+        ranges = [
+            (start, min(start + PDF_PAGES_PER_TASK, num_pages))
+            for start in range(0, num_pages, PDF_PAGES_PER_TASK)
+        ]
+        workers = min(self.pdf_workers, len(ranges))
+        logger.info(f"Extracting {num_pages} pages from {source} with {workers} processes")
+        
+        # Spawned workers do not inherit the parent's threads and locks, which a fork can copy mid-use
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+            # map() keeps submission order, so pages still arrive in sequence
+            results = executor.map(
+                _extract_pdf_pages,
+                [source] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges]
+            )
+            for pages in results:
+                yield from pages
             
-    def _process_docx(self, file_path: str) -> List[Dict[str, Any]]:
+    def _process_docx(self, stream: BinaryIO, source: str) -> List[Dict[str, Any]]:
         """Process a DOCX file."""
-        doc = docx.Document(file_path)
+        doc = docx.Document(stream)
         text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
         
         chunks = chunk_text(text)
         return [{
-            'source': file_path,
+            'source': source,
             'content': chunk,
             'metadata': {
                 'file_type': 'docx',
-                'filename': os.path.basename(file_path),
+                'filename': get_file_name(source),
                 'chunk_index': i
             }
         } for i, chunk in enumerate(chunks)]
             
-    def _process_as_text(self, file_path: str) -> List[Dict[str, Any]]:
+    def _process_as_text(self, stream: BinaryIO, source: str) -> Iterator[Dict[str, Any]]:
         """Process any file as plain text."""
         try:
-            with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
-                text = f.read()
-            
-            chunks = chunk_text(text)
-            return [{
-                'source': file_path,
-                'content': chunk,
-                'metadata': {
-                    'file_type': 'unknown_text',
-                    'filename': os.path.basename(file_path),
-                    'chunk_index': i
-                }
-            } for i, chunk in enumerate(chunks)]
+            yield from self._stream_text_documents(stream, source, 'unknown_text')
         except Exception as e:
-            logger.error(f"Failed to process {file_path} as text: {str(e)}")
-            return []
\ No newline at end of file
+            logger.error(f"Failed to process {source} as text: {str(e)}")
@@ -1,20 +1,297 @@
-import speech_recognition as sr
-from pydub import AudioSegment
 import os
+import time
+import wave
+import shutil
+import threading
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, BinaryIO
+import numpy as np
+from src.ingestion.audio_segmenter import segment_pcm
+from src.ingestion.speech_recognizer import SpeechRecognizer, GoogleSpeechRecognizer
+from src.utils.logger import setup_logger
+from src.utils.chunker import chunk_records
+from src.config import TRANSCRIPTION_WORKERS, FFMPEG_BINARY
 
-class VideoProcessor:
-    """Converts audio/video speech to text using SpeechRecognition."""
+# Sample rate audio is resampled to before segmentation and recognition
+TRANSCRIPTION_SAMPLE_RATE = 16000
 
-    def __init__(self, audio_format="wav"):
-        """Initialize audio format (default: wav)."""
-        self.audio_format = audio_format
-        self.recognizer = sr.Recognizer()
+logger = setup_logger(__name__)
+
+
+def _feed_stdin(stream: BinaryIO, stdin: BinaryIO):
+    """Copy a stream into a decoder's stdin; runs on its own thread."""
+    try:
+        shutil.copyfileobj(stream, stdin)
+    except (BrokenPipeError, ValueError):
+        # The decoder exited or was killed before reading all input
+        pass
+    finally:
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def _drain_stderr(stderr: BinaryIO, lines: deque):
+    """Read a decoder's stderr until EOF, keeping its last lines; runs on its own thread."""
+    for line in stderr:
+        lines.append(line.decode('utf-8', errors='replace').strip())
 
+class VideoProcessor:
+    """
+    Processes video and audio files and extracts text through transcription.
+    """
+    
+    def __init__(self, audio_format: str = "wav", recognizer: Optional[SpeechRecognizer] = None,
+                 max_workers: int = TRANSCRIPTION_WORKERS):
+        """
+        Initialize the video processor.
+        
+        Args:
+            audio_format: Audio format used by convert_audio (default: wav)
+            recognizer: Speech-to-text engine (default: Google Web Speech API)
+            max_workers: Number of audio segments transcribed concurrently
+        """
+        self.audio_format = audio_format
+        self.recognizer = recognizer or GoogleSpeechRecognizer()
+        self.max_workers = max(1, max_workers)
+        logger.info("Video processor initialized")
+        
+    def process(self, file_path: str) -> List[Dict[str, Any]]:
+        """
+        Process a video or audio file and extract transcribed text.
+        
+        Args:
+            file_path: Path to the video/audio file
+            
+        Returns:
+            List of document dictionaries with extracted text
+        """
+        logger.info(f"Processing video/audio file: {file_path}")
+        
+        video_formats = ['.mp4', '.avi', '.mov', '.mkv', '.webm', '.flv']
+        audio_formats = ['.mp3', '.wav', '.ogg', '.flac', '.aac']
+        file_extension = os.path.splitext(file_path)[1].lower()
+        
+        try:
+            if file_extension in video_formats:
+                return self._process_video(file_path)
+            elif file_extension in audio_formats:
+                return self._process_audio(file_path)
+            else:
+                logger.warning(f"Unsupported video/audio format: {file_extension}")
+                return []
+        except Exception as e:
+            logger.error(f"Error processing video/audio file {file_path}: {str(e)}")
+            return []
+            
+    def process_stream(self, stream: BinaryIO, source: str) -> List[Dict[str, Any]]:
+        """
+        Transcribe audio read from a stream, e.g. an archive member.
+        
+        The stream is piped into the decoder, so nothing is written to disk.
+        Container formats that need seeking (most video files) should be
+        passed to process() as a path instead.
+        
+        Args:
+            stream: Readable binary stream with the encoded audio
+            source: Source identifier of the audio
+            
+        Returns:
+            List of document dictionaries with extracted text
+        """
+        logger.info(f"Transcribing audio stream: {source}")
+        
+        try:
+            return self._transcribe_documents(self._decode_pcm(source, stream), source, 'audio')
+        except Exception as e:
+            logger.error(f"Error transcribing audio stream {source}: {str(e)}")
+            return []
+            
+    def _process_video(self, file_path: str) -> List[Dict[str, Any]]:
+        """Decode the audio track of a video and transcribe it."""
+        logger.info(f"Transcribing audio track of video: {file_path}")
+        
+        try:
+            return self._transcribe_documents(self._decode_pcm(file_path), file_path, 'video')
+        except Exception as e:
+            logger.error(f"Error transcribing video {file_path}: {str(e)}")
+            return []
+            
+    def _process_audio(self, file_path: str) -> List[Dict[str, Any]]:
+        """Split audio into segments at pauses and transcribe them concurrently."""
+        logger.info(f"Transcribing audio: {file_path}")
+        
+        try:
+            return self._transcribe_documents(self._read_pcm_frames(file_path), file_path, 'audio')
+        except Exception as e:
+            logger.error(f"Error transcribing audio {file_path}: {str(e)}")
+            return []
+            
+    def _transcribe_documents(self, frames: Iterable[bytes], source: str,
+                              file_type: str) -> List[Dict[str, Any]]:
+        """Segment and transcribe a PCM stream and group the transcripts into documents."""
+        transcripts = (
+            ((segment['start'], segment['end']), text)
+            for segment, text in self._transcribe_segments(segment_pcm(frames, TRANSCRIPTION_SAMPLE_RATE))
+            if text.strip()
+        )
+        
+        documents = []
+        for i, group in enumerate(chunk_records(transcripts)):
+            documents.append({
+                'source': source,
+                'content': group['content'],
+                'metadata': {
+                    'file_type': file_type,
+                    'filename': os.path.basename(source),
+                    'start_time': round(group['first_key'][0], 2),
+                    'end_time': round(group['last_key'][1], 2),
+                    'chunk_index': i
+                }
+            })
+        
+        if not documents:
+            logger.warning(f"No text transcribed from {file_type}: {source}")
+        return documents
+    
+    def _transcribe_segments(self, segments: Iterable[Dict[str, Any]]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """
+        Transcribe segments concurrently, yielding (segment, text) in segment order.
+        
+        At most twice as many segments as workers are in flight, so audio is
+        never buffered far ahead of the recognizer.
+        """
+        start_time = time.perf_counter()
+        audio_seconds = 0.0
+        count = 0
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = deque()
+            for segment in segments:
+                future = executor.submit(self.recognizer.transcribe, segment['pcm'], TRANSCRIPTION_SAMPLE_RATE)
+                in_flight.append((segment, future))
+                if len(in_flight) >= 2 * self.max_workers:
+                    yield self._segment_result(*in_flight.popleft())
+                audio_seconds += segment['end'] - segment['start']
+                count += 1
+            while in_flight:
+                yield self._segment_result(*in_flight.popleft())
+        
+        logger.info(f"Transcribed {count} segments ({audio_seconds:.1f}s of audio) in "
+                    f"{time.perf_counter() - start_time:.2f}s with {self.max_workers} workers")
+    
+    def _segment_result(self, segment: Dict[str, Any], future) -> Tuple[Dict[str, Any], str]:
+        """Wait for a segment's transcription; failed segments yield no text."""
+        try:
+            text = future.result()
+        except Exception as e:
+            logger.error(f"Error transcribing segment {segment['start']:.1f}-{segment['end']:.1f}s: {str(e)}")
+            text = ""
+        # The PCM is no longer needed once the segment is transcribed
+        return {key: value for key, value in segment.items() if key != 'pcm'}, text
+    
+    def _read_pcm_frames(self, file_path: str, frame_seconds: float = 1.0) -> Iterator[bytes]:
+        """
+        Yield the audio of a file as mono 16-bit PCM at TRANSCRIPTION_SAMPLE_RATE.
+        
+        WAV files already in that format are read directly; everything else
+        goes through the ffmpeg decoder.
+        """
+        if file_path.lower().endswith('.wav'):
+            with wave.open(file_path, 'rb') as wav:
+                if wav.getframerate() == TRANSCRIPTION_SAMPLE_RATE and wav.getsampwidth() == 2:
+                    channels = wav.getnchannels()
+                    frames_per_read = int(TRANSCRIPTION_SAMPLE_RATE * frame_seconds)
+                    while True:
+                        data = wav.readframes(frames_per_read)
+                        if not data:
+                            return
+                        if channels > 1:
+                            samples = np.frombuffer(data, dtype=np.int16).reshape(-1, channels)
+                            data = samples.mean(axis=1).astype(np.int16).tobytes()
+                        yield data
+        
+        yield from self._decode_pcm(file_path, frame_seconds=frame_seconds)
+        
+    def _decode_pcm(self, source: str, stream: Optional[BinaryIO] = None,
+                    frame_seconds: float = 1.0) -> Iterator[bytes]:
+        """
+        Decode the audio of a file or stream to PCM through an ffmpeg pipe.
+        
+        ffmpeg writes mono 16-bit PCM to stdout, which is read in fixed-size
+        frames, so memory use does not depend on the length of the input and
+        each call has its own pipes. If the consumer stops early the decoder
+        is killed.
+        
+        Args:
+            source: Path of the input file, or the identifier of the stream
+            stream: Optional stream fed to ffmpeg's stdin instead of reading source
+            frame_seconds: Length of the yielded frames in seconds
+            
+        Returns:
+            Iterator of PCM byte strings
+        """
+        if shutil.which(FFMPEG_BINARY) is None:
+            raise RuntimeError(f"ffmpeg not found (FFMPEG_BINARY={FFMPEG_BINARY})")
+            
+        command = [FFMPEG_BINARY, '-loglevel', 'error']
+        if stream is None:
+            command += ['-nostdin', '-i', source]
+        else:
+            command += ['-i', 'pipe:0']
+        command += ['-vn', '-f', 's16le', '-acodec', 'pcm_s16le',
+                    '-ac', '1', '-ar', str(TRANSCRIPTION_SAMPLE_RATE), 'pipe:1']
+        
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE if stream is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        
+        writer = None
+        if stream is not None:
+            writer = threading.Thread(target=_feed_stdin, args=(stream, process.stdin), daemon=True)
+            writer.start()
+            
+        # stderr is drained alongside stdout so ffmpeg never blocks on a full pipe
+        errors = deque(maxlen=20)
+        reader = threading.Thread(target=_drain_stderr, args=(process.stderr, errors), daemon=True)
+        reader.start()
+        
+        frame_size = int(TRANSCRIPTION_SAMPLE_RATE * frame_seconds) * 2
+        try:
+            while True:
+                data = process.stdout.read(frame_size)
+                if not data:
+                    break
+                yield data
+                
+            if process.wait() != 0:
+                reader.join()
+                error = "\n".join(line for line in errors if line)
+                raise RuntimeError(f"ffmpeg failed to decode {source}: {error}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            reader.join()
+            process.stdout.close()
+            process.stderr.close()
+            if writer is not None:
+                writer.join()
+                
     def convert_audio(self, input_path, output_path):
         """Converts audio/video file to WAV format for processing."""
         try:
-            audio = AudioSegment.from_file(input_path)
-            audio.export(output_path, format="wav")
+            subprocess.run(
+                [FFMPEG_BINARY, '-nostdin', '-loglevel', 'error', '-y', '-i', input_path,
+                 '-vn', '-ac', '1', '-ar', str(TRANSCRIPTION_SAMPLE_RATE), output_path],
+                check=True, capture_output=True
+            )
             return output_path
         except Exception as e:
             return f"Error converting file: {str(e)}"
@@ -22,10 +299,9 @@ class VideoProcessor:
     def extract_text(self, audio_path):
         """Extracts speech-to-text from an audio file."""
         try:
-            with sr.AudioFile(audio_path) as source:
-                audio_data = self.recognizer.record(source)
-                text = self.recognizer.recognize_google(audio_data)  # Using Google's STT API
-                return text.strip()
+            segments = segment_pcm(self._read_pcm_frames(audio_path), TRANSCRIPTION_SAMPLE_RATE)
+            texts = [text.strip() for _, text in self._transcribe_segments(segments) if text.strip()]
+            return " ".join(texts)
         except Exception as e:
             return f"Error processing audio: {str(e)}"
 
@@ -33,10 +309,7 @@ class VideoProcessor:
 if __name__ == "__main__":
     processor = VideoProcessor()
     
-    # Convert MP3 to WAV (if needed)
-    wav_path = processor.convert_audio("sample_audio.mp3", "sample_audio.wav")
-    
-    # Extract text from WAV
-    text = processor.extract_text(wav_path)
+    # Any format ffmpeg can decode is transcribed directly
+    text = processor.extract_text("sample_audio.mp3")
     
     print("Extracted Speech-to-Text:\n", text)
@@ -0,0 +1,204 @@
+import asyncio
+import xml.etree.ElementTree as ET
+from typing import List, Dict, Any, Optional, AsyncIterator, Iterable, Set
+from urllib.parse import urlparse
+import httpx
+from src.ingestion.web_scraper import WebScraper
+from src.utils.logger import setup_logger
+from src.config import (
+    CRAWL_MAX_DEPTH, CRAWL_MAX_PAGES, CRAWL_CONCURRENCY,
+    CRAWL_DOMAIN_CONCURRENCY, CRAWL_DOMAIN_RATE_LIMIT, CRAWL_TIMEOUT, HTTP_CACHE_PATH
+)
+
+logger = setup_logger(__name__)
+
+# Limit on sitemap indexes pointing at further sitemaps
+MAX_SITEMAP_DEPTH = 3
+
+
+class _DomainLimiter:
+    """
+    Caps concurrent requests to one domain and spaces out their start times.
+    """
+    
+    def __init__(self, concurrency: int, rate_limit: float):
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.interval = 1.0 / rate_limit if rate_limit > 0 else 0.0
+        self.next_start = 0.0
+        
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        if self.interval:
+            # Reserve the next start slot; the event loop is single-threaded, so no lock is needed
+            now = asyncio.get_running_loop().time()
+            start = max(now, self.next_start)
+            self.next_start = start + self.interval
+            if start > now:
+                await asyncio.sleep(start - now)
+                
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+
+class WebCrawler:
+    """
+    Crawls web sites concurrently over a pooled asyncio HTTP client.
+    
+    Pages are fetched from seed URLs and/or sitemaps, and same-domain links
+    are followed up to a maximum depth. Pages are yielded as soon as they have
+    been parsed, so they can be embedded while the crawl continues.
+    """
+    
+    def __init__(self, scraper: Optional[WebScraper] = None, max_depth: int = CRAWL_MAX_DEPTH,
+                 max_pages: int = CRAWL_MAX_PAGES, concurrency: int = CRAWL_CONCURRENCY,
+                 domain_concurrency: int = CRAWL_DOMAIN_CONCURRENCY,
+                 domain_rate_limit: float = CRAWL_DOMAIN_RATE_LIMIT, timeout: float = CRAWL_TIMEOUT):
+        """
+        Initialize the crawler.
+        
+        Args:
+            scraper: Scraper used to turn pages into documents (default: one caching validators at HTTP_CACHE_PATH)
+            max_depth: Number of link hops followed from the seed URLs (0 = seeds only)
+            max_pages: Maximum number of pages fetched per crawl
+            concurrency: Maximum number of requests in flight across all domains
+            domain_concurrency: Maximum number of requests in flight per domain
+            domain_rate_limit: Maximum requests started per second per domain (0 = unlimited)
+            timeout: Request timeout in seconds
+        """
+        self.scraper = scraper or WebScraper(timeout=timeout, cache_path=HTTP_CACHE_PATH)
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = max(1, concurrency)
+        self.domain_concurrency = domain_concurrency
+        self.domain_rate_limit = domain_rate_limit
+        self.timeout = timeout
+        logger.info("Web crawler initialized")
+        
+    async def crawl(self, urls: Iterable[str] = (), sitemaps: Iterable[str] = ()) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Crawl from seed URLs and sitemaps.
+        
+        Only links on the domains of the seeds and sitemaps are followed, and
+        every URL is fetched at most once. Requests are conditional on the
+        scraper's cache; the links of unchanged pages come from the cache.
+        
+        Args:
+            urls: Seed URLs
+            sitemaps: Sitemap URLs whose entries are added as seeds
+            
+        Returns:
+            Async iterator of fetch results (see WebScraper.handle_response)
+            with 'depth' added; failed pages have status 'failed' and 'error'
+        """
+        limits = httpx.Limits(max_connections=self.concurrency,
+                              max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(headers=self.scraper.headers, timeout=self.timeout,
+                                     limits=limits, follow_redirects=True) as client:
+            seeds = list(urls)
+            for sitemap in sitemaps:
+                seeds.extend(await self._read_sitemap(client, sitemap))
+                
+            domains = {urlparse(url).netloc for url in seeds}
+            domains.update(urlparse(sitemap).netloc for sitemap in sitemaps)
+            
+            frontier = asyncio.Queue()
+            # Bounded so fetching pauses while the consumer is busy with earlier pages
+            results = asyncio.Queue(maxsize=2 * self.concurrency)
+            seen = set()
+            limiters = {}
+            
+            def enqueue(url: str, depth: int):
+                if url in seen or len(seen) >= self.max_pages:
+                    return
+                if urlparse(url).netloc not in domains:
+                    return
+                seen.add(url)
+                frontier.put_nowait((url, depth))
+                
+            for url in seeds:
+                enqueue(url, 0)
+                
+            async def worker():
+                while True:
+                    url, depth = await frontier.get()
+                    try:
+                        page = await self._fetch_page(client, limiters, url, depth)
+                        links = page.pop('links', [])
+                        if depth < self.max_depth:
+                            # Enqueued before task_done, so the crawl cannot finish early
+                            for link in links:
+                                enqueue(link, depth + 1)
+                        await results.put(page)
+                    finally:
+                        frontier.task_done()
+                        
+            async def finish():
+                await frontier.join()
+                await results.put(None)
+                
+            tasks = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            tasks.append(asyncio.create_task(finish()))
+            try:
+                while True:
+                    page = await results.get()
+                    if page is None:
+                        break
+                    yield page
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                
+            logger.info(f"Crawl complete: {len(seen)} pages across {len(domains)} domain(s)")
+            
+    async def _fetch_page(self, client: httpx.AsyncClient, limiters: Dict[str, _DomainLimiter],
+                          url: str, depth: int) -> Dict[str, Any]:
+        """Fetch and parse one page; failures are reported in the result instead of raised."""
+        domain = urlparse(url).netloc
+        if domain not in limiters:
+            limiters[domain] = _DomainLimiter(self.domain_concurrency, self.domain_rate_limit)
+            
+        try:
+            # The validators come from the scraper's SQLite cache
+            headers = await asyncio.to_thread(self.scraper.conditional_headers, url)
+            async with limiters[domain]:
+                response = await client.get(url, headers=headers)
+                
+            # Parsing is CPU-bound, so it runs off the event loop
+            page = await asyncio.to_thread(self.scraper.handle_response, url, response.status_code,
+                                           response.headers, response.text)
+            page['depth'] = depth
+            return page
+            
+        except Exception as e:
+            logger.error(f"Error crawling URL {url}: {str(e)}")
+            return {'url': url, 'depth': depth, 'status': 'failed', 'documents': [], 'error': str(e)}
+            
+    async def _read_sitemap(self, client: httpx.AsyncClient, sitemap_url: str,
+                            depth: int = 0, visited: Optional[Set[str]] = None) -> List[str]:
+        """Return the page URLs listed in a sitemap, following sitemap indexes."""
+        visited = visited if visited is not None else set()
+        if sitemap_url in visited or depth > MAX_SITEMAP_DEPTH:
+            return []
+        visited.add(sitemap_url)
+        
+        try:
+            response = await client.get(sitemap_url)
+            response.raise_for_status()
+            root = ET.fromstring(response.content)
+        except Exception as e:
+            logger.error(f"Error reading sitemap {sitemap_url}: {str(e)}")
+            return []
+            
+        # Tags are namespaced, so match on the local name
+        locations = [
+            element.text.strip() for element in root.iter()
+            if element.tag.rsplit('}', 1)[-1] == 'loc' and element.text
+        ]
+        if root.tag.rsplit('}', 1)[-1] != 'sitemapindex':
+            return locations
+            
+        urls = []
+        for location in locations:
+            urls.extend(await self._read_sitemap(client, location, depth + 1, visited))
+        return urls
@@ -1,24 +1,43 @@
-import os
+import hashlib
 import requests
-import tempfile
-from typing import List, Dict, Any, Optional
-from urllib.parse import urlparse
-from bs4 import BeautifulSoup
+from typing import List, Dict, Any, Tuple, Optional, Mapping
+from urllib.parse import urlparse, urljoin, urldefrag
 from src.utils.logger import setup_logger
 from src.utils.chunker import chunk_text
+from src.utils.html_extractor import get_extractor
+from src.ingestion.http_cache import HTTPCache
+from src.config import CRAWL_TIMEOUT, HTML_EXTRACTOR_BACKEND
 
 logger = setup_logger(__name__)
 
+# Content types parsed as pages; anything else is fetched but not ingested
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+
 class WebScraper:
     """
     Scrapes content from web pages.
     """
     
-    def __init__(self):
-        """Initialize the web scraper."""
+    def __init__(self, timeout: float = CRAWL_TIMEOUT, cache_path: Optional[str] = None,
+                 backend: str = HTML_EXTRACTOR_BACKEND):
+        """
+        Initialize the web scraper.
+        
+        Args:
+            timeout: Request timeout in seconds
+            cache_path: SQLite file for the validators of fetched pages (None disables caching;
+                the pipeline passes HTTP_CACHE_PATH)
+            backend: HTML extraction backend ("auto", "selectolax", "lxml" or "html.parser")
+        """
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
+        self.timeout = timeout
+        # Reuse connections across calls to process()
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.cache = HTTPCache(cache_path) if cache_path else None
+        self.extract = get_extractor(backend)
         logger.info("Web scraper initialized")
         
     def process(self, url: str) -> List[Dict[str, Any]]:
@@ -35,54 +54,142 @@ class WebScraper:
         
         try:
             # Send a GET request
-            response = requests.get(url, headers=self.headers, timeout=10)
+            response = self.session.get(url, timeout=self.timeout)
             response.raise_for_status()
             
-            # Parse HTML content
-            soup = BeautifulSoup(response.text, 'html.parser')
+            documents, _ = self.parse(url, response.text)
+            return documents
             
-            # Extract title
-            title = soup.title.text.strip() if soup.title else "No title"
+        except Exception as e:
+            logger.error(f"Error scraping URL {url}: {str(e)}")
+            return []
             
-            # Remove unwanted elements
-            for tag in soup(['script', 'style', 'nav', 'footer', 'iframe']):
-                tag.decompose()
+    def fetch(self, url: str) -> Dict[str, Any]:
+        """
+        Fetch a URL with a conditional request and extract it if it changed.
+        
+        The cache is not updated here; call commit() with the result once its
+        documents have been stored, so a failed store is retried next time.
+        
+        Args:
+            url: URL to fetch
             
-            # Extract main content
-            main_content = soup.find('main') or soup.find('article') or soup.find('body')
+        Returns:
+            Result dict from handle_response(), or with status 'failed' and 'error'
+        """
+        logger.info(f"Fetching URL: {url}")
+        
+        try:
+            response = self.session.get(url, headers=self.conditional_headers(url), timeout=self.timeout)
+            return self.handle_response(url, response.status_code, response.headers, response.text)
+        except Exception as e:
+            logger.error(f"Error scraping URL {url}: {str(e)}")
+            return {'url': url, 'status': 'failed', 'documents': [], 'links': [], 'error': str(e)}
             
-            if main_content:
-                # Extract text and clean it
-                text = main_content.get_text(separator='\n')
-                lines = [line.strip() for line in text.split('\n') if line.strip()]
-                content = "\n".join(lines)
-            else:
-                content = soup.get_text(separator='\n')
-                lines = [line.strip() for line in content.split('\n') if line.strip()]
-                content = "\n".join(lines)
+    def conditional_headers(self, url: str) -> Dict[str, str]:
+        """Return the If-None-Match / If-Modified-Since headers for a previously fetched URL."""
+        return self.cache.conditional_headers(url) if self.cache else {}
+        
+    def handle_response(self, url: str, status_code: int, headers: Mapping[str, str],
+                        text: str) -> Dict[str, Any]:
+        """
+        Turn an HTTP response into a fetch result.
+        
+        Pages answered with 304 Not Modified, or whose body hashes the same as
+        last time, are reported as unchanged without being parsed.
+        
+        Args:
+            url: URL that was fetched
+            status_code: HTTP status code
+            headers: Response headers (case-insensitive mapping)
+            text: Decoded response body
             
-            if not content.strip():
-                logger.warning(f"No content extracted from URL: {url}")
-                return []
+        Returns:
+            Dict with 'url', 'status' ('new', 'updated' or 'unchanged'),
+            'documents', 'links' and 'cache_entry' (the entry to commit)
             
-            # Create a structured document
-            document = f"Title: {title}\nURL: {url}\n\nContent:\n{content}"
+        Raises:
+            requests.HTTPError: For error status codes
+        """
+        cached = self.cache.get(url) if self.cache else None
+        
+        if status_code == 304:
+            logger.info(f"Not modified: {url}")
+            return {'url': url, 'status': 'unchanged', 'documents': [],
+                    'links': cached['links'] if cached else [], 'cache_entry': None}
+                    
+        if status_code >= 400:
+            raise requests.HTTPError(f"{status_code} error for url: {url}")
             
-            # Create domain-specific source identifier
-            domain = urlparse(url).netloc
+        entry = {
+            'url': url,
+            'etag': headers.get('etag'),
+            'last_modified': headers.get('last-modified'),
+            'content_hash': hashlib.sha256(text.encode('utf-8')).hexdigest()
+        }
+        
+        if cached and cached['content_hash'] == entry['content_hash']:
+            # Same body under new validators; only the validators need refreshing
+            logger.info(f"Content unchanged: {url}")
+            entry['links'] = cached['links']
+            return {'url': url, 'status': 'unchanged', 'documents': [], 'links': cached['links'],
+                    'cache_entry': entry}
+                    
+        content_type = headers.get('content-type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in HTML_CONTENT_TYPES:
+            logger.info(f"Skipping non-HTML page {url} ({content_type})")
+            documents, links = [], []
+        else:
+            documents, links = self.parse(url, text)
             
-            chunks = chunk_text(document)
-            return [{
-                'source': url,
-                'content': chunk,
-                'metadata': {
-                    'file_type': 'web',
-                    'title': title,
-                    'domain': domain,
-                    'chunk_index': i
-                }
-            } for i, chunk in enumerate(chunks)]
+        entry['links'] = links
+        return {'url': url, 'status': 'updated' if cached else 'new', 'documents': documents,
+                'links': links, 'cache_entry': entry}
+                
+    def commit(self, results: List[Dict[str, Any]]):
+        """Record the validators of fetch results whose documents have been stored."""
+        if self.cache:
+            self.cache.put_many([result['cache_entry'] for result in results if result.get('cache_entry')])
             
-        except Exception as e:
-            logger.error(f"Error scraping URL {url}: {str(e)}")
-            return []
\ No newline at end of file
+    def parse(self, url: str, html: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """
+        Extract documents and outgoing links from a fetched page.
+        
+        Args:
+            url: URL the page was fetched from
+            html: HTML markup of the page
+            
+        Returns:
+            Tuple of (document dictionaries, absolute http(s) link URLs without fragments)
+        """
+        page = self.extract(html)
+        title = page['title'] or "No title"
+        content = page['text']
+        
+        links = []
+        for href in page['links']:
+            link = urldefrag(urljoin(url, href))[0]
+            if urlparse(link).scheme in ('http', 'https'):
+                links.append(link)
+                
+        if not content.strip():
+            logger.warning(f"No content extracted from URL: {url}")
+            return [], links
+            
+        # Create a structured document
+        document = f"Title: {title}\nURL: {url}\n\nContent:\n{content}"
+        
+        # Create domain-specific source identifier
+        domain = urlparse(url).netloc
+        
+        chunks = chunk_text(document)
+        return [{
+            'source': url,
+            'content': chunk,
+            'metadata': {
+                'file_type': 'web',
+                'title': title,
+                'domain': domain,
+                'chunk_index': i
+            }
+        } for i, chunk in enumerate(chunks)], links
@@ -4,7 +4,7 @@ from typing import List, Dict, Any, Optional
 
 from src.utils.logger import setup_logger
 from src.pipeline.orchestrator import RAGOrchestrator
-from src.config import MAX_DOCUMENTS_RETURNED
+from src.config import MAX_DOCUMENTS_RETURNED, CRAWL_MAX_DEPTH, QUERY_DEADLINE_SECONDS
 
 logger = setup_logger(__name__)
 
@@ -44,19 +44,165 @@ class RAGSystem:
         logger.info(f"Ingesting content from URL: {url}")
         return self.orchestrator.ingest_url(url)
     
-    def query(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED) -> Dict[str, Any]:
+    def crawl(self, urls: List[str], sitemaps: Optional[List[str]] = None,
+              max_depth: int = CRAWL_MAX_DEPTH) -> Dict[str, Any]:
+        """
+        Crawl web sites and ingest the pages found.
+        
+        Args:
+            urls: Seed URLs
+            sitemaps: Sitemap URLs whose entries are added as seeds
+            max_depth: Number of same-domain link hops followed from the seeds
+            
+        Returns:
+            Dict containing stats about ingestion process
+        """
+        logger.info(f"Crawling from {urls} (sitemaps: {sitemaps}, depth: {max_depth})")
+        return self.orchestrator.ingest_crawl(urls, sitemaps, max_depth)
+    
+    def query(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED,
+              deadline_seconds: float = QUERY_DEADLINE_SECONDS) -> Dict[str, Any]:
         """
         Query the RAG system.
         
         Args:
             query_text: The query text
             max_docs: Maximum number of documents to retrieve
+            deadline_seconds: Time budget of the query (0 = no deadline)
+            
+        Returns:
+            Dict containing the response, retrieved documents and applied degradations
+        """
+        logger.info(f"Processing query: {query_text}")
+        return self.orchestrator.process_query(query_text, max_docs, deadline_seconds)
+    
+    def query_stream(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED) -> Dict[str, Any]:
+        """
+        Query the RAG system, streaming the response.
+        
+        Args:
+            query_text: The query text
+            max_docs: Maximum number of documents to retrieve
+            
+        Returns:
+            Dict containing the retrieved documents and 'response_stream', an iterator of tokens
+        """
+        logger.info(f"Processing streaming query: {query_text}")
+        return self.orchestrator.process_query_stream(query_text, max_docs)
+    
+    async def aquery(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED,
+                     deadline_seconds: float = QUERY_DEADLINE_SECONDS) -> Dict[str, Any]:
+        """
+        Async version of query(), for serving many queries on one event loop.
+        
+        Args:
+            query_text: The query text
+            max_docs: Maximum number of documents to retrieve
+            deadline_seconds: Time budget of the query (0 = no deadline)
             
         Returns:
-            Dict containing the response and retrieved documents
+            Dict containing the response, retrieved documents and applied degradations
         """
         logger.info(f"Processing query: {query_text}")
-        return self.orchestrator.process_query(query_text, max_docs)
+        return await self.orchestrator.aprocess_query(query_text, max_docs, deadline_seconds)
+    
+    async def aquery_stream(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED) -> Dict[str, Any]:
+        """
+        Async version of query_stream().
+        
+        Args:
+            query_text: The query text
+            max_docs: Maximum number of documents to retrieve
+            
+        Returns:
+            Dict containing the retrieved documents and 'response_stream', an async iterator of tokens
+        """
+        logger.info(f"Processing streaming query: {query_text}")
+        return await self.orchestrator.aprocess_query_stream(query_text, max_docs)
+    
+    async def acrawl(self, urls: List[str], sitemaps: Optional[List[str]] = None,
+                     max_depth: int = CRAWL_MAX_DEPTH) -> Dict[str, Any]:
+        """
+        Async version of crawl(), for callers already running an event loop.
+        
+        Args:
+            urls: Seed URLs
+            sitemaps: Sitemap URLs whose entries are added as seeds
+            max_depth: Number of same-domain link hops followed from the seeds
+            
+        Returns:
+            Dict containing stats about ingestion process
+        """
+        logger.info(f"Crawling from {urls} (sitemaps: {sitemaps}, depth: {max_depth})")
+        return await self.orchestrator.aingest_crawl(urls, sitemaps, max_depth)
+    
+    def warm_up(self) -> float:
+        """
+        Load the embedding model and Milvus index, so the first query is not slow.
+        
+        Returns:
+            Seconds the warm-up took
+        """
+        return self.orchestrator.warm_up()
+    
+    def health(self) -> Dict[str, Any]:
+        """
+        Return the state of the serving components for monitoring.
+        
+        Returns:
+            Dict with status, breaker states, latencies and cache statistics
+        """
+        return self.orchestrator.health()
+    
+    def submit_ingest(self, input_path: str, recursive: bool = True) -> int:
+        """
+        Queue ingesting a directory or file as a background job.
+        
+        Args:
+            input_path: Path to directory or file to ingest
+            recursive: Whether to recursively ingest files in subdirectories
+            
+        Returns:
+            ID of the job
+        """
+        return self.orchestrator.jobs.submit(input_path, recursive)
+    
+    def job_status(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Return a job with its status, stats, live progress and failed sources.
+        
+        Args:
+            job_id: ID of the job
+            
+        Returns:
+            Job record, or None if there is no such job
+        """
+        return self.orchestrator.jobs.get(job_id)
+    
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        """Return the most recent ingestion jobs, newest first."""
+        return self.orchestrator.jobs.list()
+    
+    def cancel_job(self, job_id: int) -> bool:
+        """
+        Cancel a queued job, or a running one at its next batch.
+        
+        Args:
+            job_id: ID of the job
+            
+        Returns:
+            True if the job was queued or running
+        """
+        logger.info(f"Cancelling ingestion job {job_id}")
+        return self.orchestrator.jobs.cancel(job_id)
+    
+    def start_jobs(self):
+        """Start running queued ingestion jobs in the background, resuming interrupted ones."""
+        self.orchestrator.jobs.start()
+    
+    def stop_jobs(self):
+        """Stop the background jobs at their next batch; they resume on the next start."""
+        self.orchestrator.jobs.stop()
     
     def clear_data(self) -> bool:
         """
@@ -74,11 +220,23 @@ def main():
     parser = argparse.ArgumentParser(description="RAG System")
     parser.add_argument("--input", type=str, help="Input directory or file to ingest")
     parser.add_argument("--url", type=str, help="URL to ingest")
+    parser.add_argument("--crawl", type=str, nargs="+", help="Seed URLs to crawl and ingest")
+    parser.add_argument("--sitemap", type=str, action="append", help="Sitemap URL to crawl and ingest (repeatable)")
+    parser.add_argument("--depth", type=int, default=CRAWL_MAX_DEPTH, help="Link depth followed when crawling")
     parser.add_argument("--query", type=str, help="Query to process")
     parser.add_argument("--clear", action="store_true", help="Clear all ingested data")
+    parser.add_argument("--serve", action="store_true", help="Run the HTTP API (API_HOST:API_PORT)")
+    parser.add_argument("--submit", type=str, help="Queue a directory or file for the service's ingestion workers")
+    parser.add_argument("--jobs", action="store_true", help="Show the progress of recent ingestion jobs")
     
     args = parser.parse_args()
     
+    if args.serve:
+        # Imported here, so the CLI does not need the web stack
+        from src.api.app import serve
+        serve()
+        return
+        
     rag = RAGSystem()
     
     if args.clear:
@@ -87,18 +245,35 @@ def main():
     if args.input:
         rag.ingest_documents(args.input)
         
+    if args.submit:
+        print(f"Queued ingestion job {rag.submit_ingest(args.submit)}")
+        
+    if args.jobs:
+        for job in rag.list_jobs():
+            progress = job['progress'] or {}
+            eta = "-" if progress.get('eta_seconds') is None else f"{progress['eta_seconds']:.0f}s"
+            print(f"{job['id']:>5}  {job['status']:<10} {progress.get('files_done', 0)}/"
+                  f"{progress.get('files_total', '?')} files, {progress.get('chunks_done', 0)} chunks, "
+                  f"ETA {eta}  {job['path']}")
+        
     if args.url:
         rag.ingest_url(args.url)
         
+    if args.crawl or args.sitemap:
+        rag.crawl(args.crawl or [], args.sitemap, args.depth)
+        
     if args.query:
-        result = rag.query(args.query)
+        result = rag.query_stream(args.query)
         print("\nQuery:", args.query)
-        print("\nResponse:", result["response"])
+        print("\nResponse: ", end="", flush=True)
+        for token in result["response_stream"]:
+            print(token, end="", flush=True)
+        print()
         print("\nRetrieved Documents:")
         for i, doc in enumerate(result["documents"]):
             print(f"{i+1}. {doc['source']} (Score: {doc['score']:.4f})")
             
-    if not any([args.input, args.url, args.query, args.clear]):
+    if not any([args.input, args.url, args.crawl, args.sitemap, args.query, args.clear, args.submit, args.jobs]):
         parser.print_help()
 
 
@@ -0,0 +1,632 @@
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from src.utils.logger import setup_logger
+from src.config import JOB_STORE_PATH, JOB_WORKERS, JOB_POLL_SECONDS, JOB_LEASE_SECONDS
+
+logger = setup_logger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# State of a source whose chunks are only partly stored
+PARTIAL = "partial"
+
+
+class JobStopped(Exception):
+    """Raised inside a running job once it is cancelled or its queue stops, ending it at a batch boundary."""
+
+
+def scan(path: str, recursive: bool = True) -> Tuple[int, int]:
+    """
+    Count the files an ingestion of path walks over, and their total size.
+    
+    Args:
+        path: File or directory
+        recursive: Whether subdirectories are included
+        
+    Returns:
+        Tuple of (files, bytes); an archive counts as one file
+    """
+    if os.path.isfile(path):
+        return 1, os.path.getsize(path)
+        
+    files = size = 0
+    for root, dirs, names in os.walk(path):
+        for name in names:
+            files += 1
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+        if not recursive:
+            break
+    return files, size
+
+
+class JobStore:
+    """
+    SQLite record of ingestion jobs and of the sources each job has committed.
+    
+    A source (a file or an archive member) is checkpointed after every
+    stored batch with the number of its chunks committed so far, and marked
+    finished once it is complete, together with the job's stats at that
+    point. A job interrupted by a crash can therefore resume after its last
+    committed batch, and job records survive restarts.
+    
+    Several processes may share a store. A running job is owned by the
+    store that claimed it, which renews its lease with every checkpoint and
+    heartbeat(); only jobs whose lease ran out are recovered by others.
+    """
+    
+    def __init__(self, path: str = JOB_STORE_PATH, lease: float = JOB_LEASE_SECONDS):
+        """
+        Initialize the store, creating the database if needed.
+        
+        Args:
+            path: Path of the SQLite database file
+            lease: Seconds without a heartbeat after which a running job counts as abandoned
+        """
+        self.path = path
+        self.lease = lease
+        # Identifies this store's jobs among those of other processes
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            
+        # Shared by the job workers, archive member threads and API requests
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT, recursive INTEGER, status TEXT, "
+            "cancel_requested INTEGER DEFAULT 0, runs INTEGER DEFAULT 0, created_at REAL, started_at REAL, "
+            "finished_at REAL, error TEXT, stats TEXT, progress TEXT, owner TEXT, heartbeat REAL)"
+        )
+        # Stores created before jobs had owners
+        columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (('owner', 'TEXT'), ('heartbeat', 'REAL')):
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS job_sources ("
+            "job_id INTEGER, source TEXT, chunks INTEGER, status TEXT, PRIMARY KEY (job_id, source))"
+        )
+        self._conn.commit()
+        logger.info(f"Job store initialized at {path}")
+        
+    def create(self, path: str, recursive: bool = True) -> int:
+        """
+        Queue a job ingesting path.
+        
+        Args:
+            path: File or directory to ingest
+            recursive: Whether to ingest subdirectories
+            
+        Returns:
+            ID of the new job
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (path, recursive, status, created_at) VALUES (?, ?, ?, ?)",
+                (path, int(recursive), QUEUED, time.time())
+            )
+            self._conn.commit()
+            return cursor.lastrowid
+            
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Return the record of a job, or None if there is no such job."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+        
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return the records of the most recent jobs, newest first."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+        
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest queued job running, owned by this store, and return its record (None if none is queued)."""
+        with self._lock:
+            row = self._conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY id LIMIT 1", (QUEUED,)).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, runs = runs + 1, started_at = COALESCE(started_at, ?), owner = ?, "
+                "heartbeat = ? WHERE id = ? AND status = ?", (RUNNING, now, self.owner, now, row['id'], QUEUED)
+            )
+            self._conn.commit()
+            if cursor.rowcount != 1:
+                return None
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        return self._to_dict(row)
+        
+    def requeue(self, job_id: int, progress: Optional[Dict[str, Any]] = None):
+        """Put a stopped job of this store back in the queue, to resume when a worker picks it up again."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, owner = NULL, progress = COALESCE(?, progress) WHERE id = ? AND owner = ?",
+                (QUEUED, self._dumps(progress), job_id, self.owner)
+            )
+            self._conn.commit()
+            
+    def heartbeat(self):
+        """Renew the lease of the running jobs of this store."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET heartbeat = ? WHERE owner = ? AND status = ?",
+                               (time.time(), self.owner, RUNNING))
+            self._conn.commit()
+            
+    def recover(self) -> int:
+        """
+        Handle jobs left running by a process that died, i.e. whose lease ran out.
+        
+        Returns:
+            Number of jobs queued again to resume; those whose cancellation
+            was requested are marked cancelled instead
+        """
+        now = time.time()
+        # Jobs of live processes keep renewing their lease and are left alone
+        abandoned = "status = ? AND (heartbeat IS NULL OR heartbeat < ?)"
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET status = ?, finished_at = ?, owner = NULL "
+                               f"WHERE {abandoned} AND cancel_requested = 1",
+                               (CANCELLED, now, RUNNING, now - self.lease))
+            cursor = self._conn.execute(f"UPDATE jobs SET status = ?, owner = NULL WHERE {abandoned}",
+                                        (QUEUED, RUNNING, now - self.lease))
+            self._conn.commit()
+            return cursor.rowcount
+            
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a job: a queued one at once, a running one at its next batch.
+        
+        Args:
+            job_id: ID of the job
+            
+        Returns:
+            True if the job was queued or running
+        """
+        with self._lock:
+            queued = self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            ).rowcount
+            running = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING)
+            ).rowcount
+            self._conn.commit()
+            return bool(queued or running)
+            
+    def cancel_requested(self, job_id: int) -> bool:
+        """Tell whether cancelling a running job was requested, possibly by another process."""
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row['cancel_requested'])
+        
+    def finish(self, job_id: int, status: str, stats: Optional[Dict[str, Any]] = None,
+               progress: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        """Record the end of a job of this store, keeping the saved stats and progress unless new ones are given."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ?, stats = COALESCE(?, stats), "
+                "progress = COALESCE(?, progress), owner = NULL WHERE id = ? AND owner = ?",
+                (status, time.time(), error, self._dumps(stats), self._dumps(progress), job_id, self.owner)
+            )
+            self._conn.commit()
+            
+    def sources(self, job_id: int) -> Dict[str, Tuple[int, str]]:
+        """Return the committed chunks and state of every source a job has started."""
+        with self._lock:
+            rows = self._conn.execute("SELECT source, chunks, status FROM job_sources WHERE job_id = ?",
+                                      (job_id,)).fetchall()
+        return {row['source']: (row['chunks'], row['status']) for row in rows}
+        
+    def failed_sources(self, job_id: int, limit: int = 20) -> List[str]:
+        """Return sources of a job that could not be ingested."""
+        with self._lock:
+            rows = self._conn.execute("SELECT source FROM job_sources WHERE job_id = ? AND status = ? LIMIT ?",
+                                      (job_id, FAILED, limit)).fetchall()
+        return [row['source'] for row in rows]
+        
+    def commit_batch(self, job_id: int, source: str, count: int, progress: Dict[str, Any]) -> bool:
+        """
+        Checkpoint a stored batch of count chunks of source, renewing the job's lease.
+        
+        Returns:
+            False, recording nothing, if the job is no longer owned by this store
+        """
+        with self._lock:
+            if not self._renew(job_id, "progress = ?", (self._dumps(progress),)):
+                return False
+            self._conn.execute(
+                "INSERT INTO job_sources (job_id, source, chunks, status) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (job_id, source) DO UPDATE SET chunks = chunks + excluded.chunks",
+                (job_id, source, count, PARTIAL)
+            )
+            self._conn.commit()
+            return True
+            
+    def commit_source(self, job_id: int, source: str, status: str, stats: Dict[str, Any],
+                      progress: Dict[str, Any]) -> bool:
+        """
+        Mark a source finished (COMPLETED or FAILED), saving the job's stats that include it.
+        
+        Returns:
+            False, recording nothing, if the job is no longer owned by this store
+        """
+        with self._lock:
+            if not self._renew(job_id, "stats = ?, progress = ?", (self._dumps(stats), self._dumps(progress))):
+                return False
+            self._conn.execute(
+                "INSERT INTO job_sources (job_id, source, chunks, status) VALUES (?, ?, 0, ?) "
+                "ON CONFLICT (job_id, source) DO UPDATE SET status = excluded.status",
+                (job_id, source, status)
+            )
+            self._conn.commit()
+            return True
+            
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+            
+    def _renew(self, job_id: int, assignments: str, values: tuple) -> bool:
+        """Update a running job of this store and renew its lease; the lock must be held."""
+        cursor = self._conn.execute(
+            f"UPDATE jobs SET {assignments}, heartbeat = ? WHERE id = ? AND owner = ? AND status = ?",
+            values + (time.time(), job_id, self.owner, RUNNING)
+        )
+        return cursor.rowcount == 1
+        
+    @staticmethod
+    def _dumps(value: Optional[Dict[str, Any]]) -> Optional[str]:
+        return json.dumps(value) if value is not None else None
+        
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record['recursive'] = bool(record['recursive'])
+        record['cancel_requested'] = bool(record['cancel_requested'])
+        record['stats'] = json.loads(record['stats']) if record['stats'] else None
+        record['progress'] = json.loads(record['progress']) if record['progress'] else None
+        return record
+
+
+class IngestionJob:
+    """
+    A running job, as seen by RAGOrchestrator.ingest().
+    
+    The orchestrator asks it which sources were committed before an
+    interruption, reports every stored batch and finished source to it,
+    and calls check() between batches, which raises JobStopped once the
+    job is cancelled or its queue stops. It also keeps the live progress.
+    """
+    
+    def __init__(self, store: JobStore, record: Dict[str, Any], stopping: threading.Event):
+        """
+        Prepare a run of a job.
+        
+        Args:
+            store: Store holding the job
+            record: Record of the job, as returned by JobStore.claim()
+            stopping: Set when the queue running the job stops
+        """
+        self.store = store
+        self.id = record['id']
+        self.path = record['path']
+        self.recursive = record['recursive']
+        self._stopping = stopping
+        self._cancelled = threading.Event()
+        # Set once another process took the job over after this one's lease ran out
+        self._lost = threading.Event()
+        self._cancel_checked = 0.0
+        self._lock = threading.Lock()
+        
+        # Checkpoints of earlier runs
+        self._committed = store.sources(self.id)
+        self._stats = record['stats']
+        
+        self.files_total, self.bytes_total = scan(self.path, self.recursive)
+        self.files_done = 0
+        self.bytes_done = 0
+        self.bytes_skipped = 0
+        self.chunks_done = (record['progress'] or {}).get('chunks_done', 0)
+        self.run_chunks = 0
+        self.started = time.monotonic()
+        
+    def resume_stats(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the stats saved by an earlier run, so sources skipped now stay counted, or stats."""
+        return self._stats or stats
+        
+    def committed(self, source: str) -> Tuple[int, bool]:
+        """
+        Look up what an earlier run committed of a source.
+        
+        Args:
+            source: File path or archive member
+            
+        Returns:
+            Tuple of (chunks stored, whether the source was finished)
+        """
+        chunks, status = self._committed.get(source, (0, PARTIAL))
+        return chunks, status != PARTIAL
+        
+    def batch_committed(self, source: str, count: int):
+        """
+        Checkpoint a stored batch, then stop if the job was cancelled.
+        
+        Raises:
+            JobStopped: If the job was cancelled or its queue is stopping
+        """
+        with self._lock:
+            self.chunks_done += count
+            self.run_chunks += count
+            progress = self._progress()
+        if not self.store.commit_batch(self.id, source, count, progress):
+            self._lost.set()
+        self.check()
+        
+    def source_finished(self, source: str, stored: bool, stats: Dict[str, Any]):
+        """Mark a source finished, saving the stats that include it (called holding the stats lock)."""
+        if not self.store.commit_source(self.id, source, COMPLETED if stored else FAILED, stats, self.progress()):
+            self._lost.set()
+        
+    def advance(self, path: str):
+        """Count a file of the walk over the job's path as done, for the progress and ETA."""
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = 0
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += size
+            if self.committed(path)[1]:
+                # Skipped on resume, so it must not speed up the estimated rate
+                self.bytes_skipped += size
+                
+    def check(self):
+        """
+        Stop the job if it was cancelled, taken over or its queue is stopping.
+        
+        Raises:
+            JobStopped: If the job must stop
+        """
+        if self._stopping.is_set() or self.lost() or self.cancelled():
+            raise JobStopped(f"Ingestion job {self.id} stopped")
+            
+    def cancel(self):
+        """Cancel the job at its next batch."""
+        self._cancelled.set()
+        
+    def cancelled(self) -> bool:
+        """Tell whether the job was cancelled, from this process or through the store."""
+        now = time.monotonic()
+        if not self._cancelled.is_set() and now - self._cancel_checked >= JOB_POLL_SECONDS:
+            self._cancel_checked = now
+            if self.store.cancel_requested(self.id):
+                self._cancelled.set()
+        return self._cancelled.is_set()
+        
+    def lost(self) -> bool:
+        """Tell whether another process took the job over, so this run must leave it alone."""
+        return self._lost.is_set()
+        
+    def progress(self) -> Dict[str, Any]:
+        """
+        Return the live progress of the job.
+        
+        Returns:
+            Dict with the files and bytes of the walk done and in total,
+            the chunks stored over all runs, the chunks per second and
+            elapsed seconds of this run, and the estimated seconds left
+            (None until it can be estimated)
+        """
+        with self._lock:
+            return self._progress()
+            
+    def _progress(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        rate = (self.bytes_done - self.bytes_skipped) / elapsed if elapsed > 0 else 0.0
+        return {
+            'files_total': self.files_total,
+            'files_done': self.files_done,
+            'bytes_total': self.bytes_total,
+            'bytes_done': self.bytes_done,
+            'chunks_done': self.chunks_done,
+            'chunks_per_second': self.run_chunks / elapsed if elapsed > 0 else 0.0,
+            'elapsed_seconds': elapsed,
+            'eta_seconds': max(0.0, self.bytes_total - self.bytes_done) / rate if rate > 0 else None
+        }
+
+
+class JobQueue:
+    """
+    Runs ingestion jobs from a JobStore on background worker threads.
+    
+    Jobs run oldest first. A heartbeat thread renews the lease of the
+    running jobs; jobs still marked running whose lease ran out were
+    interrupted by a crash and run again, skipping what they had committed.
+    Stopping the queue ends running jobs at their next batch and leaves
+    them queued to resume.
+    """
+    
+    def __init__(self, ingest: Callable[[str, bool, IngestionJob], Dict[str, Any]],
+                 store: Optional[JobStore] = None, workers: int = JOB_WORKERS):
+        """
+        Initialize the queue; workers only run after start().
+        
+        Args:
+            ingest: Runs a job: ingest(path, recursive, job), returning its stats
+            store: Store of the jobs (default: JobStore())
+            workers: Number of jobs run at a time
+        """
+        self.ingest = ingest
+        self.store = store or JobStore()
+        self.workers = max(1, workers)
+        self._stopping = threading.Event()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._heartbeat = None
+        self._threads = []
+        self._running: Dict[int, IngestionJob] = {}
+        self._lock = threading.Lock()
+        
+    def start(self):
+        """Start the workers, first queueing jobs interrupted by a crash again."""
+        if self._threads:
+            return
+        self._stopping.clear()
+        self._stopped.clear()
+        self._recover()
+        self._threads = [threading.Thread(target=self._work, name=f"ingestion-job-{i}", daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        self._heartbeat = threading.Thread(target=self._beat, name="ingestion-job-heartbeat", daemon=True)
+        self._heartbeat.start()
+        
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the workers; running jobs end at their next batch and stay queued."""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        # Leases are renewed until the workers are done, so jobs still draining are not taken over
+        self._stopped.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout)
+        self._threads = []
+        self._heartbeat = None
+        
+    def submit(self, path: str, recursive: bool = True) -> int:
+        """
+        Queue ingesting a file or directory.
+        
+        Args:
+            path: File or directory to ingest
+            recursive: Whether to ingest subdirectories
+            
+        Returns:
+            ID of the job
+        """
+        job_id = self.store.create(os.path.abspath(path), recursive)
+        logger.info(f"Queued ingestion job {job_id} for {path}")
+        self._wakeup.set()
+        return job_id
+        
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """
+        Return the record of a job with its live progress and failed sources.
+        
+        Args:
+            job_id: ID of the job
+            
+        Returns:
+            Job record, or None if there is no such job
+        """
+        record = self.store.get(job_id)
+        if record is None:
+            return None
+        record['failed_sources'] = self.store.failed_sources(job_id)
+        return self._live(record)
+        
+    def list(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Return the most recent jobs, newest first, with live progress."""
+        return [self._live(record) for record in self.store.list(limit)]
+        
+    def cancel(self, job_id: int) -> bool:
+        """
+        Cancel a queued job, or a running one at its next batch.
+        
+        Args:
+            job_id: ID of the job
+            
+        Returns:
+            True if the job was queued or running
+        """
+        cancelled = self.store.cancel(job_id)
+        with self._lock:
+            job = self._running.get(job_id)
+        if job is not None:
+            job.cancel()
+        return cancelled
+        
+    def _live(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Replace the saved progress of a job running in this process by its live progress."""
+        with self._lock:
+            job = self._running.get(record['id'])
+        if job is not None:
+            record['progress'] = job.progress()
+        return record
+        
+    def _recover(self):
+        """Queue jobs abandoned by a crashed process again."""
+        resumed = self.store.recover()
+        if resumed:
+            logger.info(f"Resuming {resumed} interrupted ingestion job(s)")
+            self._wakeup.set()
+            
+    def _beat(self):
+        """Renew the leases of this queue's jobs, and pick up jobs whose lease ran out, until the queue stops."""
+        while not self._stopped.wait(self.store.lease / 3):
+            try:
+                self.store.heartbeat()
+                if not self._stopping.is_set():
+                    self._recover()
+            except Exception as e:
+                logger.error(f"Error renewing ingestion job leases: {str(e)}")
+                
+    def _work(self):
+        """Run queued jobs until the queue stops."""
+        while not self._stopping.is_set():
+            record = self.store.claim()
+            if record is None:
+                # Also picks up jobs queued by other processes
+                self._wakeup.wait(JOB_POLL_SECONDS)
+                self._wakeup.clear()
+                continue
+            self._run(record)
+            
+    def _run(self, record: Dict[str, Any]):
+        """Run one job and record how it ended."""
+        logger.info(f"Running ingestion job {record['id']} for {record['path']} (run {record['runs']})")
+        job = IngestionJob(self.store, record, self._stopping)
+        with self._lock:
+            self._running[job.id] = job
+            
+        try:
+            stats = self.ingest(job.path, job.recursive, job)
+            if job.lost():
+                raise JobStopped(f"Ingestion job {job.id} stopped")
+            self.store.finish(job.id, COMPLETED, stats, job.progress())
+            logger.info(f"Ingestion job {job.id} complete")
+        except JobStopped:
+            if job.lost():
+                logger.warning(f"Ingestion job {job.id} was taken over by another process")
+            elif job.cancelled():
+                self.store.finish(job.id, CANCELLED, progress=job.progress())
+                logger.info(f"Ingestion job {job.id} cancelled")
+            else:
+                self.store.requeue(job.id, job.progress())
+                logger.info(f"Ingestion job {job.id} interrupted, will resume")
+        except Exception as e:
+            logger.error(f"Ingestion job {job.id} failed: {str(e)}")
+            self.store.finish(job.id, FAILED, progress=job.progress(), error=str(e))
+        finally:
+            with self._lock:
+                self._running.pop(job.id, None)
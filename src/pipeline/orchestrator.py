@@ -1,17 +1,38 @@
 import os
-from typing import List, Dict, Any, Optional
+import time
+import asyncio
+import threading
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Iterator, AsyncIterator, Tuple, Callable, BinaryIO
 from src.ingestion.text_processor import TextProcessor
 from src.ingestion.image_processor import ImageProcessor
 from src.ingestion.video_processor import VideoProcessor
 from src.ingestion.binary_processor import BinaryProcessor
+from src.ingestion.archive_processor import ArchiveProcessor, member_file
 from src.ingestion.web_scraper import WebScraper
+from src.ingestion.web_crawler import WebCrawler
 from src.ingestion.embedding_generator import EmbeddingGenerator
 from src.ingestion.storage import MilvusStorage
 from src.retrieval.retriever import Retriever
 from src.generation.llm_handler import LLMHandler
+from src.generation.llama_model import LlamaModel
+from src.generation.deepseek_model import DeepseekModel
+from src.generation.response_cache import ResponseCache
+from src.generation.circuit_breaker import OPEN
+from src.retrieval.semantic_cache import SemanticCache
+from src.retrieval.sparse_index import BM25Index
+from src.pipeline.jobs import JobQueue, IngestionJob, JobStopped
+from src.utils.deadline import Deadline, DeadlineExceeded
+from src.utils.single_flight import SingleFlight
+from src.utils.scheduler import PriorityScheduler, BusyError, QUERY, INGEST
 from src.utils.logger import setup_logger
-from src.utils.helper import get_file_extension, is_binary_file, get_supported_extensions
-from src.config import MAX_DOCUMENTS_RETURNED
+from src.utils.helper import get_file_extension, get_file_name, is_binary_file, is_archive_file, get_supported_extensions
+from src.config import (
+    MAX_DOCUMENTS_RETURNED, INGEST_BATCH_SIZE, CRAWL_MAX_DEPTH, RESPONSE_CACHE_ENABLED, SEMANTIC_CACHE_ENABLED,
+    SPARSE_INDEX_ENABLED, QUERY_DEADLINE_SECONDS, DEADLINE_SEMANTIC_CACHE_THRESHOLD,
+    QUERY_EMBED_CONCURRENCY, QUERY_RETRIEVAL_CONCURRENCY, QUERY_GENERATION_CONCURRENCY, QUERY_COALESCING_ENABLED,
+    HTTP_CACHE_PATH
+)
 
 logger = setup_logger(__name__)
 
@@ -27,31 +48,69 @@ class RAGOrchestrator:
         self.image_processor = ImageProcessor()
         self.video_processor = VideoProcessor()
         self.binary_processor = BinaryProcessor()
-        self.web_scraper = WebScraper()
+        self.archive_processor = ArchiveProcessor()
+        self.web_scraper = WebScraper(cache_path=HTTP_CACHE_PATH)
         
         # Initialize embedding generator and storage
         self.embedding_generator = EmbeddingGenerator()
         self.storage = MilvusStorage()
         
-        # Initialize retriever and generator
-        self.retriever = Retriever()
-        self.llm_handler = LLMHandler()
+        # BM25 index over the same chunks, filled as they are stored in Milvus
+        self.sparse_index = BM25Index() if SPARSE_INDEX_ENABLED else None
+        
+        # Initialize retriever and generator, sharing the embedding model and Milvus connection
+        self.retriever = Retriever(self.embedding_generator, self.storage, self.sparse_index)
+        self.llm_handler = LLMHandler(LlamaModel(), DeepseekModel(),
+                                      cache=ResponseCache() if RESPONSE_CACHE_ENABLED else None)
         
         # Get supported extensions
         self.supported_extensions = get_supported_extensions()
         
+        # Answers to earlier queries, reused for paraphrases until the corpus changes
+        self.semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+        self.corpus_version = 0
+        
+        # Guards ingestion stats updated from archive worker threads
+        self._stats_lock = threading.Lock()
+        
+        # Bound each stage of async queries, so a burst queues instead of oversubscribing the
+        # embedding model, Milvus or the LLM endpoint
+        self._embed_slots = asyncio.Semaphore(QUERY_EMBED_CONCURRENCY)
+        self._retrieval_slots = asyncio.Semaphore(QUERY_RETRIEVAL_CONCURRENCY)
+        self._generation_slots = asyncio.Semaphore(QUERY_GENERATION_CONCURRENCY)
+        
+        # Concurrent identical queries, from threads or the event loop, share one run
+        self.query_flights = SingleFlight() if QUERY_COALESCING_ENABLED else None
+        
+        # Queries go before ingestion batches on the embedding model and Milvus
+        self.scheduler = PriorityScheduler()
+        
+        # Background ingestion jobs; workers run once started (e.g. by the API service)
+        self.jobs = JobQueue(self.ingest)
+        
         logger.info("RAG Orchestrator initialized")
         
-    def ingest(self, input_path: str, recursive: bool = True) -> Dict[str, Any]:
+    def ingest(self, input_path: str, recursive: bool = True,
+               job: Optional[IngestionJob] = None) -> Dict[str, Any]:
         """
         Ingest documents from a directory or file.
         
+        As part of a background job, every stored batch is checkpointed.
+        Sources finished in an earlier run of the job are skipped, and a
+        source interrupted midway resumes after its last stored batch, which
+        relies on extraction yielding the same chunks again. The skipped
+        chunks are still added to the sparse index if a crash lost them.
+        
         Args:
             input_path: Path to directory or file to ingest
             recursive: Whether to recursively ingest files in subdirectories
+            job: Running job the ingestion belongs to (see JobQueue)
             
         Returns:
             Dict containing stats about ingestion process
+            
+        Raises:
+            JobStopped: If the job was cancelled or its queue stopped
         """
         logger.info(f"Ingesting from path: {input_path}")
         
@@ -62,20 +121,28 @@ class RAGOrchestrator:
             'processed_documents': 0,
             'by_type': {}
         }
-        
+        if job is not None:
+            stats = job.resume_stats(stats)
+            
         try:
             if os.path.isfile(input_path):
                 # Process a single file
-                self._process_file(input_path, stats)
+                self._process_file(input_path, stats, job)
+                if job is not None:
+                    job.advance(input_path)
             elif os.path.isdir(input_path):
                 # Process a directory
-                self._process_directory(input_path, recursive, stats)
+                self._process_directory(input_path, recursive, stats, job)
             else:
                 logger.error(f"Path not found: {input_path}")
                 
+            self._save_sparse_index()
             logger.info(f"Ingestion complete: {stats}")
             return stats
             
+        except JobStopped:
+            self._save_sparse_index()
+            raise
         except Exception as e:
             logger.error(f"Error during ingestion: {str(e)}")
             return stats
@@ -95,27 +162,25 @@ class RAGOrchestrator:
         stats = {
             'total_urls': 1,
             'processed_urls': 0,
+            'unchanged_urls': 0,
             'failed_urls': 0,
             'processed_documents': 0
         }
         
         try:
-            # Process the URL
-            documents = self.web_scraper.process(url)
+            # Fetch conditionally; unchanged pages are neither parsed nor embedded
+            page = self.web_scraper.fetch(url)
             
-            if documents:
-                # Generate embeddings
-                documents_with_embeddings = self.embedding_generator.generate(documents)
-                
-                # Store in Milvus
-                if self.storage.store(documents_with_embeddings):
-                    stats['processed_urls'] += 1
-                    stats['processed_documents'] += len(documents)
-                else:
-                    stats['failed_urls'] += 1
+            if page['status'] == 'unchanged':
+                self.web_scraper.commit([page])
+                stats['unchanged_urls'] += 1
+            elif page['documents']:
+                stats['processed_documents'] += self._store_pages([page])
+                stats['processed_urls'] += 1
             else:
                 stats['failed_urls'] += 1
                 
+            self._save_sparse_index()
             logger.info(f"URL ingestion complete: {stats}")
             return stats
             
@@ -124,40 +189,442 @@ class RAGOrchestrator:
             stats['failed_urls'] += 1
             return stats
     
-    def process_query(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED) -> Dict[str, Any]:
+    def ingest_crawl(self, urls: List[str], sitemaps: Optional[List[str]] = None,
+                     max_depth: int = CRAWL_MAX_DEPTH) -> Dict[str, Any]:
+        """
+        Crawl web sites and ingest every page found.
+        
+        Pages are fetched concurrently and embedded in batches while the
+        crawl continues.
+        
+        Args:
+            urls: Seed URLs
+            sitemaps: Sitemap URLs whose entries are added as seeds
+            max_depth: Number of same-domain link hops followed from the seeds
+            
+        Returns:
+            Dict containing stats about ingestion process
+        """
+        return asyncio.run(self.aingest_crawl(urls, sitemaps, max_depth))
+    
+    async def aingest_crawl(self, urls: List[str], sitemaps: Optional[List[str]] = None,
+                            max_depth: int = CRAWL_MAX_DEPTH) -> Dict[str, Any]:
+        """
+        Async version of ingest_crawl(), for callers already running an event loop.
+        
+        Args:
+            urls: Seed URLs
+            sitemaps: Sitemap URLs whose entries are added as seeds
+            max_depth: Number of same-domain link hops followed from the seeds
+            
+        Returns:
+            Dict containing stats about ingestion process
+        """
+        logger.info(f"Crawling from {len(urls)} URL(s) and {len(sitemaps or [])} sitemap(s)")
+        
+        stats = {
+            'total_urls': 0,
+            'processed_urls': 0,
+            'unchanged_urls': 0,
+            'failed_urls': 0,
+            'processed_documents': 0
+        }
+        
+        try:
+            crawler = WebCrawler(self.web_scraper, max_depth=max_depth)
+            await self._ingest_crawl(crawler, urls, sitemaps or [], stats)
+            logger.info(f"Crawl ingestion complete: {stats}")
+            return stats
+            
+        except Exception as e:
+            logger.error(f"Error during crawl ingestion: {str(e)}")
+            return stats
+    
+    async def _ingest_crawl(self, crawler: WebCrawler, urls: List[str], sitemaps: List[str],
+                            stats: Dict[str, Any], batch_size: int = INGEST_BATCH_SIZE):
+        """Consume crawled pages, embedding and storing them in batches off the event loop."""
+        batch = []
+        batch_documents = 0
+        
+        async def flush():
+            pages = list(batch)
+            batch.clear()
+            try:
+                stats['processed_documents'] += await asyncio.to_thread(self._store_pages, pages)
+                stats['processed_urls'] += len(pages)
+            except Exception as e:
+                logger.error(f"Error storing crawled pages: {str(e)}")
+                stats['failed_urls'] += len(pages)
+        
+        async for page in crawler.crawl(urls, sitemaps):
+            stats['total_urls'] += 1
+            if page['status'] == 'unchanged':
+                stats['unchanged_urls'] += 1
+                if page.get('cache_entry'):
+                    # Same content under new validators
+                    await asyncio.to_thread(self.web_scraper.commit, [page])
+                continue
+            if not page['documents']:
+                stats['failed_urls'] += 1
+                continue
+            batch.append(page)
+            batch_documents += len(page['documents'])
+            if batch_documents >= batch_size:
+                batch_documents = 0
+                await flush()
+        
+        if batch:
+            await flush()
+        await asyncio.to_thread(self._save_sparse_index)
+    
+    def _store_pages(self, pages: List[Dict[str, Any]]) -> int:
+        """
+        Store the documents of fetched pages, replacing the chunks of updated pages.
+        
+        The validators of the pages are only recorded once their documents
+        are stored, so pages that fail to store are fetched in full next time.
+        
+        Args:
+            pages: Fetch results from WebScraper
+            
+        Returns:
+            Number of documents stored
+            
+        Raises:
+            RuntimeError: If old chunks could not be deleted or new ones stored
+        """
+        for page in pages:
+            if page['status'] == 'updated':
+                self._corpus_changed()
+                if not self.storage.delete_by_source(page['url']):
+                    raise RuntimeError(f"Failed to delete old chunks of {page['url']}")
+                if self.sparse_index is not None:
+                    self.sparse_index.delete_by_source(page['url'])
+        
+        stored = self._embed_and_store(doc for page in pages for doc in page['documents'])
+        self.web_scraper.commit(pages)
+        return stored
+    
+    def process_query(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED,
+                      deadline_seconds: float = QUERY_DEADLINE_SECONDS) -> Dict[str, Any]:
         """
         Process a query through the RAG pipeline.
         
+        With a deadline, stages degrade rather than run late. If the LLM's
+        median latency no longer fits, a looser semantic cache match is
+        accepted. Retrieval gets what is left after reserving that latency
+        and searches more cheaply when it is short. If no answer can be
+        generated in time, the retrieved documents are returned without
+        one. The degradations applied are listed in 'degradations'.
+        
+        Concurrent calls with the same query (ignoring differences in
+        whitespace), max_docs and deadline share one run; each gets its own
+        copy of the result dict.
+        
         Args:
             query_text: The query text
             max_docs: Maximum number of documents to retrieve
+            deadline_seconds: Time budget of the query (0 = no deadline)
             
         Returns:
-            Dict containing the response and retrieved documents
+            Dict containing the response, retrieved documents and applied degradations
+            
+        Raises:
+            BusyError: If too many queries are waiting for the embedding model or Milvus
         """
+        if self.query_flights is None:
+            return self._process_query(query_text, max_docs, deadline_seconds)
+        # Shallow copy, so a caller changing its result does not change the others'
+        return dict(self.query_flights.do(self._flight_key(query_text, max_docs, deadline_seconds),
+                                          lambda: self._process_query(query_text, max_docs, deadline_seconds)))
+    
+    def _process_query(self, query_text: str, max_docs: int, deadline_seconds: float) -> Dict[str, Any]:
+        """Run process_query() for one query, without coalescing."""
         logger.info(f"Processing query: {query_text}")
+        deadline = Deadline(deadline_seconds) if deadline_seconds > 0 else None
+        degradations = []
         
         try:
+            # Answer paraphrases of earlier queries from the semantic cache
+            corpus_version = self.corpus_version
+            with self.scheduler.slot(QUERY):
+                query_embedding = self._embed_query(query_text)
+            cached = self._semantic_lookup(query_text, query_embedding, deadline, degradations)
+            if cached:
+                return cached
+                
             # Retrieve relevant documents
-            documents = self.retriever.retrieve(query_text, max_docs)
+            with self.scheduler.slot(QUERY):
+                documents = self.retriever.retrieve(query_text, max_docs, query_embedding,
+                                                    deadline=self._retrieval_deadline(deadline),
+                                                    degradations=degradations)
             
             # Generate response using LLM
-            response = self.llm_handler.generate(query_text, documents)
+            try:
+                response = self.llm_handler.generate(query_text, documents, deadline=deadline)
+            except DeadlineExceeded as e:
+                return self._without_answer(query_text, documents, degradations, e)
+                
+            self._semantic_store(query_text, query_embedding, response, documents, corpus_version)
+            return {
+                'query': query_text,
+                'response': response,
+                'documents': documents,
+                'degradations': degradations
+            }
+            
+        except BusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing query: {str(e)}")
+            return {
+                'query': query_text,
+                'response': "I encountered an error while processing your query.",
+                'documents': [],
+                'degradations': degradations
+            }
+    
+    async def aprocess_query(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED,
+                             deadline_seconds: float = QUERY_DEADLINE_SECONDS) -> Dict[str, Any]:
+        """
+        Async version of process_query(), for serving many queries on one event loop.
+        
+        Embedding, retrieval and generation each admit a bounded number of
+        queries at a time (QUERY_*_CONCURRENCY); the others wait their turn.
+        Identical concurrent queries share one run, also with process_query()
+        calls from other threads.
+        
+        Args:
+            query_text: The query text
+            max_docs: Maximum number of documents to retrieve
+            deadline_seconds: Time budget of the query (0 = no deadline)
+            
+        Returns:
+            Dict containing the response, retrieved documents and applied degradations
             
+        Raises:
+            BusyError: If too many queries are waiting for the embedding model or Milvus
+        """
+        if self.query_flights is None:
+            return await self._aprocess_query(query_text, max_docs, deadline_seconds)
+        return dict(await self.query_flights.ado(self._flight_key(query_text, max_docs, deadline_seconds),
+                                                 lambda: self._aprocess_query(query_text, max_docs, deadline_seconds)))
+    
+    async def _aprocess_query(self, query_text: str, max_docs: int, deadline_seconds: float) -> Dict[str, Any]:
+        """Run aprocess_query() for one query, without coalescing."""
+        logger.info(f"Processing query: {query_text}")
+        deadline = Deadline(deadline_seconds) if deadline_seconds > 0 else None
+        degradations = []
+        
+        try:
+            # Answer paraphrases of earlier queries from the semantic cache
+            corpus_version = self.corpus_version
+            async with self._embed_slots, self.scheduler.aslot(QUERY):
+                query_embedding = await asyncio.to_thread(self._embed_query, query_text)
+            cached = self._semantic_lookup(query_text, query_embedding, deadline, degradations)
+            if cached:
+                return cached
+                
+            # Retrieve relevant documents
+            async with self._retrieval_slots, self.scheduler.aslot(QUERY):
+                documents = await self.retriever.aretrieve(query_text, max_docs, query_embedding,
+                                                           deadline=self._retrieval_deadline(deadline),
+                                                           degradations=degradations)
+            
+            # Generate response using LLM
+            try:
+                async with self._generation_slots:
+                    response = await self.llm_handler.agenerate(query_text, documents, deadline=deadline)
+            except DeadlineExceeded as e:
+                return self._without_answer(query_text, documents, degradations, e)
+                
+            self._semantic_store(query_text, query_embedding, response, documents, corpus_version)
             return {
                 'query': query_text,
                 'response': response,
-                'documents': documents
+                'documents': documents,
+                'degradations': degradations
             }
             
+        except BusyError:
+            raise
         except Exception as e:
             logger.error(f"Error processing query: {str(e)}")
             return {
                 'query': query_text,
                 'response': "I encountered an error while processing your query.",
-                'documents': []
+                'documents': [],
+                'degradations': degradations
             }
     
+    def process_query_stream(self, query_text: str, max_docs: int = MAX_DOCUMENTS_RETURNED) -> Dict[str, Any]:
+        """
+        Process a query, streaming the response as it is generated.
+        
+        Retrieval happens before this returns; generation starts when
+        'response_stream' is first iterated.
+        
+        Args:
+            query_text: The query text
+            max_docs: Maximum number of documents to retrieve
+            
+        Returns:
+            Dict containing the query, the retrieved documents and
+            'response_stream', an iterator of response tokens
+            
+        Raises:
+            BusyError: If too many queries are waiting for the embedding model or Milvus
+        """
+        logger.info(f"Processing query (streaming): {query_text}")
+        
+        corpus_version = self.corpus_version
+        try:
+            with self.scheduler.slot(QUERY):
+                query_embedding = self._embed_query(query_text)
+            cached = self._semantic_lookup(query_text, query_embedding)
+            if cached:
+                return {
+                    'query': query_text,
+                    'documents': cached['documents'],
+                    'response_stream': iter([cached['response']])
+                }
+            with self.scheduler.slot(QUERY):
+                documents = self.retriever.retrieve(query_text, max_docs, query_embedding)
+        except BusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing query: {str(e)}")
+            query_embedding = None
+            documents = []
+            
+        def response_stream() -> Iterator[str]:
+            tokens = []
+            try:
+                for token in self.llm_handler.generate_stream(query_text, documents):
+                    tokens.append(token)
+                    yield token
+            except Exception as e:
+                logger.error(f"Error streaming response: {str(e)}")
+                if not tokens:
+                    yield "I encountered an error while processing your query."
+                return
+            self._semantic_store(query_text, query_embedding, "".join(tokens), documents, corpus_version)
+                
+        return {
+            'query': query_text,
+            'documents': documents,
+            'response_stream': response_stream()
+        }
+    
+    async def aprocess_query_stream(self, query_text: str,
+                                    max_docs: int = MAX_DOCUMENTS_RETURNED) -> Dict[str, Any]:
+        """
+        Async version of process_query_stream(), with the stage limits of aprocess_query().
+        
+        The generation slot is held while the response is streamed, and
+        each token is read from the blocking model stream in a worker thread.
+        
+        Args:
+            query_text: The query text
+            max_docs: Maximum number of documents to retrieve
+            
+        Returns:
+            Dict containing the query, the retrieved documents and
+            'response_stream', an async iterator of response tokens
+            
+        Raises:
+            BusyError: If too many queries are waiting for the embedding model or Milvus
+        """
+        logger.info(f"Processing query (streaming): {query_text}")
+        
+        corpus_version = self.corpus_version
+        try:
+            async with self._embed_slots, self.scheduler.aslot(QUERY):
+                query_embedding = await asyncio.to_thread(self._embed_query, query_text)
+            cached = self._semantic_lookup(query_text, query_embedding)
+            if cached:
+                async def cached_stream() -> AsyncIterator[str]:
+                    yield cached['response']
+                    
+                return {
+                    'query': query_text,
+                    'documents': cached['documents'],
+                    'response_stream': cached_stream()
+                }
+            async with self._retrieval_slots, self.scheduler.aslot(QUERY):
+                documents = await self.retriever.aretrieve(query_text, max_docs, query_embedding)
+        except BusyError:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing query: {str(e)}")
+            query_embedding = None
+            documents = []
+            
+        async def response_stream() -> AsyncIterator[str]:
+            tokens = []
+            async with self._generation_slots:
+                stream = self.llm_handler.generate_stream(query_text, documents)
+                try:
+                    while True:
+                        token = await asyncio.to_thread(next, stream, None)
+                        if token is None:
+                            break
+                        tokens.append(token)
+                        yield token
+                except Exception as e:
+                    logger.error(f"Error streaming response: {str(e)}")
+                    if not tokens:
+                        yield "I encountered an error while processing your query."
+                    return
+                finally:
+                    # Releases the model's breaker slot if the client went away mid-stream
+                    stream.close()
+            self._semantic_store(query_text, query_embedding, "".join(tokens), documents, corpus_version)
+            
+        return {
+            'query': query_text,
+            'documents': documents,
+            'response_stream': response_stream()
+        }
+    
+    def warm_up(self) -> float:
+        """
+        Load the embedding model and the Milvus index into memory before serving queries.
+        
+        Returns:
+            Seconds the warm-up took
+        """
+        start = time.perf_counter()
+        query_embedding = self.retriever.embed_query("warm up")
+        self.storage.search(query_embedding, 1)
+        seconds = time.perf_counter() - start
+        logger.info(f"Warmed up embedding model and Milvus collection in {seconds:.2f}s")
+        return seconds
+    
+    def health(self) -> Dict[str, Any]:
+        """
+        Return the state of the serving components for monitoring.
+        
+        Returns:
+            Dict with 'status' ('ok', or 'degraded' while every model's
+            circuit is open), 'corpus_version', and the model 'breakers',
+            'latency', 'response_cache', 'semantic_cache', 'sparse_index',
+            query 'coalescing' and 'scheduler' statistics
+        """
+        breakers = self.llm_handler.breaker_states()
+        degraded = bool(breakers) and all(breaker['state'] == OPEN for breaker in breakers.values())
+        return {
+            'status': 'degraded' if degraded else 'ok',
+            'corpus_version': self.corpus_version,
+            'breakers': breakers,
+            'latency': self.llm_handler.latency_stats(),
+            'response_cache': self.llm_handler.cache_stats(),
+            'semantic_cache': self.semantic_cache.stats() if self.semantic_cache else {},
+            'sparse_index': self.sparse_index.stats() if self.sparse_index is not None else {},
+            'coalescing': self.query_flights.stats() if self.query_flights is not None else {},
+            'scheduler': self.scheduler.stats()
+        }
+    
     def clear_data(self) -> bool:
         """
         Clear all ingested data.
@@ -168,73 +635,335 @@ class RAGOrchestrator:
         logger.info("Clearing all data")
         
         try:
+            if self.llm_handler.cache:
+                self.llm_handler.cache.clear()
+            if self.sparse_index is not None:
+                self.sparse_index.clear()
+            self._corpus_changed()
             return self.storage.clear()
         except Exception as e:
             logger.error(f"Error clearing data: {str(e)}")
             return False
     
-    def _process_directory(self, directory_path: str, recursive: bool, stats: Dict[str, Any]):
+    def _flight_key(self, query_text: str, max_docs: int, deadline_seconds: float) -> Tuple[Any, ...]:
+        """Identify queries that give the same result, so concurrent ones can share a run."""
+        # Only whitespace is normalized: case can change the answer (e.g. error codes, names)
+        return ' '.join(query_text.split()), max_docs, deadline_seconds, self.corpus_version
+    
+    def _embed_query(self, query_text: str) -> Optional[List[float]]:
+        """Embed a query once for the semantic cache and retrieval; None if embedding fails."""
+        try:
+            return self.retriever.embed_query(query_text)
+        except Exception as e:
+            logger.error(f"Error embedding query: {str(e)}")
+            return None
+            
+    def _semantic_lookup(self, query_text: str, query_embedding: Optional[List[float]],
+                         deadline: Optional[Deadline] = None,
+                         degradations: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached answer of a similar earlier query, as a query result.
+        
+        If generation is not expected to fit in the deadline, matches down to
+        DEADLINE_SEMANTIC_CACHE_THRESHOLD are accepted, and a hit that needed
+        the looser threshold adds 'relaxed_semantic_cache' to degradations.
+        """
+        if self.semantic_cache is None or query_embedding is None:
+            return None
+        threshold = None
+        if deadline is not None and not self._generation_fits(deadline):
+            threshold = min(self.semantic_cache.threshold, DEADLINE_SEMANTIC_CACHE_THRESHOLD)
+        cached = self.semantic_cache.lookup(query_embedding, self.corpus_version, threshold)
+        if cached is None:
+            return None
+        if degradations is not None and cached['similarity'] < self.semantic_cache.threshold:
+            degradations.append('relaxed_semantic_cache')
+        return {
+            'query': query_text,
+            'response': cached['response'],
+            'documents': cached['documents'],
+            'degradations': degradations if degradations is not None else []
+        }
+        
+    def _generation_fits(self, deadline: Deadline) -> bool:
+        """Whether the LLM's median latency fits in what is left of a deadline (True if unknown)."""
+        expected = self.llm_handler.expected_latency()
+        return not deadline.expired() and (expected is None or deadline.remaining() >= expected)
+        
+    def _retrieval_deadline(self, deadline: Optional[Deadline]) -> Optional[Deadline]:
+        """Deadline of retrieval, keeping the LLM's median latency for generation."""
+        if deadline is None:
+            return None
+        return deadline.reserve(self.llm_handler.expected_latency() or 0.0)
+        
+    def _without_answer(self, query_text: str, documents: List[Dict[str, Any]], degradations: List[str],
+                        error: DeadlineExceeded) -> Dict[str, Any]:
+        """Query result with the retrieved documents but no generated answer, for a missed deadline."""
+        logger.warning(f"Returning documents without an answer: {str(error)}")
+        degradations.append('skipped_generation')
+        return {
+            'query': query_text,
+            'response': "No answer could be generated in time; the most relevant documents are listed instead.",
+            'documents': documents,
+            'degradations': degradations
+        }
+        
+    def _semantic_store(self, query_text: str, query_embedding: Optional[List[float]], response: str,
+                        documents: List[Dict[str, Any]], corpus_version: int):
+        """Cache an answer for paraphrases; answers without retrieved documents are not kept."""
+        if self.semantic_cache is None or query_embedding is None or not response or not documents:
+            return
+        # Ingestion during generation means the answer may already be stale
+        if corpus_version == self.corpus_version:
+            self.semantic_cache.store(query_text, query_embedding,
+                                      {'response': response, 'documents': documents}, corpus_version)
+            
+    def _save_sparse_index(self):
+        """Persist the sparse index after an ingestion; a failed save only costs a re-ingest."""
+        if self.sparse_index is None:
+            return
+        try:
+            self.sparse_index.save()
+        except Exception as e:
+            logger.error(f"Error saving sparse index: {str(e)}")
+            
+    def _corpus_changed(self):
+        """Bump the corpus version, so answers cached against the old corpus are not reused."""
+        with self._stats_lock:
+            self.corpus_version += 1
+            
+    def _process_directory(self, directory_path: str, recursive: bool, stats: Dict[str, Any],
+                           job: Optional[IngestionJob] = None):
         """Process all files in a directory."""
+        # Images are collected and OCR'd in batches so they run in parallel
+        images = []
+        
         for root, dirs, files in os.walk(directory_path):
             for file in files:
                 file_path = os.path.join(root, file)
-                self._process_file(file_path, stats)
+                if get_file_extension(file_path) in self.supported_extensions['image']:
+                    images.append(file_path)
+                    if len(images) >= INGEST_BATCH_SIZE:
+                        self._process_images(images, stats, job)
+                        images = []
+                else:
+                    self._process_file(file_path, stats, job)
+                    if job is not None:
+                        job.advance(file_path)
                 
             if not recursive:
                 break
+        
+        if images:
+            self._process_images(images, stats, job)
+    
+    def _process_images(self, image_paths: List[str], stats: Dict[str, Any], job: Optional[IngestionJob] = None):
+        """OCR a batch of images across the image processor's worker pool and store them."""
+        # Images finished by an earlier run of the job are not OCR'd again
+        pending = [path for path in image_paths if job is None or not job.committed(path)[1]]
+        results = self.image_processor.process_batch(pending) if pending else {}
+        for image_path in image_paths:
+            self._ingest_source(image_path, stats, lambda: ('image', results.get(image_path, [])), job)
+            if job is not None:
+                job.advance(image_path)
     
-    def _process_file(self, file_path: str, stats: Dict[str, Any]):
+    def _process_file(self, file_path: str, stats: Dict[str, Any], job: Optional[IngestionJob] = None):
         """Process a single file based on its type."""
-        stats['total_files'] += 1
+        if is_archive_file(file_path):
+            self._process_archive(file_path, stats, job)
+            return
         
+        self._ingest_source(file_path, stats, lambda: self._extract_documents(file_path), job)
+    
+    def _process_archive(self, archive_path: str, stats: Dict[str, Any], job: Optional[IngestionJob] = None):
+        """Stream every member of an archive into the processor matching its extension."""
         try:
-            # Determine the file type
-            extension = get_file_extension(file_path)
-            
-            # Process the file based on its type
-            documents = []
+            self.archive_processor.process(
+                archive_path,
+                lambda stream, source: self._process_member(stream, source, stats, job)
+            )
+        except JobStopped:
+            raise
+        except Exception as e:
+            logger.error(f"Error reading archive {archive_path}: {str(e)}")
+            with self._stats_lock:
+                stats['failed_files'] += 1
+    
+    def _process_member(self, stream: BinaryIO, source: str, stats: Dict[str, Any],
+                        job: Optional[IngestionJob] = None):
+        """Process a single archive member identified as 'archive_path!member'."""
+        extension = get_file_extension(source)
+        
+        if extension in self.supported_extensions['text']:
+            # Text formats are read straight from the member stream
+            self._ingest_source(
+                source, stats,
+                lambda: ('text', self.text_processor.iter_stream_documents(stream, source)), job
+            )
+        elif extension in self.supported_extensions['audio']:
+            # Audio is piped straight into the decoder
+            self._ingest_source(
+                source, stats,
+                lambda: ('video/audio', self.video_processor.process_stream(stream, source)), job
+            )
+        else:
+            # The other processors read from a path, so only this member is spooled
+            with member_file(stream, source) as temp_path:
+                self._ingest_source(source, stats, lambda: self._extract_documents(temp_path, source), job)
+    
+    def _extract_documents(self, file_path: str,
+                           source: Optional[str] = None) -> Tuple[str, Iterable[Dict[str, Any]]]:
+        """
+        Run the processor matching the file type.
+        
+        Args:
+            file_path: Path to the file
+            source: Source to report instead of file_path (e.g. for archive members)
             
-            if extension in self.supported_extensions['text']:
-                # Process as text
-                documents = self.text_processor.process(file_path)
-                file_type = 'text'
-            elif extension in self.supported_extensions['image']:
-                # Process as image
-                documents = self.image_processor.process(file_path)
-                file_type = 'image'
-            elif extension in self.supported_extensions['video'] or extension in self.supported_extensions['audio']:
-                # Process as video/audio
-                documents = self.video_processor.process(file_path)
-                file_type = 'video/audio'
-            elif is_binary_file(file_path):
-                # Process as binary
-                documents = self.binary_processor.process(file_path)
-                file_type = 'binary'
-            else:
-                # Try processing as text by default
-                documents = self.text_processor.process(file_path)
-                file_type = 'unknown'
+        Returns:
+            Tuple of (file_type, documents)
+        """
+        # Determine the file type
+        extension = get_file_extension(source or file_path)
+        
+        if extension in self.supported_extensions['text']:
+            # Process as text; streamed so large files are stored in batches
+            documents = self.text_processor.iter_documents(file_path)
+            file_type = 'text'
+        elif extension in self.supported_extensions['image']:
+            # Process as image
+            documents = self.image_processor.process(file_path)
+            file_type = 'image'
+        elif extension in self.supported_extensions['video'] or extension in self.supported_extensions['audio']:
+            # Process as video/audio
+            documents = self.video_processor.process(file_path)
+            file_type = 'video/audio'
+        elif is_binary_file(file_path):
+            # Process as binary
+            documents = self.binary_processor.process(file_path)
+            file_type = 'binary'
+        else:
+            # Try processing as text by default
+            documents = self.text_processor.iter_documents(file_path)
+            file_type = 'unknown'
+        
+        if source:
+            documents = self._with_source(documents, source)
+        return file_type, documents
+    
+    def _with_source(self, documents: Iterable[Dict[str, Any]], source: str) -> Iterator[Dict[str, Any]]:
+        """Rewrite the source of documents extracted from a temporary copy."""
+        for doc in documents:
+            doc['source'] = source
+            doc.setdefault('metadata', {})['filename'] = get_file_name(source)
+            yield doc
+    
+    def _ingest_source(self, source: str, stats: Dict[str, Any],
+                       extract: Callable[[], Tuple[str, Iterable[Dict[str, Any]]]],
+                       job: Optional[IngestionJob] = None):
+        """
+        Extract, embed and store the documents of one file and update stats.
+        
+        Archive members are ingested from several threads, so stats are
+        only updated while holding the stats lock. Within a job, a source
+        finished before is skipped (the saved stats count it already), and
+        the chunks stored before of a partly stored one are not stored again.
+        """
+        skip = 0
+        on_batch = None
+        if job is not None:
+            job.check()
+            skip, finished = job.committed(source)
+            if finished:
+                return
+            on_batch = lambda count: job.batch_committed(source, count)
             
-            # Update stats
-            if file_type not in stats['by_type']:
+        file_type = None
+        stored = skip
+        try:
+            file_type, documents = extract()
+            if skip:
+                documents = self._skip_stored(documents, skip)
+            stored = skip + self._embed_and_store(documents, on_batch=on_batch)
+        except JobStopped:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing file {source}: {str(e)}")
+            # Chunks stored before the error do not make the source processed
+            stored = 0
+        
+        # Counted once finished, so the stats saved at a job checkpoint only cover finished sources
+        with self._stats_lock:
+            stats['total_files'] += 1
+            if file_type is not None and file_type not in stats['by_type']:
                 stats['by_type'][file_type] = {'processed': 0, 'failed': 0}
             
-            if documents:
-                # Generate embeddings
-                documents_with_embeddings = self.embedding_generator.generate(documents)
-                
-                # Store in Milvus
-                if self.storage.store(documents_with_embeddings):
-                    stats['processed_files'] += 1
-                    stats['processed_documents'] += len(documents)
+            if stored:
+                stats['processed_files'] += 1
+                stats['processed_documents'] += stored
+                if file_type is not None:
                     stats['by_type'][file_type]['processed'] += 1
-                else:
-                    stats['failed_files'] += 1
-                    stats['by_type'][file_type]['failed'] += 1
             else:
                 stats['failed_files'] += 1
-                stats['by_type'][file_type]['failed'] += 1
-                
-        except Exception as e:
-            logger.error(f"Error processing file {file_path}: {str(e)}")
-            stats['failed_files'] += 1
\ No newline at end of file
+                if file_type is not None:
+                    stats['by_type'][file_type]['failed'] += 1
+                    
+            if job is not None:
+                job.source_finished(source, stored > 0, stats)
+    
+    def _skip_stored(self, documents: Iterable[Dict[str, Any]], count: int) -> Iterator[Dict[str, Any]]:
+        """
+        Skip the first count documents of a source, which an interrupted job run stored already.
+        
+        They are in Milvus, but the sparse index is only saved at the end
+        of an ingestion, so after a crash they may be missing from it; those
+        are indexed again, in batches, so sparse search still finds them.
+        """
+        iterator = iter(documents)
+        while count > 0:
+            batch = list(islice(iterator, min(count, INGEST_BATCH_SIZE)))
+            if not batch:
+                break
+            count -= len(batch)
+            if self.sparse_index is not None and self.sparse_index.add_missing(batch):
+                self._corpus_changed()
+        return iterator
+        
+    def _embed_and_store(self, documents: Iterable[Dict[str, Any]], batch_size: int = INGEST_BATCH_SIZE,
+                         on_batch: Optional[Callable[[int], None]] = None) -> int:
+        """
+        Embed and store documents in fixed-size batches.
+        
+        Only one batch is held in memory at a time, so streamed documents from
+        very large files never have to be materialized as a whole.
+        
+        Args:
+            documents: Iterable of document dictionaries
+            batch_size: Number of documents embedded and stored per batch
+            on_batch: Called with the size of every batch once it is stored
+            
+        Returns:
+            Number of documents stored (0 if nothing was stored)
+            
+        Raises:
+            RuntimeError: If a batch could not be stored
+        """
+        iterator = iter(documents)
+        stored = 0
+        
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return stored
+            
+            # Embed and store in Milvus, yielding to queries waiting for the same resources
+            with self.scheduler.slot(INGEST):
+                documents_with_embeddings = self.embedding_generator.generate(batch)
+                if not self.storage.store(documents_with_embeddings):
+                    raise RuntimeError(f"Failed to store batch after {stored} documents")
+            if self.sparse_index is not None:
+                self.sparse_index.add(batch)
+            self._corpus_changed()
+            stored += len(batch)
+            if on_batch is not None:
+                on_batch(len(batch))
@@ -1,46 +1,282 @@
-from typing import List, Dict, Any, Optional
+import asyncio
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import List, Dict, Any, Optional, Sequence
 from src.ingestion.storage import MilvusStorage
 from src.ingestion.embedding_generator import EmbeddingGenerator
+from src.retrieval.sparse_index import BM25Index, chunk_key
+from src.utils.deadline import Deadline
 from src.utils.logger import setup_logger
-from src.config import MAX_DOCUMENTS_RETURNED
+from src.config import (
+    MAX_DOCUMENTS_RETURNED, RETRIEVAL_MMR_ENABLED, RETRIEVAL_MMR_LAMBDA,
+    RETRIEVAL_MMR_FETCH_FACTOR, RETRIEVAL_NEIGHBOUR_CHUNKS, RETRIEVAL_HYBRID_ENABLED,
+    RETRIEVAL_HYBRID_FETCH_FACTOR, RETRIEVAL_RRF_K, SPARSE_INDEX_SEARCH_WORKERS,
+    DEADLINE_FAST_RETRIEVAL_SECONDS, DEADLINE_SEARCH_EF
+)
 
 logger = setup_logger(__name__)
 
+def maximal_marginal_relevance(query_embedding: Sequence[float], candidate_embeddings: Sequence[Sequence[float]],
+                               k: int, lambda_mult: float = RETRIEVAL_MMR_LAMBDA) -> List[int]:
+    """
+    Pick k candidates that are relevant to the query but not to each other.
+    
+    Each step takes the candidate maximizing
+    lambda_mult * sim(query, c) - (1 - lambda_mult) * max sim(c, picked).
+    All similarities come from one matrix product up front, and each step
+    only updates a running maximum, so picking is O(k * n).
+    
+    Args:
+        query_embedding: Query vector
+        candidate_embeddings: One vector per candidate
+        k: Number of candidates to pick
+        lambda_mult: Trade-off between relevance (1.0) and diversity (0.0)
+        
+    Returns:
+        Indexes of the picked candidates, in pick order
+    """
+    candidates = np.asarray(candidate_embeddings, dtype=np.float32)
+    if candidates.size == 0 or k <= 0:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    
+    # Cosine similarities, as the collection is indexed with the COSINE metric
+    candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    
+    picked = []
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    for _ in range(min(k, len(candidates))):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return picked
+
+def reciprocal_rank_fusion(result_lists: Sequence[List[Dict[str, Any]]], top_k: int,
+                           k: int = RETRIEVAL_RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked result lists by reciprocal rank fusion.
+    
+    A document scores the sum of 1 / (k + rank) over the lists it appears
+    in, so only ranks matter and BM25 and cosine scores need no calibration.
+    A document found by several lists is taken from the first one.
+    
+    Args:
+        result_lists: Ranked lists of document dictionaries, best first
+        top_k: Maximum number of documents to return
+        k: Damping constant; larger values flatten the rank differences
+        
+    Returns:
+        Fused list of document dictionaries with 'score' set to the fused score
+    """
+    scores = {}
+    documents = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            key = chunk_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+            documents.setdefault(key, document)
+    # sorted() is stable, so ties keep the order of the earlier lists
+    ranked = sorted(scores, key=lambda key: -scores[key])[:top_k]
+    return [dict(documents[key], score=scores[key]) for key in ranked]
+
 class Retriever:
     """
     Retrieves relevant documents from the vector database based on a query.
     """
     
-    def __init__(self):
-        """Initialize the retriever."""
-        self.embedding_generator = EmbeddingGenerator()
-        self.storage = MilvusStorage()
+    def __init__(self, embedding_generator: Optional[EmbeddingGenerator] = None,
+                 storage: Optional[MilvusStorage] = None, sparse_index: Optional[BM25Index] = None):
+        """
+        Initialize the retriever.
+        
+        Args:
+            embedding_generator: Embedding model to share (default: a new one)
+            storage: Milvus storage to share (default: a new connection)
+            sparse_index: BM25 index searched alongside Milvus in hybrid mode (default: none)
+        """
+        self.embedding_generator = embedding_generator or EmbeddingGenerator()
+        self.storage = storage or MilvusStorage()
+        self.sparse_index = sparse_index
+        self._sparse_executor = None
+        if sparse_index is not None:
+            self._sparse_executor = ThreadPoolExecutor(max_workers=max(1, SPARSE_INDEX_SEARCH_WORKERS),
+                                                       thread_name_prefix="sparse-search")
         logger.info("Retriever initialized")
         
-    def retrieve(self, query: str, top_k: int = MAX_DOCUMENTS_RETURNED) -> List[Dict[str, Any]]:
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a query for searching.
+        
+        Args:
+            query: The query text
+            
+        Returns:
+            Query embedding
+            
+        Raises:
+            RuntimeError: If the embedding could not be generated
+        """
+        query_with_embedding = self.embedding_generator.generate([{'content': query}])
+        if not query_with_embedding or 'embedding' not in query_with_embedding[0]:
+            raise RuntimeError("Failed to embed query")
+        return query_with_embedding[0]['embedding']
+        
+    def retrieve(self, query: str, top_k: int = MAX_DOCUMENTS_RETURNED,
+                 query_embedding: Optional[List[float]] = None, diversify: bool = RETRIEVAL_MMR_ENABLED,
+                 neighbours: int = RETRIEVAL_NEIGHBOUR_CHUNKS,
+                 hybrid: bool = RETRIEVAL_HYBRID_ENABLED, deadline: Optional[Deadline] = None,
+                 degradations: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
         Retrieve relevant documents based on a query.
         
+        With diversify, RETRIEVAL_MMR_FETCH_FACTOR times top_k candidates are
+        fetched and top_k of them picked by maximal marginal relevance. With
+        hybrid and a sparse index, the BM25 search runs in a worker thread
+        while the query is embedded and Milvus is searched, each side returns
+        RETRIEVAL_HYBRID_FETCH_FACTOR times top_k results, and the two lists
+        are merged by reciprocal rank fusion. With neighbours, the chunks up
+        to that many positions before and after each result in the same
+        source are fetched in one batched query and appended with their
+        result's score, so they can be merged into its passage.
+        
+        With less than DEADLINE_FAST_RETRIEVAL_SECONDS left of the deadline,
+        the search runs with a smaller HNSW ef and half of top_k, and
+        diversification and neighbour expansion are skipped. BM25 results
+        that are not ready by the deadline, or whose search fails, are left
+        out.
+        
         Args:
             query: The query text
             top_k: Maximum number of documents to retrieve
+            query_embedding: Embedding of the query, if already computed
+            diversify: Re-rank over-fetched candidates with maximal marginal relevance
+            neighbours: Number of adjacent chunks to add on each side of a result
+            hybrid: Fuse dense results with BM25 results from the sparse index
+            deadline: Time budget of the retrieval (None = no limit)
+            degradations: List the names of the degradations applied are appended to
             
         Returns:
             List of document dictionaries with content, source, metadata, and score
         """
         logger.info(f"Retrieving documents for query: {query}")
         
+        applied = []
+        search_options = {}
+        if deadline is not None and deadline.remaining() < DEADLINE_FAST_RETRIEVAL_SECONDS:
+            search_options['ef'] = DEADLINE_SEARCH_EF
+            applied.append('reduced_search_ef')
+            if top_k > 1:
+                top_k = max(1, top_k // 2)
+                applied.append('reduced_top_k')
+            if diversify:
+                diversify = False
+                applied.append('skipped_diversification')
+            if neighbours > 0:
+                neighbours = 0
+                applied.append('skipped_neighbour_chunks')
+            logger.warning(f"{deadline.remaining():.3f}s left for retrieval, degrading: {', '.join(applied)}")
+            
         try:
+            # Start the BM25 search first, so it overlaps with embedding and the Milvus search
+            sparse = None
+            fetch = top_k
+            if hybrid and self.sparse_index is not None:
+                fetch = top_k * max(1, RETRIEVAL_HYBRID_FETCH_FACTOR)
+                sparse = self._sparse_executor.submit(self.sparse_index.search, query, fetch)
+                
             # Generate embedding for the query
-            query_doc = [{'content': query}]
-            query_with_embedding = self.embedding_generator.generate(query_doc)
-            query_embedding = query_with_embedding[0]['embedding']
-            
+            if query_embedding is None:
+                query_embedding = self.embed_query(query)
+                
             # Search for relevant documents
-            documents = self.storage.search(query_embedding, top_k)
-            
+            if diversify:
+                candidates = self.storage.search(query_embedding, fetch * max(1, RETRIEVAL_MMR_FETCH_FACTOR),
+                                                 include_embeddings=True, **search_options)
+                picked = maximal_marginal_relevance(
+                    query_embedding, [candidate['embedding'] for candidate in candidates], fetch
+                )
+                documents = [candidates[i] for i in picked]
+                for document in documents:
+                    document.pop('embedding', None)
+            else:
+                documents = self.storage.search(query_embedding, fetch, **search_options)
+                
+            if sparse is not None:
+                try:
+                    documents = reciprocal_rank_fusion([documents, sparse.result(timeout=Deadline.time_left(deadline))],
+                                                       top_k)
+                except FutureTimeoutError:
+                    logger.warning("Sparse search missed the deadline, using dense results only")
+                    applied.append('skipped_sparse_search')
+                    documents = documents[:top_k]
+                except Exception as e:
+                    logger.error(f"Sparse search failed, using dense results only: {str(e)}")
+                    applied.append('skipped_sparse_search')
+                    documents = documents[:top_k]
+                
+            if neighbours > 0:
+                documents.extend(self._neighbour_chunks(documents, neighbours))
+                
+            if degradations is not None:
+                degradations.extend(applied)
             return documents
             
         except Exception as e:
             logger.error(f"Error retrieving documents: {str(e)}")
-            return []
\ No newline at end of file
+            return []
+            
+    def _neighbour_chunks(self, documents: List[Dict[str, Any]], distance: int) -> List[Dict[str, Any]]:
+        """Fetch the chunks adjacent to documents that are not among them already."""
+        present = set()
+        wanted = {}
+        for document in documents:
+            metadata = document.get('metadata') or {}
+            if metadata.get('chunk_index') is not None:
+                present.add((document['source'], metadata['chunk_index']))
+        for document in documents:
+            metadata = document.get('metadata') or {}
+            if metadata.get('chunk_index') is None:
+                continue
+            for offset in range(-distance, distance + 1):
+                key = (document['source'], metadata['chunk_index'] + offset)
+                if offset and key[1] >= 0 and key not in present:
+                    # A chunk next to several results takes the best score
+                    wanted[key] = max(wanted.get(key, float('-inf')), document.get('score') or 0.0)
+                    
+        neighbours = []
+        for chunk in self.storage.get_chunks(list(wanted)):
+            key = (chunk['source'], (chunk.get('metadata') or {}).get('chunk_index'))
+            if key in wanted and key not in present:
+                present.add(key)
+                neighbours.append(dict(chunk, score=wanted[key]))
+        logger.info(f"Added {len(neighbours)} neighbouring chunks")
+        return neighbours
+        
+    async def aretrieve(self, query: str, top_k: int = MAX_DOCUMENTS_RETURNED,
+                        query_embedding: Optional[List[float]] = None, deadline: Optional[Deadline] = None,
+                        degradations: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Async version of retrieve().
+        
+        Query embedding and the Milvus search are blocking calls, so they run
+        in a worker thread and the event loop stays free for other queries.
+        
+        Args:
+            query: The query text
+            top_k: Maximum number of documents to retrieve
+            query_embedding: Embedding of the query, if already computed
+            deadline: Time budget of the retrieval (None = no limit)
+            degradations: List the names of the degradations applied are appended to
+            
+        Returns:
+            List of document dictionaries with content, source, metadata, and score
+        """
+        return await asyncio.to_thread(self.retrieve, query, top_k, query_embedding,
+                                       deadline=deadline, degradations=degradations)
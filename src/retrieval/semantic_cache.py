@@ -0,0 +1,146 @@
+import time
+import threading
+import numpy as np
+from typing import Dict, Any, Optional, Sequence
+from src.utils.logger import setup_logger
+from src.config import SEMANTIC_CACHE_MAX_ENTRIES, SEMANTIC_CACHE_THRESHOLD
+
+logger = setup_logger(__name__)
+
+
+class SemanticCache:
+    """
+    In-memory cache of answers keyed by query embedding.
+    
+    A query whose embedding has cosine similarity of at least `threshold`
+    with a cached query gets that query's answer, so paraphrases skip
+    retrieval and generation. Embeddings are kept normalized in one matrix,
+    so a lookup is a single matrix-vector product. Entries are tied to the
+    corpus version they were answered against; a lookup with a newer version
+    drops them all. Beyond `max_entries` the least recently used entry is
+    evicted. Safe to use from several threads.
+    """
+    
+    def __init__(self, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, threshold: float = SEMANTIC_CACHE_THRESHOLD):
+        """
+        Initialize an empty cache.
+        
+        Args:
+            max_entries: Maximum number of cached answers
+            threshold: Minimum cosine similarity for a hit
+        """
+        self.max_entries = max(1, max_entries)
+        self.threshold = threshold
+        self.corpus_version = None
+        self._vectors = None
+        self._entries = [None] * self.max_entries
+        self._used = np.zeros(self.max_entries)
+        self._size = 0
+        self._hits = 0
+        self._misses = 0
+        self._hit_similarity = 0.0
+        self._lock = threading.Lock()
+        
+    def lookup(self, embedding: Sequence[float], corpus_version: int,
+               threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Find the answer of the most similar cached query.
+        
+        Args:
+            embedding: Embedding of the new query
+            corpus_version: Current version of the ingested corpus
+            threshold: Minimum cosine similarity for this lookup (default: the cache's)
+            
+        Returns:
+            The cached result dict with 'similarity' and 'cached_query' added,
+            or None on a miss
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(corpus_version)
+            if self._size == 0 or query.shape[0] != self._vectors.shape[1]:
+                self._misses += 1
+                return None
+                
+            similarities = self._vectors[:self._size] @ query
+            slot = int(np.argmax(similarities))
+            similarity = float(similarities[slot])
+            if similarity < (self.threshold if threshold is None else threshold):
+                self._misses += 1
+                logger.debug(f"Semantic cache miss (best similarity {similarity:.3f})")
+                return None
+                
+            self._used[slot] = time.monotonic()
+            self._hits += 1
+            self._hit_similarity += similarity
+            entry = self._entries[slot]
+            
+        logger.info(f"Semantic cache hit (similarity {similarity:.3f}) on earlier query: {entry['query']}")
+        return dict(entry['result'], similarity=similarity, cached_query=entry['query'])
+        
+    def store(self, query: str, embedding: Sequence[float], result: Dict[str, Any], corpus_version: int):
+        """
+        Cache the result of a query, evicting the least recently used entry if full.
+        
+        Args:
+            query: The query text
+            embedding: Embedding of the query
+            result: Result dict to return on later hits
+            corpus_version: Corpus version the result was produced against
+        """
+        vector = self._normalize(embedding)
+        with self._lock:
+            self._check_version(corpus_version)
+            if self._vectors is None or vector.shape[0] != self._vectors.shape[1]:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._size = 0
+                
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._used))
+                
+            self._vectors[slot] = vector
+            self._entries[slot] = {'query': query, 'result': result}
+            self._used[slot] = time.monotonic()
+            
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return cache statistics since startup.
+        
+        Returns:
+            Dict with 'entries', 'hits', 'misses', 'hit_rate' and
+            'mean_hit_similarity'
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': self._size,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': self._hits / lookups if lookups else 0.0,
+                'mean_hit_similarity': self._hit_similarity / self._hits if self._hits else None
+            }
+            
+    def clear(self):
+        """Remove all cached answers."""
+        with self._lock:
+            self._size = 0
+            self._entries = [None] * self.max_entries
+            
+    def _check_version(self, corpus_version: int):
+        """Drop all entries if the corpus changed; the lock must be held."""
+        if corpus_version != self.corpus_version:
+            if self._size:
+                logger.info(f"Corpus changed, dropping {self._size} semantic cache entries")
+            self._size = 0
+            self._entries = [None] * self.max_entries
+            self.corpus_version = corpus_version
+            
+    @staticmethod
+    def _normalize(embedding: Sequence[float]) -> np.ndarray:
+        """Return the embedding as a unit-length float32 vector."""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
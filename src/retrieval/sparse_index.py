@@ -0,0 +1,501 @@
+import os
+import re
+import json
+import math
+import shutil
+import threading
+import numpy as np
+from array import array
+from typing import List, Dict, Any, Iterable, Tuple, Optional
+from src.utils.logger import setup_logger
+from src.config import SPARSE_INDEX_PATH, SPARSE_INDEX_K1, SPARSE_INDEX_B
+
+logger = setup_logger(__name__)
+
+# Words, plus identifiers joined by . - : / # such as ERR-404, v2.1.3 or os.path.join
+_COMPOUND = re.compile(r'\w+(?:[.\-:/#]\w+)*')
+_SEPARATOR = re.compile(r'[.\-:/#_]+')
+_CAMEL = re.compile(r'(?<=[a-z])(?=[A-Z])')
+
+# Share of deleted documents at which postings are rewritten without them
+_COMPACT_RATIO = 0.5
+
+# Segments written by incremental saves before they are merged into one
+_MAX_SEGMENTS = 16
+
+_MANIFEST = "manifest.json"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms for the sparse index.
+    
+    Identifiers are kept whole, so an exact error code or function name
+    matches as one rare term, and their parts are added as well, so
+    "parseHeader" or "ERR-404" also match "header" or "404".
+    
+    Args:
+        text: Text to tokenize
+        
+    Returns:
+        List of terms, with repeats
+    """
+    terms = []
+    for match in _COMPOUND.finditer(text):
+        compound = match.group()
+        terms.append(compound.lower())
+        parts = [part for piece in _SEPARATOR.split(compound) for part in _CAMEL.split(piece) if part]
+        if len(parts) > 1:
+            terms.extend(part.lower() for part in parts)
+    return terms
+
+
+def chunk_key(document: Dict[str, Any]) -> Tuple[str, Any]:
+    """
+    Identify a chunk across the dense and sparse indexes.
+    
+    Args:
+        document: Document dictionary with 'source' and 'metadata'
+        
+    Returns:
+        (source, chunk_index), or (source, content) for chunks without an index
+    """
+    metadata = document.get('metadata') or {}
+    index = metadata.get('chunk_index') if isinstance(metadata, dict) else None
+    return (document.get('source') or '', index if index is not None else document.get('content') or '')
+
+
+class BM25Index:
+    """
+    In-memory BM25 inverted index over the ingested chunks, persisted to disk.
+    
+    Each term maps to two parallel arrays of document numbers and term
+    frequencies, so postings take 8 bytes per entry and scoring a term is
+    a few NumPy operations. Documents are only ever appended, which keeps
+    postings sorted; deleting a source marks its documents dead, and the
+    postings are rewritten without them once half the documents are dead.
+    The chunk texts are kept as well, so hits can be returned without a
+    round trip to Milvus. Safe to use from several threads.
+    
+    On disk the index is a directory of segments, each holding the
+    documents added between two saves, and a log of deleted document
+    numbers. A manifest names the segments and the length of the log, so
+    a save only writes what changed and a crash never leaves a torn index.
+    """
+    
+    def __init__(self, path: str = SPARSE_INDEX_PATH, k1: float = SPARSE_INDEX_K1, b: float = SPARSE_INDEX_B):
+        """
+        Initialize the index, loading it from path if it was saved before.
+        
+        Args:
+            path: Directory of the index files
+            k1: BM25 term frequency saturation
+            b: BM25 document length normalization
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        # Held for a whole save, so saves write their segments one at a time
+        self._save_lock = threading.Lock()
+        self._reset()
+        if path and os.path.exists(os.path.join(path, _MANIFEST)):
+            self._load()
+            
+    def __len__(self) -> int:
+        """Number of live documents."""
+        return self._live
+        
+    def add(self, documents: Iterable[Dict[str, Any]]):
+        """
+        Index documents.
+        
+        Args:
+            documents: Document dictionaries with 'content', 'source' and 'metadata'
+        """
+        tokenized = [(document, tokenize(document.get('content') or '')) for document in documents]
+        with self._lock:
+            for document, terms in tokenized:
+                number = len(self._documents)
+                counts = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+                for term, count in counts.items():
+                    postings = self._postings.get(term)
+                    if postings is None:
+                        postings = self._postings[term] = (array('I'), array('I'))
+                    # First posting of the term since the last save, where the next segment starts
+                    if term not in self._unsaved:
+                        self._unsaved[term] = len(postings[0])
+                    postings[0].append(number)
+                    postings[1].append(count)
+                    
+                source = document.get('source') or ''
+                self._documents.append({
+                    'source': source,
+                    'content': document.get('content') or '',
+                    'metadata': document.get('metadata') or {}
+                })
+                self._lengths.append(len(terms))
+                self._alive.append(1)
+                self._by_source.setdefault(source, []).append(number)
+                self._live += 1
+                self._total_length += len(terms)
+            self._dirty = True
+            
+    def add_missing(self, documents: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index those documents that are not indexed yet, as identified by chunk_key().
+        
+        Args:
+            documents: Document dictionaries with 'content', 'source' and 'metadata'
+            
+        Returns:
+            Number of documents added
+        """
+        documents = list(documents)
+        with self._lock:
+            indexed = {chunk_key(self._documents[number])
+                       for source in {document.get('source') or '' for document in documents}
+                       for number in self._by_source.get(source, [])}
+        missing = [document for document in documents if chunk_key(document) not in indexed]
+        if missing:
+            self.add(missing)
+        return len(missing)
+        
+    def delete_by_source(self, source: str):
+        """
+        Remove all documents of a source, e.g. before indexing an updated page.
+        
+        Args:
+            source: Source identifier of the documents
+        """
+        with self._lock:
+            for number in self._by_source.pop(source, []):
+                if self._alive[number]:
+                    self._alive[number] = 0
+                    self._deleted.append(number)
+                    self._live -= 1
+                    self._total_length -= self._lengths[number]
+                    self._dirty = True
+            if len(self._documents) - self._live > _COMPACT_RATIO * len(self._documents):
+                self._compact()
+                
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Find the documents scoring highest for a query under BM25.
+        
+        Args:
+            query: The query text
+            top_k: Maximum number of documents to return
+            
+        Returns:
+            List of document dictionaries with content, source, metadata, and score
+        """
+        terms = set(tokenize(query))
+        with self._lock:
+            if not terms or not self._live or top_k <= 0:
+                return []
+            # Scored in a helper, so no NumPy view of the postings outlives the lock
+            matches, scores = self._score(terms, top_k)
+            return [dict(self._documents[number], metadata=dict(self._documents[number]['metadata']),
+                         score=float(score))
+                    for number, score in zip(matches, scores)]
+                    
+    def save(self):
+        """
+        Write the changes since the last save to disk.
+        
+        Documents added since then go into a new segment and deleted ones
+        are appended to the delete log, so a save costs as much as the
+        change, not the index. The changes are copied under the lock and
+        written outside it, so searches do not wait for the disk. Once there
+        are too many segments, or after the index was compacted, the index
+        is compacted and written as a single segment of a new generation.
+        """
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                full = self._rewrite or len(self._segments) >= _MAX_SEGMENTS
+                if full:
+                    self._compact()
+                    snapshot = self._snapshot({term: 0 for term in self._postings}, 0)
+                    generation, segments, deleted, logged = self._generation + 1, [], [], 0
+                else:
+                    snapshot = self._snapshot(self._unsaved, self._saved)
+                    generation, segments, deleted, logged = (self._generation, self._segments,
+                                                             self._deleted, self._logged)
+                self._unsaved = {}
+                self._deleted = []
+                self._saved = len(self._documents)
+                self._rewrite = False
+                self._dirty = False
+                live = self._live
+                
+            try:
+                segments, logged = self._write(generation, segments, snapshot, deleted, logged, full)
+            except Exception:
+                # What was not written is written as a whole next time
+                with self._lock:
+                    self._rewrite = True
+                    self._dirty = True
+                raise
+            self._generation, self._segments, self._logged = generation, segments, logged
+            
+        logger.info(f"Saved sparse index with {live} documents to {self.path} "
+                    f"({len(snapshot['documents']) if snapshot else 0} new, {len(deleted)} deleted, "
+                    f"{len(segments)} segments)")
+        
+    def clear(self):
+        """Remove all documents and the index files."""
+        with self._save_lock, self._lock:
+            self._reset()
+            if self.path and os.path.isdir(self.path):
+                shutil.rmtree(self.path)
+                
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return index statistics.
+        
+        Returns:
+            Dict with 'documents', 'deleted', 'terms', 'postings' and saved 'segments'
+        """
+        with self._lock:
+            return {
+                'documents': self._live,
+                'deleted': len(self._documents) - self._live,
+                'terms': len(self._postings),
+                'postings': sum(len(postings[0]) for postings in self._postings.values()),
+                'segments': len(self._segments)
+            }
+            
+    def _score(self, terms: Iterable[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the numbers and scores of the top_k matching documents, best first; the lock must be held."""
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32).astype(np.float32)
+        average = self._total_length / self._live or 1.0
+        norms = self.k1 * (1 - self.b + self.b * lengths / average)
+        scores = np.zeros(len(self._documents), dtype=np.float32)
+        
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            numbers = np.frombuffer(postings[0], dtype=np.uint32)
+            frequencies = np.frombuffer(postings[1], dtype=np.uint32).astype(np.float32)
+            frequency = int(np.count_nonzero(alive[numbers]))
+            if not frequency:
+                continue
+            idf = math.log(1 + (self._live - frequency + 0.5) / (frequency + 0.5))
+            # A term occurs once per document in its postings, so plain fancy-index adds are safe
+            scores[numbers] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[numbers])
+            
+        scores[~alive] = 0.0
+        matches = np.flatnonzero(scores > 0)
+        if len(matches) > top_k:
+            matches = matches[np.argpartition(-scores[matches], top_k - 1)[:top_k]]
+        matches = matches[np.argsort(-scores[matches], kind='stable')]
+        return matches, scores[matches]
+        
+    def _reset(self):
+        """Empty the index; the lock must be held."""
+        self._postings = {}
+        self._documents = []
+        self._lengths = array('I')
+        self._alive = array('B')
+        self._by_source = {}
+        self._live = 0
+        self._total_length = 0
+        self._dirty = False
+        
+        # Changes since the last save, and what is on disk
+        self._unsaved = {}
+        self._deleted = []
+        self._saved = 0
+        self._rewrite = True
+        self._generation = 0
+        self._segments = []
+        self._logged = 0
+        
+    def _compact(self):
+        """Rewrite postings and documents without the dead documents; the lock must be held."""
+        if self._live == len(self._documents):
+            return
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        renumber = (np.cumsum(alive) - 1).astype(np.uint32)
+        
+        postings = {}
+        for term, (numbers, frequencies) in self._postings.items():
+            numbers = np.frombuffer(numbers, dtype=np.uint32)
+            keep = alive[numbers]
+            if keep.any():
+                postings[term] = (array('I', renumber[numbers[keep]].tobytes()),
+                                  array('I', np.frombuffer(frequencies, dtype=np.uint32)[keep].tobytes()))
+                                  
+        kept = np.flatnonzero(alive)
+        documents = [self._documents[number] for number in kept]
+        lengths = array('I', np.frombuffer(self._lengths, dtype=np.uint32)[kept].tobytes())
+        logger.info(f"Compacted sparse index from {len(self._documents)} to {len(documents)} documents")
+        
+        self._postings = postings
+        self._documents = documents
+        self._lengths = lengths
+        self._alive = array('B', [1]) * len(documents)
+        self._by_source = {}
+        for number, document in enumerate(documents):
+            self._by_source.setdefault(document['source'], []).append(number)
+        # Document numbers changed, so the saved segments no longer apply
+        self._unsaved = {}
+        self._deleted = []
+        self._rewrite = True
+        self._dirty = True
+        
+    def _snapshot(self, unsaved: Dict[str, int], start: int) -> Optional[Dict[str, Any]]:
+        """
+        Copy the documents from number start on and their postings; the lock must be held.
+        
+        Args:
+            unsaved: Term to the position of its first posting to copy
+            start: Number of the first document to copy
+            
+        Returns:
+            Segment contents for _write_segment(), or None if there are no such documents
+        """
+        if start == len(self._documents):
+            return None
+        terms = list(unsaved)
+        return {
+            'start': start,
+            'terms': terms,
+            'numbers': [self._postings[term][0][unsaved[term]:] for term in terms],
+            'frequencies': [self._postings[term][1][unsaved[term]:] for term in terms],
+            'lengths': self._lengths[start:],
+            'documents': self._documents[start:]
+        }
+        
+    def _write(self, generation: int, segments: List[str], snapshot: Optional[Dict[str, Any]],
+               deleted: List[int], logged: int, full: bool) -> Tuple[List[str], int]:
+        """
+        Write a segment and deletions, then the manifest that makes them part of the index.
+        
+        Args:
+            generation: Generation of the index files
+            segments: Segments already in the manifest
+            snapshot: New segment, if documents were added
+            deleted: Numbers of documents deleted since the last save
+            logged: Entries already in the delete log
+            full: Whether this starts a new generation, replacing all older files
+            
+        Returns:
+            Tuple of (segments, delete log entries) now in the manifest
+        """
+        os.makedirs(self.path, exist_ok=True)
+        if snapshot is not None:
+            name = f"segment-{generation}-{len(segments)}.npz"
+            self._write_segment(os.path.join(self.path, name), snapshot)
+            segments = segments + [name]
+            
+        log = f"deleted-{generation}.bin"
+        if deleted:
+            with open(os.path.join(self.path, log), 'ab') as file:
+                # Entries past the manifest's count are from a save that did not finish
+                file.truncate(logged * 4)
+                file.write(np.asarray(deleted, dtype=np.uint32).tobytes())
+            logged += len(deleted)
+            
+        manifest = os.path.join(self.path, _MANIFEST)
+        with open(manifest + ".tmp", 'w') as file:
+            json.dump({'generation': generation, 'segments': segments, 'deleted': logged}, file)
+        os.replace(manifest + ".tmp", manifest)
+        
+        if full:
+            for name in set(os.listdir(self.path)) - set(segments) - {log, _MANIFEST}:
+                if name.startswith(("segment-", "deleted-")):
+                    os.remove(os.path.join(self.path, name))
+        return segments, logged
+        
+    @staticmethod
+    def _write_segment(path: str, snapshot: Dict[str, Any]):
+        """Write a segment under a temporary name and swap it in."""
+        sizes = np.array([len(numbers) for numbers in snapshot['numbers']], dtype=np.int64)
+        texts = [document['content'].encode('utf-8') for document in snapshot['documents']]
+        header = json.dumps({
+            'start': snapshot['start'],
+            'terms': snapshot['terms'],
+            'documents': [[document['source'], document['metadata']] for document in snapshot['documents']]
+        })
+        with open(path + ".tmp", 'wb') as file:
+            np.savez(file, header=np.frombuffer(header.encode('utf-8'), dtype=np.uint8),
+                     offsets=np.concatenate(([0], np.cumsum(sizes))),
+                     numbers=np.frombuffer(b''.join(snapshot['numbers']), dtype=np.uint32),
+                     frequencies=np.frombuffer(b''.join(snapshot['frequencies']), dtype=np.uint32),
+                     lengths=np.frombuffer(snapshot['lengths'], dtype=np.uint32),
+                     text_offsets=np.concatenate(([0], np.cumsum([len(text) for text in texts]))),
+                     texts=np.frombuffer(b''.join(texts), dtype=np.uint8))
+        os.replace(path + ".tmp", path)
+        
+    def _load(self):
+        """Read the index from disk, starting empty if it cannot be read."""
+        try:
+            with open(os.path.join(self.path, _MANIFEST)) as file:
+                manifest = json.load(file)
+                
+            postings = {}
+            documents = []
+            lengths = array('I')
+            for name in manifest['segments']:
+                with np.load(os.path.join(self.path, name), allow_pickle=False) as data:
+                    header = json.loads(data['header'].tobytes().decode('utf-8'))
+                    offsets = data['offsets']
+                    numbers = data['numbers'].astype(np.uint32)
+                    frequencies = data['frequencies'].astype(np.uint32)
+                    text_offsets = data['text_offsets']
+                    texts = data['texts'].tobytes()
+                    segment_lengths = data['lengths'].astype(np.uint32)
+                if header['start'] != len(documents):
+                    raise ValueError(f"Segment {name} starts at document {header['start']}, not {len(documents)}")
+                    
+                for position, term in enumerate(header['terms']):
+                    start, end = offsets[position], offsets[position + 1]
+                    entry = postings.get(term)
+                    if entry is None:
+                        entry = postings[term] = (array('I'), array('I'))
+                    entry[0].frombytes(numbers[start:end].tobytes())
+                    entry[1].frombytes(frequencies[start:end].tobytes())
+                for position, (source, metadata) in enumerate(header['documents']):
+                    text = texts[text_offsets[position]:text_offsets[position + 1]].decode('utf-8')
+                    documents.append({'source': source, 'content': text, 'metadata': metadata})
+                lengths.frombytes(segment_lengths.tobytes())
+                
+            deleted = np.zeros(0, dtype=np.uint32)
+            if manifest['deleted']:
+                deleted = np.fromfile(os.path.join(self.path, f"deleted-{manifest['generation']}.bin"),
+                                      dtype=np.uint32, count=manifest['deleted'])
+                                      
+            with self._lock:
+                self._reset()
+                self._postings = postings
+                self._documents = documents
+                self._lengths = lengths
+                self._alive = array('B', [1]) * len(documents)
+                for number in deleted:
+                    self._alive[number] = 0
+                for number, document in enumerate(documents):
+                    if self._alive[number]:
+                        self._by_source.setdefault(document['source'], []).append(number)
+                        self._live += 1
+                        self._total_length += lengths[number]
+                self._saved = len(documents)
+                self._rewrite = False
+                self._generation = manifest['generation']
+                self._segments = manifest['segments']
+                self._logged = manifest['deleted']
+            logger.info(f"Loaded sparse index with {self._live} documents from {self.path}")
+            
+        except Exception as e:
+            logger.error(f"Failed to load sparse index from {self.path}: {str(e)}")
+            with self._lock:
+                self._reset()
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Dict, Any, Iterable, Iterator, Tuple
 from src.config import CHUNK_SIZE, CHUNK_OVERLAP
 
 def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List[str]:
@@ -17,6 +17,24 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHU
     if len(text) <= chunk_size:
         return [text]
     
+    return [text[start:end] for start, end in _chunk_spans(text, chunk_size, chunk_overlap)]
+
+
+def _chunk_spans(text: str, chunk_size: int, chunk_overlap: int,
+                 continuation: bool = False) -> List[Tuple[int, int]]:
+    """
+    Compute the (start, end) offsets of the chunks of text.
+    
+    Args:
+        text: Text to chunk
+        chunk_size: Maximum size of each chunk
+        chunk_overlap: Number of characters to overlap between chunks
+        continuation: Whether text continues earlier text, in which case the
+            first chunk also looks for a good breaking point
+            
+    Returns:
+        List of (start, end) offsets
+    """
     chunks = []
     start = 0
     
@@ -27,7 +45,7 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHU
         # If we're not at the beginning of the text,
         # and not at the end of the text,
         # try to find a good breaking point
-        if start > 0 and end < len(text):
+        if (start > 0 or continuation) and end < len(text):
             # Try to break at paragraph
             paragraph_break = text.rfind('\n\n', start, end)
             if paragraph_break != -1 and paragraph_break > start + chunk_size // 2:
@@ -49,7 +67,12 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHU
                             end = space_break + 1  # Include the space
         
         # Add the chunk to our list
-        chunks.append(text[start:end])
+        chunks.append((start, end))
+        
+        # Stop once the end of the text is covered, instead of emitting
+        # a trailing chunk that only repeats the overlap
+        if end >= len(text):
+            break
         
         # Move start position for next chunk, accounting for overlap
         start = end - chunk_overlap
@@ -57,4 +80,112 @@ def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHU
         if start >= end:
             start = end
     
-    return chunks
\ No newline at end of file
+    return chunks
+
+
+def stream_chunks(pieces: Iterable[str], chunk_size: int = CHUNK_SIZE,
+                  chunk_overlap: int = CHUNK_OVERLAP) -> Iterator[str]:
+    """
+    Chunk a stream of text pieces without holding the whole text in memory.
+    
+    Produces the same kind of chunks as chunk_text on the concatenated text,
+    except that break points are searched within a window of a few chunks.
+    
+    Args:
+        pieces: Iterable of text pieces, e.g. blocks read from a file
+        chunk_size: Maximum size of each chunk
+        chunk_overlap: Number of characters to overlap between chunks
+        
+    Returns:
+        Iterator of text chunks
+    """
+    window = 4 * chunk_size
+    parts = []
+    size = 0
+    continuation = False
+    
+    for piece in pieces:
+        parts.append(piece)
+        size += len(piece)
+        if size < window:
+            continue
+        
+        # Emit every complete chunk and keep the last one as the start of the next window
+        buffer = "".join(parts)
+        spans = _chunk_spans(buffer, chunk_size, chunk_overlap, continuation)
+        for start, end in spans[:-1]:
+            yield buffer[start:end]
+        parts = [buffer[spans[-1][0]:]]
+        size = len(parts[0])
+        continuation = True
+    
+    buffer = "".join(parts)
+    if not buffer:
+        return
+    if len(buffer) <= chunk_size:
+        yield buffer
+        return
+    for start, end in _chunk_spans(buffer, chunk_size, chunk_overlap, continuation):
+        yield buffer[start:end]
+
+
+def chunk_records(records: Iterable[Tuple[str, str]], chunk_size: int = CHUNK_SIZE,
+                  header: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Group serialized records into chunks without splitting records between chunks.
+    
+    Records are consumed lazily, so only the chunk being built is held in memory.
+    A record that does not fit in a chunk on its own is split with chunk_text.
+    
+    Args:
+        records: Iterable of (key, text) pairs, e.g. a JSON path and the serialized record
+        chunk_size: Maximum size of each chunk
+        header: Text repeated at the top of every chunk, e.g. a CSV header row
+        
+    Returns:
+        Iterator of dicts with 'content', 'first_key', 'last_key' and 'record_count'
+    """
+    prefix = header + "\n" if header else ""
+    budget = max(chunk_size - len(prefix), 1)
+    
+    parts = []
+    size = 0
+    first_key = last_key = None
+    
+    for key, text in records:
+        # Flush the current group if this record does not fit
+        if parts and size + 1 + len(text) > budget:
+            yield {
+                'content': prefix + "\n".join(parts),
+                'first_key': first_key,
+                'last_key': last_key,
+                'record_count': len(parts)
+            }
+            parts = []
+            size = 0
+        
+        if len(text) > budget:
+            for piece in chunk_text(text, budget, min(CHUNK_OVERLAP, budget // 2)):
+                yield {
+                    'content': prefix + piece,
+                    'first_key': key,
+                    'last_key': key,
+                    'record_count': 1
+                }
+            continue
+        
+        if not parts:
+            first_key = key
+            size = len(text)
+        else:
+            size += 1 + len(text)
+        parts.append(text)
+        last_key = key
+    
+    if parts:
+        yield {
+            'content': prefix + "\n".join(parts),
+            'first_key': first_key,
+            'last_key': last_key,
+            'record_count': len(parts)
+        }
@@ -0,0 +1,51 @@
+import time
+from typing import Optional
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage cannot finish within the time budget of its query."""
+
+
+class Deadline:
+    """
+    Time budget of one query, passed down through its stages.
+    
+    Stages bound their waits by remaining() and switch to cheaper variants
+    of their work when little time is left. The clock is monotonic, so
+    changes to the system time do not move the deadline.
+    """
+    
+    def __init__(self, seconds: float):
+        """
+        Start the budget now.
+        
+        Args:
+            seconds: Time allowed from now
+        """
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        
+    def remaining(self) -> float:
+        """Return the seconds left, 0 once the deadline has passed."""
+        return max(0.0, self.expires_at - time.monotonic())
+        
+    def expired(self) -> bool:
+        """Return True once the deadline has passed."""
+        return time.monotonic() >= self.expires_at
+        
+    def reserve(self, seconds: float) -> "Deadline":
+        """
+        Derive the deadline of an earlier stage, keeping time for the stages after it.
+        
+        Args:
+            seconds: Time to leave for the later stages
+            
+        Returns:
+            A deadline that passes `seconds` before this one
+        """
+        return Deadline(self.expires_at - seconds - time.monotonic())
+        
+    @staticmethod
+    def time_left(deadline: Optional["Deadline"]) -> Optional[float]:
+        """Return the seconds left of an optional deadline, None meaning no limit."""
+        return None if deadline is None else deadline.remaining()
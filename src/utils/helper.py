@@ -39,6 +39,18 @@ def get_file_extension(file_path: str) -> str:
     _, ext = os.path.splitext(file_path)
     return ext.lower()[1:] if ext else ""
 
+def get_file_name(source: str) -> str:
+    """
+    Get the file name of a path or an archive member source ("archive.zip!dir/file.txt").
+    
+    Args:
+        source: Path to the file or archive member source
+        
+    Returns:
+        File name without directories or enclosing archives
+    """
+    return os.path.basename(source.rsplit('!', 1)[-1])
+
 def is_binary_file(file_path: str) -> bool:
     """
     Check if a file is binary rather than text.
@@ -57,6 +69,19 @@ def is_binary_file(file_path: str) -> bool:
         logger.error(f"Error checking if {file_path} is binary: {str(e)}")
         return False
 
+def is_archive_file(file_path: str) -> bool:
+    """
+    Check if a file is an archive that can be streamed member by member.
+    
+    Args:
+        file_path: Path to the file (or archive member name)
+        
+    Returns:
+        True for zip and (optionally compressed) tar archives
+    """
+    name = file_path.lower()
+    return name.endswith(('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz'))
+
 def get_supported_extensions() -> Dict[str, List[str]]:
     """
     Get a dictionary of supported file extensions per processor.
@@ -65,8 +90,9 @@ def get_supported_extensions() -> Dict[str, List[str]]:
         Dictionary mapping processor type to list of supported extensions
     """
     return {
-        'text': ['txt', 'json', 'pdf', 'docx', 'md', 'html', 'csv', 'xml'],
+        'text': ['txt', 'json', 'jsonl', 'ndjson', 'pdf', 'docx', 'md', 'markdown', 'html', 'htm', 'csv', 'xml'],
         'image': ['jpg', 'jpeg', 'png', 'bmp', 'tiff', 'gif'],
         'video': ['mp4', 'avi', 'mov', 'mkv', 'webm', 'flv'],
-        'audio': ['mp3', 'wav', 'ogg', 'flac', 'aac']
+        'audio': ['mp3', 'wav', 'ogg', 'flac', 'aac'],
+        'archive': ['zip', 'tar', 'tgz', 'tbz2', 'txz']
     }
\ No newline at end of file
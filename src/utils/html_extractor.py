@@ -0,0 +1,254 @@
+import importlib.util
+from html.parser import HTMLParser
+from typing import List, Dict, Optional, Callable, Iterable
+from src.utils.logger import setup_logger
+from src.config import HTML_EXTRACTOR_BACKEND
+
+logger = setup_logger(__name__)
+
+# Elements whose content is never part of the extracted text; <template>
+# content is inert and never rendered
+SKIP_TAGS = {'script', 'style', 'nav', 'footer', 'iframe', 'template'}
+
+# Content regions, in order of preference
+CONTENT_TAGS = ('main', 'article', 'body')
+
+# Backends tried by "auto", fastest first; html.parser is always available
+BACKEND_PREFERENCE = ('selectolax', 'lxml', 'html.parser')
+
+# Module each optional backend needs
+BACKEND_MODULES = {'selectolax': 'selectolax.lexbor', 'lxml': 'lxml.html'}
+
+
+class HTMLTextExtractor(HTMLParser):
+    """
+    Single-pass HTML to text converter built on the standard library parser.
+    
+    Boilerplate elements are skipped while parsing, and only the text of the
+    best content region seen so far (the first <main>, else <article>, else
+    <body>) is kept, so the document never has to be turned into a tree.
+    Markup can be fed in blocks; text split across blocks is joined before it
+    is broken into lines. Once a <main> element opens its lines are final and
+    can be taken with drain() while parsing continues. The href of every <a>
+    element is collected in links, including those in navigation that is left
+    out of the text.
+    """
+    
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.lines = []
+        self.links = []
+        self._best = None
+        self._region_depth = {tag: 0 for tag in CONTENT_TAGS}
+        self._region_seen = set()
+        self._skip_depth = 0
+        self._title_parts = None
+        self._text = []
+        
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag == 'a':
+            href = dict(attrs).get('href')
+            if href:
+                self.links.append(href.strip())
+                
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        elif self._skip_depth:
+            return
+        elif tag in self._region_depth:
+            # Only the first element of each kind counts as its region
+            if self._region_depth[tag]:
+                self._region_depth[tag] += 1
+            elif tag not in self._region_seen:
+                self._region_seen.add(tag)
+                self._region_depth[tag] = 1
+                if self._best is None or CONTENT_TAGS.index(tag) < CONTENT_TAGS.index(self._best):
+                    # Text collected so far belongs to a region that can no longer win
+                    self._best = tag
+                    self.lines = []
+        elif tag == 'title' and self.title is None:
+            self._title_parts = []
+            
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in SKIP_TAGS:
+            if self._skip_depth:
+                self._skip_depth -= 1
+        elif self._skip_depth:
+            return
+        elif tag in self._region_depth:
+            if self._region_depth[tag]:
+                self._region_depth[tag] -= 1
+        elif tag == 'title' and self._title_parts is not None:
+            self.title = "".join(self._title_parts).strip()
+            self._title_parts = None
+            
+    def handle_data(self, data):
+        # The parser may split a run of text at block boundaries; it is only
+        # broken into lines once the next tag (or the end) is reached
+        if not self._skip_depth:
+            self._text.append(data)
+            
+    def handle_comment(self, data):
+        self._flush()
+        
+    def handle_pi(self, data):
+        self._flush()
+        
+    def close(self):
+        super().close()
+        self._flush()
+        
+    def _flush(self):
+        """Turn the buffered text run into lines, keeping them only inside the best region."""
+        if not self._text:
+            return
+        data = "".join(self._text)
+        self._text = []
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        if self._best is None or self._region_depth[self._best]:
+            self.lines.extend(_split_lines([data]))
+            
+    def drain(self) -> List[str]:
+        """Remove and return the lines known to be final, which is only the case inside <main>."""
+        if self._best != CONTENT_TAGS[0]:
+            return []
+        lines, self.lines = self.lines, []
+        return lines
+        
+    def content_lines(self) -> List[str]:
+        """Return the remaining lines of the preferred content region, or of the whole document."""
+        return self.lines
+
+
+def _split_lines(texts: Iterable[str]) -> List[str]:
+    """Split text nodes into stripped, non-empty lines."""
+    return [line.strip() for text in texts for line in text.split('\n') if line.strip()]
+
+
+def _extract_html_parser(html: str) -> Dict[str, Optional[str]]:
+    """Extract with the standard library parser."""
+    extractor = HTMLTextExtractor()
+    extractor.feed(html)
+    extractor.close()
+    return {
+        'title': extractor.title,
+        'text': "\n".join(extractor.content_lines()),
+        'links': extractor.links
+    }
+
+
+def _extract_lxml(html: str) -> Dict[str, Optional[str]]:
+    """Extract with lxml; the tree is built and pruned in C."""
+    import lxml.html
+    from lxml import etree
+    
+    if not html.strip():
+        return {'title': None, 'text': "", 'links': []}
+    try:
+        root = lxml.html.document_fromstring(html)
+    except ValueError:
+        # Strings with an XML encoding declaration must be passed as bytes
+        root = lxml.html.document_fromstring(html.encode('utf-8'))
+        
+    title = root.find('.//title')
+    links = [a.get('href').strip() for a in root.iter('a') if a.get('href')]
+    # Removing a node merges its tail into the preceding text, so the tail
+    # gets a line break first; the other backends split text at these nodes
+    removed = (*SKIP_TAGS, etree.Comment, etree.ProcessingInstruction)
+    for node in root.iter(*removed):
+        node.tail = "\n" + (node.tail or "")
+    etree.strip_elements(root, *removed, with_tail=False)
+    
+    region = next((node for node in (root.find(f'.//{tag}') for tag in CONTENT_TAGS)
+                   if node is not None), root)
+    return {
+        'title': title.text_content().strip() if title is not None else None,
+        'text': "\n".join(_split_lines(region.itertext())),
+        'links': links
+    }
+
+
+def _extract_selectolax(html: str) -> Dict[str, Optional[str]]:
+    """Extract with selectolax's lexbor engine."""
+    from selectolax.lexbor import LexborHTMLParser
+    
+    tree = LexborHTMLParser(html)
+    title = tree.css_first('title')
+    links = [a.attributes['href'].strip() for a in tree.css('a[href]') if a.attributes.get('href')]
+    tree.strip_tags(list(SKIP_TAGS))
+    
+    region = next((node for node in (tree.css_first(tag) for tag in CONTENT_TAGS)
+                   if node is not None), tree.root)
+    text = region.text(deep=True, separator='\n') if region is not None else ""
+    return {
+        'title': title.text().strip() if title is not None else None,
+        'text': "\n".join(_split_lines([text])),
+        'links': links
+    }
+
+
+_BACKENDS = {
+    'html.parser': _extract_html_parser,
+    'lxml': _extract_lxml,
+    'selectolax': _extract_selectolax
+}
+
+
+def _installed(module: str) -> bool:
+    """Check whether a module can be imported without importing it."""
+    try:
+        return importlib.util.find_spec(module) is not None
+    except ModuleNotFoundError:
+        return False
+
+
+def available_backends() -> List[str]:
+    """Return the installed extraction backends, fastest first."""
+    return [
+        name for name in BACKEND_PREFERENCE
+        if name not in BACKEND_MODULES or _installed(BACKEND_MODULES[name])
+    ]
+
+
+def get_extractor(backend: str = HTML_EXTRACTOR_BACKEND) -> Callable[[str], Dict[str, Optional[str]]]:
+    """
+    Return the extraction function of a backend.
+    
+    Args:
+        backend: "selectolax", "lxml", "html.parser", or "auto" for the fastest installed one
+        
+    Returns:
+        Callable taking HTML markup and returning the dict described in extract_html_text
+    """
+    available = available_backends()
+    if backend == 'auto':
+        return _BACKENDS[available[0]]
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown HTML extractor backend: {backend}")
+    if backend not in available:
+        logger.warning(f"HTML extractor backend {backend} is not installed, using html.parser")
+        return _extract_html_parser
+    return _BACKENDS[backend]
+
+
+def extract_html_text(html: str, backend: str = HTML_EXTRACTOR_BACKEND) -> Dict[str, Optional[str]]:
+    """
+    Extract the title and main text content of an HTML document.
+    
+    Boilerplate (script, style, nav, footer, iframe, template) is dropped and
+    the text of the first <main>, <article> or <body> is returned. All backends
+    split text into the same stripped, non-empty lines.
+    
+    Args:
+        html: HTML markup
+        backend: Extraction backend (see get_extractor)
+        
+    Returns:
+        Dict with 'title' (None if the page has no <title>), 'text' and
+        'links' (the raw href values of all links)
+    """
+    return get_extractor(backend)(html)
@@ -0,0 +1,130 @@
+import json
+from typing import Any, Iterator, TextIO, Tuple
+
+_WHITESPACE = ' \t\n\r'
+_decoder = json.JSONDecoder()
+
+
+class _StreamReader:
+    """
+    Incrementally decodes JSON values from a text stream.
+    
+    Only the value currently being decoded is held in memory, plus what was
+    read ahead of it: at most one block, or as much again as the value for
+    values spanning many blocks.
+    """
+    
+    def __init__(self, f: TextIO, block_size: int = 65536):
+        self.f = f
+        self.block_size = block_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        
+    def _fill(self, size: int = 0) -> bool:
+        """Read at least one block, and at least size characters, into the buffer; False at end of stream."""
+        if self.eof:
+            return False
+        blocks = []
+        read = 0
+        while not blocks or read < size:
+            block = self.f.read(self.block_size)
+            if not block:
+                self.eof = True
+                break
+            blocks.append(block)
+            read += len(block)
+        if not blocks:
+            return False
+        # Drop the consumed prefix so the buffer does not grow with the file
+        self.buffer = self.buffer[self.pos:] + "".join(blocks)
+        self.pos = 0
+        return True
+        
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it ('' at EOF)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+                
+    def expect(self, chars: str) -> str:
+        """Consume the next non-whitespace character, which must be one of chars."""
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} but found {char!r}")
+        self.pos += 1
+        return char
+        
+    def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Retried once the pending data has doubled, so a large value is not decoded again per block
+                if not self._fill(len(self.buffer) - self.pos):
+                    raise
+                continue
+            # A number ending exactly at the buffer edge may continue in the next block
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def _iter_array(reader: _StreamReader, path: str) -> Iterator[Tuple[str, Any]]:
+    """Yield the items of the array whose '[' is the next character."""
+    reader.expect('[')
+    if reader.peek() == ']':
+        reader.pos += 1
+        return
+    index = 0
+    while True:
+        yield f"{path}[{index}]", reader.value()
+        index += 1
+        if reader.expect(',]') == ']':
+            return
+
+
+def iter_json_records(f: TextIO, block_size: int = 65536) -> Iterator[Tuple[str, Any]]:
+    """
+    Stream the records of a JSON document as (json_path, value) pairs.
+    
+    A top-level array yields its items ("$[0]", "$[1]", ...). A top-level object
+    yields each member as a single-key object so the key stays with its value,
+    except that members holding arrays are streamed item by item ("$.rows[0]", ...).
+    Any other document yields itself as "$".
+    
+    Args:
+        f: Text stream positioned at the start of the document
+        block_size: Number of characters read per block
+        
+    Returns:
+        Iterator over (json_path, value) tuples
+    """
+    reader = _StreamReader(f, block_size)
+    first = reader.peek()
+    
+    if first == '[':
+        yield from _iter_array(reader, "$")
+    elif first == '{':
+        reader.expect('{')
+        if reader.peek() == '}':
+            return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            path = f"$.{key}" if key.isidentifier() else f"$[{json.dumps(key)}]"
+            if reader.peek() == '[':
+                yield from _iter_array(reader, path)
+            else:
+                yield path, {key: reader.value()}
+            if reader.expect(',}') == '}':
+                return
+    elif first:
+        yield "$", reader.value()
@@ -0,0 +1,89 @@
+import threading
+from collections import deque
+from typing import Dict, Any, Optional
+from src.config import LLM_LATENCY_WINDOW
+
+
+class LatencyTracker:
+    """
+    Rolling latency percentiles for a set of named operations.
+    
+    Keeps the last `window` successful latencies per name, so percentiles
+    follow the current behaviour of an endpoint instead of its whole history.
+    Failures are counted separately and left out of the percentiles, as a fast
+    error would otherwise pull them down. Safe to use from several threads.
+    """
+    
+    def __init__(self, window: int = LLM_LATENCY_WINDOW):
+        """
+        Initialize the tracker.
+        
+        Args:
+            window: Number of recent samples kept per name
+        """
+        self.window = max(1, window)
+        self._samples = {}
+        self._successes = {}
+        self._failures = {}
+        self._lock = threading.Lock()
+        
+    def record(self, name: str, seconds: float, success: bool = True):
+        """
+        Record one call.
+        
+        Args:
+            name: Operation name, e.g. the model ID
+            seconds: Duration of the call
+            success: Whether the call produced a usable result
+        """
+        with self._lock:
+            if success:
+                self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+                self._successes[name] = self._successes.get(name, 0) + 1
+            else:
+                self._failures[name] = self._failures.get(name, 0) + 1
+                
+    def count(self, name: str) -> int:
+        """Return the number of latency samples currently held for a name."""
+        with self._lock:
+            return len(self._samples.get(name, ()))
+            
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """
+        Return a latency percentile for a name.
+        
+        Args:
+            name: Operation name
+            q: Percentile as a fraction, e.g. 0.95
+            
+        Returns:
+            Latency in seconds (nearest-rank), or None if nothing was recorded
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, max(0, int(q * len(samples) + 0.5) - 1))
+        return samples[index]
+        
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Return per-name statistics.
+        
+        Returns:
+            Dict mapping each name to 'successes', 'failures', 'p50', 'p95'
+            and 'p99' (percentiles are None until a call has succeeded)
+        """
+        with self._lock:
+            names = set(self._samples) | set(self._failures)
+            counts = {name: (self._successes.get(name, 0), self._failures.get(name, 0)) for name in names}
+        return {
+            name: {
+                'successes': successes,
+                'failures': failures,
+                'p50': self.percentile(name, 0.5),
+                'p95': self.percentile(name, 0.95),
+                'p99': self.percentile(name, 0.99)
+            }
+            for name, (successes, failures) in counts.items()
+        }
@@ -0,0 +1,194 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Sequence, Iterator, AsyncIterator, Callable, Optional
+from src.config import (
+    SCHEDULER_CAPACITY, SCHEDULER_QUERY_CONCURRENCY, SCHEDULER_QUERY_QUEUE,
+    SCHEDULER_INGEST_CONCURRENCY, SCHEDULER_INGEST_QUEUE
+)
+
+# Priority classes, highest first
+QUERY = "query"
+INGEST = "ingest"
+
+
+class BusyError(Exception):
+    """Raised when a request is shed because the queue of its priority class is full."""
+
+
+class _Waiter:
+    """A queued request, woken by notify() once it holds a slot."""
+    
+    def __init__(self, notify: Callable[[], None]):
+        self.notify = notify
+        self.granted = False
+        self.queued_at = time.perf_counter()
+
+
+class PriorityScheduler:
+    """
+    Admits work of several priority classes to shared resources.
+    
+    At most `capacity` requests hold a slot at a time, and each class at
+    most its own limit, so a low-priority class with a limit below the
+    capacity always leaves slots free for the others. A freed slot goes to
+    the oldest waiter of the highest-priority class below its limit. Each
+    class queues at most its queue limit of waiters; beyond that requests
+    are shed with BusyError instead of waiting. Threads (slot) and
+    coroutines (aslot) share the same slots and queues.
+    """
+    
+    def __init__(self, capacity: int = SCHEDULER_CAPACITY, limits: Optional[Dict[str, int]] = None,
+                 queue_limits: Optional[Dict[str, int]] = None, priorities: Sequence[str] = (QUERY, INGEST)):
+        """
+        Initialize the scheduler.
+        
+        Args:
+            capacity: Requests holding a slot at a time, over all classes
+            limits: Requests of a class holding a slot at a time
+            queue_limits: Waiting requests of a class (0 = unbounded)
+            priorities: Class names, highest priority first
+        """
+        self.capacity = max(1, capacity)
+        self.priorities = list(priorities)
+        limits = limits or {QUERY: SCHEDULER_QUERY_CONCURRENCY, INGEST: SCHEDULER_INGEST_CONCURRENCY}
+        queue_limits = queue_limits or {QUERY: SCHEDULER_QUERY_QUEUE, INGEST: SCHEDULER_INGEST_QUEUE}
+        self.limits = {name: max(1, limits.get(name, self.capacity)) for name in self.priorities}
+        self.queue_limits = {name: queue_limits.get(name, 0) for name in self.priorities}
+        
+        self._lock = threading.Lock()
+        self._queues = {name: deque() for name in self.priorities}
+        self._running = {name: 0 for name in self.priorities}
+        self._admitted = {name: 0 for name in self.priorities}
+        self._shed = {name: 0 for name in self.priorities}
+        self._wait_seconds = {name: 0.0 for name in self.priorities}
+        
+    @contextmanager
+    def slot(self, name: str) -> Iterator[None]:
+        """
+        Hold a slot of class `name`, blocking the thread while queued.
+        
+        Args:
+            name: Priority class of the request
+            
+        Raises:
+            BusyError: If the queue of the class is full
+        """
+        self.acquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+            
+    @asynccontextmanager
+    async def aslot(self, name: str) -> AsyncIterator[None]:
+        """
+        Async version of slot(), waiting without blocking the event loop.
+        
+        Args:
+            name: Priority class of the request
+            
+        Raises:
+            BusyError: If the queue of the class is full
+        """
+        await self.aacquire(name)
+        try:
+            yield
+        finally:
+            self.release(name)
+            
+    def acquire(self, name: str):
+        """Take a slot of class `name`, waiting in its queue if none is free."""
+        event = threading.Event()
+        with self._lock:
+            if self._admit(name):
+                return
+            self._enqueue(name, _Waiter(event.set))
+        event.wait()
+        
+    async def aacquire(self, name: str):
+        """Async version of acquire()."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        
+        def wake():
+            if not future.done():
+                future.set_result(None)
+                
+        with self._lock:
+            if self._admit(name):
+                return
+            waiter = self._enqueue(name, _Waiter(lambda: loop.call_soon_threadsafe(wake)))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._queues[name].remove(waiter)
+            # Granted while being cancelled: pass the slot on
+            if granted:
+                self.release(name)
+            raise
+            
+    def release(self, name: str):
+        """Give back a slot of class `name` and hand it to the next waiter."""
+        with self._lock:
+            self._running[name] -= 1
+            self._dispatch()
+            
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return scheduling statistics per class.
+        
+        Returns:
+            Dict of class name to its 'running' and 'queued' requests, the
+            'admitted' and 'shed' counts and the 'mean_wait_ms' in queue
+        """
+        with self._lock:
+            return {
+                name: {
+                    'running': self._running[name],
+                    'queued': len(self._queues[name]),
+                    'admitted': self._admitted[name],
+                    'shed': self._shed[name],
+                    'mean_wait_ms': 1000 * self._wait_seconds[name] / max(1, self._admitted[name])
+                }
+                for name in self.priorities
+            }
+            
+    def _admit(self, name: str) -> bool:
+        """Take a free slot without queueing, unless earlier requests of the class are waiting."""
+        if self._queues[name] or not self._has_slot(name):
+            return False
+        self._running[name] += 1
+        self._admitted[name] += 1
+        return True
+        
+    def _enqueue(self, name: str, waiter: _Waiter) -> _Waiter:
+        """Queue a waiter, or shed it if the queue of its class is full."""
+        limit = self.queue_limits[name]
+        if limit > 0 and len(self._queues[name]) >= limit:
+            self._shed[name] += 1
+            raise BusyError(f"Too many {name} requests waiting ({limit}), try again later")
+        self._queues[name].append(waiter)
+        return waiter
+        
+    def _has_slot(self, name: str) -> bool:
+        """Tell whether a request of class `name` may take a slot now."""
+        return sum(self._running.values()) < self.capacity and self._running[name] < self.limits[name]
+        
+    def _dispatch(self):
+        """Grant free slots to waiters, highest priority class first."""
+        while True:
+            name = next((name for name in self.priorities if self._queues[name] and self._has_slot(name)), None)
+            if name is None:
+                return
+            waiter = self._queues[name].popleft()
+            waiter.granted = True
+            self._running[name] += 1
+            self._admitted[name] += 1
+            self._wait_seconds[name] += time.perf_counter() - waiter.queued_at
+            waiter.notify()
@@ -0,0 +1,118 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Any, Hashable, Callable, Awaitable, Tuple
+
+
+class SingleFlight:
+    """
+    Shares one in-flight computation among concurrent callers with the same key.
+    
+    The first caller of a key runs the computation; callers arriving before
+    it finishes wait for it and receive the same result, or the same
+    exception. The key is forgotten once the computation finishes, so this
+    only deduplicates concurrent work and is not a cache. Threads (do) and
+    coroutines (ado) share the same flights, so a coroutine can wait for a
+    computation started by a thread and the other way round.
+    """
+    
+    def __init__(self):
+        """Initialize with no computations in flight."""
+        self._flights: Dict[Hashable, Future] = {}
+        self._tasks = set()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._coalesced = 0
+        
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        """
+        Run fn in this thread, or wait for the run already in flight for key.
+        
+        Args:
+            key: Identifies equivalent computations
+            fn: Computes the result
+            
+        Returns:
+            The result of the shared computation
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+            
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, future, error=e)
+            raise
+        self._finish(key, future, result)
+        return result
+        
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Async version of do(), for coroutine functions.
+        
+        The computation runs as its own task, so a caller that is cancelled
+        stops waiting without cancelling it for the others.
+        
+        Args:
+            key: Identifies equivalent computations
+            fn: Returns an awaitable computing the result
+            
+        Returns:
+            The result of the shared computation
+        """
+        future, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            self._tasks.add(task)
+            task.add_done_callback(lambda done: self._settle(key, future, done))
+        return await asyncio.wrap_future(future)
+        
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return coalescing statistics.
+        
+        Returns:
+            Dict with the computations 'in_flight' and 'started', and the
+            number of requests 'coalesced' into one already in flight
+        """
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'started': self._started,
+                'coalesced': self._coalesced
+            }
+            
+    def _join(self, key: Hashable) -> Tuple[Future, bool]:
+        """Return the future of the flight for key, and whether the caller started it."""
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self._coalesced += 1
+                return future, False
+                
+            future = Future()
+            # A running future cannot be cancelled, so one waiter giving up leaves it to the others
+            future.set_running_or_notify_cancel()
+            self._flights[key] = future
+            self._started += 1
+            return future, True
+            
+    def _settle(self, key: Hashable, future: Future, task: asyncio.Future):
+        """Pass the outcome of the task of an async flight to its waiters."""
+        self._tasks.discard(task)
+        if task.cancelled():
+            self._finish(key, future, error=asyncio.CancelledError())
+        elif task.exception() is not None:
+            self._finish(key, future, error=task.exception())
+        else:
+            self._finish(key, future, task.result())
+            
+    def _finish(self, key: Hashable, future: Future, result: Any = None, error: BaseException = None):
+        """End the flight for key, so later callers start a new one, and wake its waiters."""
+        with self._lock:
+            self._flights.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
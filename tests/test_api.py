@@ -0,0 +1,68 @@
+import json
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+from fastapi.testclient import TestClient
+from src.api.app import create_app
+from src.utils.scheduler import BusyError
+
+@pytest.fixture
+def system():
+    system = MagicMock()
+    system.aquery = AsyncMock(return_value={
+        'query': 'q', 'response': 'answer', 'documents': [{'source': 'a.txt', 'score': 0.9}], 'degradations': []
+    })
+
+    async def tokens():
+        for token in ["Hello", " world"]:
+            yield token
+
+    system.aquery_stream = AsyncMock(return_value={'query': 'q', 'documents': [], 'response_stream': tokens()})
+    system.ingest_url.return_value = {'processed_urls': 1}
+    system.health.return_value = {'status': 'ok', 'breakers': {}}
+    return system
+
+@pytest.fixture
+def client(system):
+    with TestClient(create_app(lambda: system)) as client:
+        yield client
+
+def test_startup_warms_system(client, system):
+    system.warm_up.assert_called_once()
+    health = client.get("/health").json()
+    assert health['status'] == 'ok' and health['warm'] is True
+
+def test_query(client, system):
+    response = client.post("/query", json={'query': 'q', 'max_docs': 3})
+    assert response.status_code == 200
+    assert response.json()['response'] == 'answer'
+    assert system.aquery.call_args.args[:2] == ('q', 3)
+
+def test_query_stream_sends_events(client):
+    response = client.post("/query/stream", json={'query': 'q'})
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [block.split("\n") for block in response.text.strip().split("\n\n")]
+    assert [lines[0] for lines in events] == ['event: documents', 'event: token', 'event: token', 'event: done']
+    assert json.loads(events[1][1][len('data: '):]) == {'token': 'Hello'}
+
+def test_ingest_validates_request(client, system):
+    assert client.post("/ingest", json={}).status_code == 400
+    assert client.post("/ingest", json={'url': 'https://example.com', 'urls': ['https://example.com']}).status_code == 400
+    assert client.post("/ingest", json={'path': '/does/not/exist'}).status_code == 404
+    assert client.post("/ingest", json={'url': 'https://example.com'}).json() == {'processed_urls': 1}
+
+def test_busy_query_gets_503(client, system):
+    system.aquery.side_effect = BusyError("Too many query requests waiting (64), try again later")
+    response = client.post("/query", json={'query': 'q'})
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+
+def test_jobs(client, system, tmp_path):
+    system.submit_ingest.return_value = 7
+    system.job_status.side_effect = lambda job_id: {'id': 7, 'status': 'running'} if job_id == 7 else None
+    system.cancel_job.return_value = True
+    assert client.post("/jobs", json={'path': '/does/not/exist'}).status_code == 404
+    assert client.post("/jobs", json={'path': str(tmp_path)}).json() == {'job_id': 7}
+    assert client.get("/jobs/7").json()['status'] == 'running'
+    assert client.get("/jobs/8").status_code == 404
+    assert client.delete("/jobs/7").json() == {'job_id': 7, 'cancelled': True}
+    system.start_jobs.assert_called_once()
@@ -1,9 +1,52 @@
+import json
+import time
+import asyncio
 import pytest
+import threading
 import responses
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from unittest.mock import patch, MagicMock
+from src.generation.hf_client import HFInferenceClient, GenerationError, iter_sse_events
 from src.generation.llama_model import LlamaModel
 from src.generation.deepseek_model import DeepseekModel
 from src.generation.llm_handler import LLMHandler
+from src.generation.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+from src.generation.response_cache import ResponseCache
+from src.generation.context_packer import pack_context, estimate_tokens
+from src.utils.chunker import chunk_text
+from src.utils.metrics import LatencyTracker
+from src.utils.deadline import Deadline, DeadlineExceeded
+
+class FakeModel:
+    """Model stand-in answering after a fixed delay."""
+    
+    def __init__(self, model_name, response, delay=0.0, error=None, parameters=None):
+        self.model_name = model_name
+        self.response = response
+        self.delay = delay
+        self.error = error
+        self.parameters = parameters or {"do_sample": False}
+        self.calls = 0
+        self.cancelled = False
+        
+    def build_payload(self, query, documents):
+        return {"inputs": query, "parameters": self.parameters}
+        
+    def generate(self, query, documents):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.response
+        
+    async def agenerate(self, query, documents):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.response
 
 @pytest.fixture
 def llama_model():
@@ -22,6 +65,81 @@ def deepseek_model():
         )
         yield model
 
+@pytest.fixture
+def stub_server():
+    """
+    Local stand-in for the Inference API.
+    
+    Replies are taken from server.replies as (status, headers, body, delay)
+    tuples; the client port of every request is recorded in server.ports.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            self.server.ports.append(self.client_address[1])
+            status, headers, body, delay = self.server.replies.pop(0)
+            time.sleep(delay)
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            
+        def log_message(self, *args):
+            pass
+            
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler, bind_and_activate=False)
+    # Room for many simultaneous connections from the async tests
+    server.request_queue_size = 256
+    server.server_bind()
+    server.server_activate()
+    server.replies = []
+    server.ports = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+@pytest.fixture
+def sse_server():
+    """
+    Local stand-in for a streaming endpoint.
+    
+    server.events holds (payload, delay) pairs sent as server-sent events
+    using chunked transfer encoding.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        
+        def do_POST(self):
+            self.server.requests.append(json.loads(self.rfile.read(int(self.headers['Content-Length']))))
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for payload, delay in self.server.events:
+                time.sleep(delay)
+                data = f"data: {json.dumps(payload)}\n\n".encode()
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+            
+        def log_message(self, *args):
+            pass
+            
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.events = []
+    server.requests = []
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
 @pytest.fixture
 def llm_handler(llama_model, deepseek_model):
     handler = LLMHandler(
@@ -69,4 +187,298 @@ def test_llm_handler_all_models_fail(llm_handler):
         with patch.object(llm_handler.backup_model, 'generate', side_effect=Exception("Backup model failed")):
             with pytest.raises(Exception) as excinfo:
                 llm_handler.generate("Test prompt")
-            assert "All LLM models failed" in str(excinfo.value)
\ No newline at end of file
+            assert "All LLM models failed" in str(excinfo.value)
+
+def test_client_reuses_connection(stub_server):
+    stub_server.replies = [(200, {}, [{"generated_text": "one"}], 0), (200, {}, [{"generated_text": "two"}], 0)]
+    client = HFInferenceClient("test-model", api_base=stub_server.url)
+    
+    assert client.post({"inputs": "a"}) == [{"generated_text": "one"}]
+    assert client.post({"inputs": "b"}) == [{"generated_text": "two"}]
+    assert len(set(stub_server.ports)) == 1
+
+def test_client_retries_model_loading(stub_server):
+    stub_server.replies = [
+        (503, {}, {"error": "Model is loading", "estimated_time": 0.1}, 0),
+        (429, {"Retry-After": "0"}, {"error": "Rate limited"}, 0),
+        (200, {}, [{"generated_text": "ready"}], 0)
+    ]
+    client = HFInferenceClient("test-model", api_base=stub_server.url, max_retries=3)
+    
+    assert client.post({"inputs": "a"}) == [{"generated_text": "ready"}]
+    assert len(stub_server.ports) == 3
+
+def test_client_gives_up_after_retries(stub_server):
+    stub_server.replies = [(503, {"Retry-After": "0"}, {"error": "Overloaded"}, 0)] * 3
+    client = HFInferenceClient("test-model", api_base=stub_server.url, max_retries=2)
+    
+    with pytest.raises(GenerationError) as excinfo:
+        client.post({"inputs": "a"})
+    assert excinfo.value.status_code == 503
+
+def test_client_read_timeout(stub_server):
+    stub_server.replies = [(200, {}, [{"generated_text": "late"}], 1.0)]
+    client = HFInferenceClient("test-model", api_base=stub_server.url, read_timeout=0.2)
+    
+    start = time.perf_counter()
+    with pytest.raises(GenerationError):
+        client.post({"inputs": "a"})
+    assert time.perf_counter() - start < 1.0
+
+def test_iter_sse_events():
+    lines = [": keep-alive", "data: one", "", "event: message", "data: two", "data: lines", ""]
+    assert list(iter_sse_events(lines)) == ["one", "two\nlines"]
+
+def test_stream_yields_tokens_as_they_arrive(sse_server):
+    token = lambda text, special=False: {"token": {"text": text, "special": special}, "generated_text": None}
+    sse_server.events = [(token("Hello"), 0), (token(" world"), 0.5), (token("</s>", True), 0)]
+    model = LlamaModel("test-model", client=HFInferenceClient("test-model", api_base=sse_server.url))
+    handler = LLMHandler(primary_model=model)
+    
+    start = time.perf_counter()
+    stream = handler.generate_stream("Test query", [])
+    assert next(stream) == "Hello"
+    first_token = time.perf_counter() - start
+    assert list(stream) == [" world"]
+    assert first_token < 0.4 < time.perf_counter() - start
+    assert sse_server.requests[0]["stream"] is True
+
+def test_stream_falls_back_before_first_token():
+    primary = MagicMock()
+    primary.generate_stream.side_effect = GenerationError("unavailable", 503)
+    backup = MagicMock()
+    backup.generate_stream.return_value = iter(["Backup", " tokens"])
+    handler = LLMHandler(primary_model=primary, backup_model=backup)
+    
+    assert "".join(handler.generate_stream("Test query", [])) == "Backup tokens"
+
+def test_agenerate_runs_requests_concurrently(stub_server):
+    stub_server.replies = [(200, {}, [{"generated_text": "answer"}], 0.3) for _ in range(50)]
+    model = LlamaModel("test-model", client=HFInferenceClient("test-model", api_base=stub_server.url))
+    handler = LLMHandler(primary_model=model)
+    
+    async def run():
+        return await asyncio.gather(*(handler.agenerate("Test query", []) for _ in range(50)))
+    
+    start = time.perf_counter()
+    answers = asyncio.run(run())
+    assert answers == ["answer"] * 50
+    # Sequential requests would take 15s
+    assert time.perf_counter() - start < 3
+
+def test_latency_tracker_percentiles():
+    tracker = LatencyTracker(window=100)
+    for i in range(1, 101):
+        tracker.record("model", i / 100)
+    tracker.record("model", 5.0, success=False)
+    
+    stats = tracker.summary()["model"]
+    assert (stats["p50"], stats["p95"], stats["p99"]) == (0.5, 0.95, 0.99)
+    assert (stats["successes"], stats["failures"]) == (100, 1)
+
+def test_hedge_starts_backup_when_primary_is_slow():
+    primary = FakeModel("primary", "slow answer", delay=1.0)
+    backup = FakeModel("backup", "fast answer")
+    handler = LLMHandler(primary, backup, hedge_default_delay=0.1, hedge_min_delay=0)
+    
+    start = time.perf_counter()
+    assert handler.generate("Test query", []) == "fast answer"
+    assert time.perf_counter() - start < 0.5
+
+def test_hedge_delay_follows_primary_latency():
+    handler = LLMHandler(FakeModel("primary", "answer"), FakeModel("backup", "answer"),
+                         hedge_min_samples=10, hedge_default_delay=10, hedge_min_delay=0)
+    assert handler.hedge_delay() == 10
+    for _ in range(10):
+        handler.latency.record("primary", 0.2)
+    assert handler.hedge_delay() == 0.2
+
+def test_empty_response_counts_as_failure():
+    handler = LLMHandler(FakeModel("primary", "  "), FakeModel("backup", "backup answer"))
+    
+    assert handler.generate("Test query", []) == "backup answer"
+    assert handler.latency_stats()["primary"]["failures"] == 1
+    assert handler.latency_stats()["backup"]["successes"] == 1
+
+def test_agenerate_hedge_cancels_slower_model():
+    primary = FakeModel("primary", "slow answer", delay=5.0)
+    backup = FakeModel("backup", "fast answer")
+    handler = LLMHandler(primary, backup, hedge_default_delay=0.1, hedge_min_delay=0)
+    
+    async def run():
+        answer = await handler.agenerate("Test query", [])
+        # Let the cancellation reach the primary
+        await asyncio.sleep(0)
+        return answer
+    
+    start = time.perf_counter()
+    assert asyncio.run(run()) == "fast answer"
+    assert time.perf_counter() - start < 1
+    assert primary.cancelled
+
+def test_generate_gives_up_at_deadline():
+    handler = LLMHandler(FakeModel("primary", "late answer", delay=1.0), FakeModel("backup", "late answer", delay=1.0),
+                         hedge_default_delay=0.1, hedge_min_delay=0)
+    
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded):
+        handler.generate("Test query", [], deadline=Deadline(0.3))
+    assert time.perf_counter() - start < 0.6
+    
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(handler.agenerate("Test query", [], deadline=Deadline(0.3)))
+        
+def test_fallback_past_deadline_keeps_backup_trial_slot():
+    primary = FakeModel("primary", "answer", error=GenerationError("unavailable", 503))
+    handler = LLMHandler(primary, FakeModel("backup", "backup answer"), hedge=False)
+    breaker = CircuitBreaker("backup", window=1, min_calls=1, open_seconds=0.01, half_open_calls=1)
+    breaker.record(0.1, success=False)
+    time.sleep(0.02)
+    handler.breakers["backup"] = breaker
+    
+    # The deadline passes once the primary has failed, so the backup is never tried
+    deadline = MagicMock(spec=Deadline)
+    deadline.remaining.return_value = 5.0
+    deadline.expired.side_effect = [False, True]
+    with pytest.raises(DeadlineExceeded):
+        handler.generate("Test query", [], deadline=deadline)
+    assert breaker.state == HALF_OPEN and breaker.allow()
+    
+def test_generate_skips_call_that_cannot_fit_deadline():
+    primary = FakeModel("primary", "answer")
+    handler = LLMHandler(primary, hedge_min_samples=5)
+    for _ in range(5):
+        handler.latency.record("primary", 2.0)
+    assert handler.expected_latency() == 2.0
+    
+    with pytest.raises(DeadlineExceeded):
+        handler.generate("Test query", [], deadline=Deadline(1.0))
+    assert primary.calls == 0
+    assert handler.generate("Test query", [], deadline=Deadline(5.0)) == "answer"
+    
+def test_circuit_breaker_opens_and_recovers():
+    breaker = CircuitBreaker("model", window=4, min_calls=4, failure_rate=0.5,
+                             slow_call_seconds=1.0, open_seconds=0.1, half_open_calls=2)
+    breaker.record(0.1, success=True)
+    breaker.record(0.1, success=True)
+    breaker.record(0.1, success=False)
+    assert breaker.state == CLOSED
+    # Too slow counts as a failure
+    breaker.record(2.0, success=True)
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    
+    time.sleep(0.15)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    breaker.record(0.1, success=True)
+    breaker.record(0.1, success=True)
+    assert breaker.state == CLOSED
+
+def test_circuit_breaker_reopens_on_failed_trial():
+    breaker = CircuitBreaker("model", window=2, min_calls=2, failure_rate=0.5, open_seconds=0.05)
+    breaker.record(0.1, success=False)
+    breaker.record(0.1, success=False)
+    time.sleep(0.1)
+    assert breaker.allow()
+    breaker.record(0.1, success=False)
+    assert breaker.snapshot()["state"] == OPEN
+
+def test_open_breaker_routes_to_backup():
+    primary = FakeModel("primary", "answer", error=GenerationError("unavailable", 503))
+    backup = FakeModel("backup", "backup answer")
+    handler = LLMHandler(primary, backup, hedge=False)
+    handler.breakers["primary"] = CircuitBreaker("primary", window=3, min_calls=3, open_seconds=60)
+    
+    for _ in range(5):
+        assert handler.generate("Test query", []) == "backup answer"
+    assert primary.calls == 3
+    assert backup.calls == 5
+    assert handler.breaker_states()["primary"]["state"] == OPEN
+    assert handler.breaker_states()["backup"]["state"] == CLOSED
+
+def test_response_cache_serves_repeated_prompts(tmp_path):
+    model = FakeModel("primary", "cached answer")
+    handler = LLMHandler(model, cache=ResponseCache(str(tmp_path / "responses.db")))
+    documents = [{"id": 1, "content": "a"}, {"id": 2, "content": "b"}]
+    
+    assert handler.generate("What is  RAG?", documents) == "cached answer"
+    assert handler.generate("What is RAG? ", documents) == "cached answer"
+    assert model.calls == 1
+    # Different chunks behind the same question are a new request
+    handler.generate("What is RAG?", [{"id": 3, "content": "c"}])
+    assert model.calls == 2
+    
+    stats = handler.cache_stats()
+    assert (stats["hits"], stats["misses"]) == (1, 2)
+    assert stats["hit_rate"] == pytest.approx(1 / 3)
+
+def test_response_cache_bypasses_sampling(tmp_path):
+    model = FakeModel("primary", "answer", parameters={"do_sample": True, "temperature": 0.7})
+    model.build_payload = MagicMock(wraps=model.build_payload)
+    handler = LLMHandler(model, cache=ResponseCache(str(tmp_path / "responses.db")))
+    
+    handler.generate("Test query", [])
+    handler.generate("Test query", [])
+    assert model.calls == 2
+    assert handler.cache_stats()["bypassed"] == 2
+    # No payload, and so no packed context, is built for a key that cannot be used
+    model.build_payload.assert_not_called()
+    
+    handler.cache.allow_sampled = True
+    handler.generate("Test query", [])
+    handler.generate("Test query", [])
+    assert model.calls == 3
+
+def test_agenerate_serves_repeated_prompts_from_cache(tmp_path):
+    model = FakeModel("primary", "cached answer")
+    handler = LLMHandler(model, cache=ResponseCache(str(tmp_path / "responses.db")))
+    documents = [{"id": 1, "content": "a"}]
+    
+    assert asyncio.run(handler.agenerate("What is RAG?", documents)) == "cached answer"
+    assert asyncio.run(handler.agenerate("What is RAG?", documents)) == "cached answer"
+    assert model.calls == 1
+    assert handler.cache_stats()["hits"] == 1
+
+def test_response_cache_lru_and_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=2, ttl=0.2)
+    cache.put("a", "model", "answer a", 1.0)
+    cache.put("b", "model", "answer b", 1.0)
+    assert cache.get(["a"]) == "answer a"
+    cache.put("c", "model", "answer c", 1.0)
+    
+    # b was the least recently used
+    assert cache.get(["b"]) is None
+    assert cache.get(["a"]) == "answer a"
+    assert cache.stats()["seconds_saved"] == 2.0
+    time.sleep(0.3)
+    assert cache.get(["a", "c"]) is None
+
+def chunk_documents(source, text, scores):
+    """Retrieved-document dicts for the chunks of text that have a score."""
+    return [
+        {'id': i, 'source': source, 'content': chunk, 'score': scores[i], 'metadata': {'chunk_index': i}}
+        for i, chunk in enumerate(chunk_text(text, 200, 50)) if i in scores
+    ]
+
+def test_pack_context_merges_neighbours_without_overlap():
+    text = " ".join(f"Sentence {i} about the topic." for i in range(60))
+    documents = chunk_documents("a.txt", text, {1: 0.9, 2: 0.8, 4: 0.7})
+    
+    passages = pack_context(documents, max_tokens=1000)
+    assert [passage['chunk_indexes'] for passage in passages] == [[1, 2], [4]]
+    merged = passages[0]['content']
+    # The overlapping text appears once and the merged passage is contiguous source text
+    assert merged in text
+    assert len(merged) < len(documents[0]['content']) + len(documents[1]['content'])
+
+def test_pack_context_drops_duplicates_and_respects_budget():
+    text = " ".join(f"Word{i} appears here." for i in range(200))
+    documents = chunk_documents("a.txt", text, {0: 0.9, 3: 0.6, 6: 0.5})
+    mirror = dict(documents[0], source="mirror.txt", score=0.85, metadata={'chunk_index': 0})
+    
+    passages = pack_context(documents + [mirror], max_tokens=110)
+    assert [passage['source'] for passage in passages] == ["a.txt", "a.txt"]
+    assert [passage['chunk_indexes'] for passage in passages] == [[0], [3]]
+    assert sum(estimate_tokens(passage['content']) for passage in passages) <= 110
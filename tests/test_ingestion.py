@@ -1,13 +1,32 @@
+import io
+import json
 import os
+import asyncio
+import threading
 import pytest
+import tarfile
+import zipfile
 import tempfile
+import time
+from functools import partial
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from unittest.mock import patch, MagicMock
 from src.ingestion.text_processor import TextProcessor
-from src.ingestion.image_processor import ImageProcessor
+from src.ingestion.image_processor import ImageProcessor, _binarize, _tile_bounds
 from src.ingestion.video_processor import VideoProcessor
 from src.ingestion.binary_processor import BinaryProcessor
+from src.ingestion.archive_processor import ArchiveProcessor
 from src.ingestion.web_scraper import WebScraper
+from src.ingestion.web_crawler import WebCrawler
 from src.ingestion.embedding_generator import EmbeddingGenerator
+from src.utils.html_extractor import HTMLTextExtractor, extract_html_text, available_backends
+from src.utils.json_stream import iter_json_records
 from src.ingestion.storage import MilvusStorage
+from src.pipeline.orchestrator import RAGOrchestrator
+from src.pipeline.jobs import JobStore, JobQueue, IngestionJob, JobStopped, QUEUED, RUNNING, CANCELLED, PARTIAL
+from src.utils.scheduler import PriorityScheduler
+from src.retrieval.sparse_index import BM25Index
+from src.utils.helper import get_supported_extensions
 
 @pytest.fixture
 def temp_text_file():
@@ -23,6 +42,108 @@ def temp_json_file():
     yield f.name
     os.unlink(f.name)
 
+@pytest.fixture
+def temp_jsonl_file():
+    with tempfile.NamedTemporaryFile(suffix='.jsonl', delete=False) as f:
+        f.write(b'{"id": 1, "text": "first"}\n{"id": 2, "text": "second"}\nnot json\n')
+    yield f.name
+    os.unlink(f.name)
+
+@pytest.fixture
+def temp_csv_file():
+    with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as f:
+        f.write(b"id,name\n" + b"".join(b"%d,item %d\n" % (i, i) for i in range(200)))
+    yield f.name
+    os.unlink(f.name)
+
+@pytest.fixture
+def temp_markdown_file():
+    with tempfile.NamedTemporaryFile(suffix='.md', delete=False) as f:
+        f.write(b"# Guide\nIntro\n## Setup\n```\n# not a heading\n```\n# Usage\nRun it\n")
+    yield f.name
+    os.unlink(f.name)
+
+@pytest.fixture
+def temp_pdf_file():
+    with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as f:
+        f.write(b"%PDF-1.4")
+    yield f.name
+    os.unlink(f.name)
+
+@pytest.fixture
+def local_site(tmp_path):
+    """Serve a small linked site from a temporary directory."""
+    pages = {
+        'index.html': '<title>Home</title><nav><a href="/a.html">A</a></nav>'
+                      '<main>Welcome home</main><a href="b.html#top">B</a><a href="https://elsewhere.test/">Out</a>',
+        'a.html': '<title>A</title><main>Page A</main><a href="c.html">C</a>',
+        'b.html': '<title>B</title><main>Page B</main><a href="index.html">Home</a>',
+        'c.html': '<title>C</title><main>Page C</main>'
+    }
+    for name, html in pages.items():
+        (tmp_path / name).write_text(f"<html><body>{html}</body></html>")
+    
+    handler = partial(SimpleHTTPRequestHandler, directory=str(tmp_path))
+    handler.log_message = lambda *args: None
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    (tmp_path / 'sitemap.xml').write_text(
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+        f'<url><loc>{base_url}/c.html</loc></url></urlset>'
+    )
+    yield base_url
+    server.shutdown()
+
+# Pages the HTML extraction backends must agree on
+HTML_CORPUS = [
+    '<html><head><title> Docs &amp; Guides </title><style>p { color: red }</style></head><body>'
+    '<nav><a href="/">Home</a> <a href="/docs">Docs</a></nav><main><h1>Install</h1>'
+    '<p>Run <code>pip install</code> and\n   restart.</p><script>track()</script><p>Done &gt; next</p></main>'
+    '<footer>Copyright</footer></body></html>',
+    '<html><body><div>Sidebar</div><article><h2>News</h2><!-- hidden --><p>Item <b>one</b>, '
+    '<i>two</i></p><iframe src="ad.html">ad</iframe></article><p>After</p></body></html>',
+    '<html><head><title>Plain</title></head><body><p>Line one<br>Line two</p>'
+    '<ul><li>First</li><li>Second &nbsp; item</li></ul><a href="#top">Top</a></body></html>',
+    '<html><body><p>Price<script>x</script>list</p><p>one<!-- c -->two<?pi x?>three</p>'
+    '<p>before<template><p>Hidden</p>row</template>after</p></body></html>',
+]
+
+def fake_pdf_pages(texts):
+    pages = []
+    for text in texts:
+        page = MagicMock()
+        page.extract_text.return_value = text
+        pages.append(page)
+    return pages
+
+def write_text_pdf(path, texts):
+    """Write a minimal PDF with one line of text per page."""
+    count = len(texts)
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [" + b" ".join(b"%d 0 R" % (4 + 2 * i) for i in range(count))
+               + b"] /Count %d >>" % count,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(texts):
+        stream = b"BT /F1 12 Tf 72 720 Td (%s) Tj ET" % text.encode()
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (5 + 2 * i))
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        
+    data = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(data))
+        data += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(data)
+    data += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    data += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    data += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, 'wb') as f:
+        f.write(data)
+
 class TestTextProcessor:
     def test_process_txt(self, temp_text_file):
         processor = TextProcessor()
@@ -39,6 +160,217 @@ class TestTextProcessor:
         assert results[0]['content'] is not None
         assert results[0]['source'] == temp_json_file
         assert results[0]['metadata']['file_type'] == 'json'
+        assert results[0]['metadata']['json_path'] == '$.test'
+        assert '{"test":"data"}' in results[0]['content']
+        
+    def test_json_value_spanning_many_blocks(self):
+        value = {'rows': {'nested': [{'id': i, 'tags': ['a', 'b']} for i in range(5000)]}}
+        text = json.dumps(value)
+        decoder = MagicMock(wraps=json.JSONDecoder())
+        with patch('src.utils.json_stream._decoder', decoder):
+            records = list(iter_json_records(io.StringIO(text), block_size=64))
+        assert records == [('$.rows', value)]
+        # Decoded again only after the pending data doubled, not once per block
+        assert len(text) // 64 > 1000 and decoder.raw_decode.call_count < 30
+        
+    def test_process_jsonl(self, temp_jsonl_file):
+        processor = TextProcessor()
+        results = processor.process(temp_jsonl_file)
+        assert len(results) == 1
+        assert results[0]['content'] == '{"id":1,"text":"first"}\n{"id":2,"text":"second"}'
+        assert results[0]['metadata']['file_type'] == 'jsonl'
+        assert results[0]['metadata']['json_path'] == '$[0]'
+        assert results[0]['metadata']['json_path_end'] == '$[1]'
+        assert results[0]['metadata']['record_count'] == 2
+        
+    def test_process_csv_repeats_header(self, temp_csv_file):
+        processor = TextProcessor()
+        results = processor.process(temp_csv_file)
+        assert len(results) > 1
+        assert all(r['content'].startswith("id,name\n") for r in results)
+        assert results[0]['metadata']['row_start'] == 1
+        assert results[-1]['metadata']['row_end'] == 200
+        
+    def test_process_markdown_sections(self, temp_markdown_file):
+        processor = TextProcessor()
+        results = processor.process(temp_markdown_file)
+        assert len(results) == 1
+        assert results[0]['metadata']['file_type'] == 'markdown'
+        assert results[0]['metadata']['section'] == 'Guide'
+        assert results[0]['metadata']['section_end'] == 'Usage'
+        assert "# not a heading" in results[0]['content']
+        
+    def test_process_pdf_records_pages(self, temp_pdf_file):
+        processor = TextProcessor(pdf_parallel_threshold=100)
+        with patch('src.ingestion.text_processor.PyPDF2.PdfReader') as mock_reader:
+            mock_reader.return_value.pages = fake_pdf_pages(["First page", "", "Third page"])
+            results = processor.process(temp_pdf_file)
+        assert [r['content'] for r in results] == ["First page", "Third page"]
+        assert [r['metadata']['page'] for r in results] == [1, 3]
+        assert [r['metadata']['chunk_index'] for r in results] == [0, 1]
+        
+    def test_process_pdf_across_worker_processes(self, tmp_path):
+        pdf_path = str(tmp_path / 'manual.pdf')
+        write_text_pdf(pdf_path, [f"Page number {i + 1}" for i in range(6)])
+        
+        processor = TextProcessor(pdf_parallel_threshold=2, pdf_workers=3)
+        with patch('src.ingestion.text_processor.PDF_PAGES_PER_TASK', 2):
+            results = processor.process(pdf_path)
+        assert [r['content'] for r in results] == [f"Page number {i + 1}" for i in range(6)]
+        assert [r['metadata']['page'] for r in results] == [1, 2, 3, 4, 5, 6]
+
+class TestImageProcessor:
+    def test_binarize_and_tile_tall_image(self):
+        from PIL import Image, ImageDraw
+        image = Image.new('RGB', (4000, 9000), 'white')
+        draw = ImageDraw.Draw(image)
+        for y in range(0, 9000, 100):
+            draw.rectangle((100, y, 3000, y + 40), fill='black')
+        
+        binary = _binarize(image, max_width=2000)
+        assert binary.size == (2000, 4500)
+        assert set(binary.getdata()) == {0, 255}
+        
+        bounds = _tile_bounds(binary, tile_height=1000)
+        assert bounds[0][0] == 0 and bounds[-1][1] == 4500
+        assert all(a[1] == b[0] for a, b in zip(bounds, bounds[1:]))
+        
+    def test_cached_result_skips_ocr(self, tmp_path):
+        from PIL import Image
+        image_path = str(tmp_path / 'scan.png')
+        Image.new('RGB', (100, 100), 'white').save(image_path)
+        
+        processor = ImageProcessor(max_workers=1, cache_dir=str(tmp_path / 'cache'))
+        with open(processor._cache_path(image_path), 'w') as f:
+            f.write("Cached OCR text")
+        
+        with patch.object(processor, '_get_executor') as mock_executor:
+            results = processor.process(image_path)
+            mock_executor.assert_not_called()
+        assert results[0]['content'] == "Cached OCR text"
+        assert results[0]['metadata']['file_type'] == 'image'
+        
+    def test_broken_pool_is_replaced(self, tmp_path):
+        from PIL import Image
+        from concurrent.futures import Future
+        from concurrent.futures.process import BrokenProcessPool
+        image_path = str(tmp_path / 'scan.png')
+        Image.new('RGB', (100, 100), 'white').save(image_path)
+        
+        broken, done = Future(), Future()
+        broken.set_exception(BrokenProcessPool("A worker process terminated abruptly"))
+        done.set_result("Recovered text")
+        pools = [MagicMock(), MagicMock()]
+        pools[0].submit.return_value = broken
+        pools[1].submit.return_value = done
+        
+        processor = ImageProcessor(max_workers=1, cache_dir=None)
+        with patch('src.ingestion.image_processor.ProcessPoolExecutor', side_effect=pools):
+            assert processor.process(image_path) == []
+            pools[0].shutdown.assert_called_once_with(wait=False)
+            assert processor.process(image_path)[0]['content'] == "Recovered text"
+
+class TestVideoProcessor:
+    def test_transcribes_segments_in_order(self, tmp_path):
+        import wave
+        import numpy as np
+        rate = 16000
+        tone = (np.sin(np.arange(rate) * 2 * np.pi * 440 / rate) * 10000).astype(np.int16)
+        silence = np.zeros(rate, dtype=np.int16)
+        audio_path = str(tmp_path / 'speech.wav')
+        with wave.open(audio_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(np.concatenate([tone, silence, tone, silence, tone]).tobytes())
+        
+        recognizer = MagicMock()
+        recognizer.transcribe.side_effect = lambda pcm, sample_rate: f"segment {len(pcm)}"
+        processor = VideoProcessor(recognizer=recognizer, max_workers=2)
+        results = processor.process(audio_path)
+        
+        assert recognizer.transcribe.call_count == 3
+        assert len(results) == 1
+        assert results[0]['content'].count("segment") == 3
+        assert results[0]['metadata']['start_time'] == 0
+        assert results[0]['metadata']['end_time'] == pytest.approx(5.0, abs=0.05)
+        
+    def test_stream_is_piped_through_decoder(self, tmp_path):
+        import sys
+        import numpy as np
+        # Stand-in for ffmpeg that passes stdin through as PCM
+        decoder = tmp_path / 'fake-ffmpeg'
+        decoder.write_text(f"#!{sys.executable}\nimport shutil, sys\n"
+                           "shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)\n")
+        decoder.chmod(0o755)
+        
+        rate = 16000
+        tone = (np.sin(np.arange(rate) * 2 * np.pi * 440 / rate) * 10000).astype(np.int16)
+        pcm = np.concatenate([tone, np.zeros(rate, dtype=np.int16), tone]).tobytes()
+        
+        recognizer = MagicMock()
+        recognizer.transcribe.return_value = "hello"
+        processor = VideoProcessor(recognizer=recognizer, max_workers=2)
+        with patch('src.ingestion.video_processor.FFMPEG_BINARY', str(decoder)):
+            results = processor.process_stream(io.BytesIO(pcm), 'clips.zip!a.mp3')
+        
+        assert recognizer.transcribe.call_count == 2
+        assert results[0]['content'] == "hello\nhello"
+        assert results[0]['source'] == 'clips.zip!a.mp3'
+        
+    def test_decoder_stderr_is_drained(self, tmp_path):
+        import sys
+        # Stand-in for ffmpeg that fills the stderr pipe before writing any PCM, then fails
+        decoder = tmp_path / 'fake-ffmpeg'
+        decoder.write_text(f"#!{sys.executable}\nimport sys\n"
+                           "sys.stderr.write('warning\\n' * 100000)\nsys.stderr.flush()\n"
+                           "sys.stdout.buffer.write(bytes(64000))\nsys.stderr.write('bad input\\n')\nsys.exit(1)\n")
+        decoder.chmod(0o755)
+        
+        processor = VideoProcessor(recognizer=MagicMock(), max_workers=1)
+        with patch('src.ingestion.video_processor.FFMPEG_BINARY', str(decoder)):
+            frames = processor._decode_pcm('a.mp3', io.BytesIO(b""))
+            assert b"".join(next(frames) for _ in range(2)) == bytes(64000)
+            with pytest.raises(RuntimeError, match="bad input"):
+                next(frames)
+
+class TestArchiveProcessor:
+    def test_streams_nested_members(self, tmp_path):
+        inner = io.BytesIO()
+        with tarfile.open(fileobj=inner, mode='w:gz') as tf:
+            data = b"id,name\n1,nested\n"
+            info = tarfile.TarInfo('data/rows.csv')
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+        
+        archive_path = str(tmp_path / 'corpus.zip')
+        with zipfile.ZipFile(archive_path, 'w') as zf:
+            zf.writestr('readme.txt', 'Top level document')
+            zf.writestr('inner.tar.gz', inner.getvalue())
+        
+        processor = TextProcessor()
+        results = {}
+        
+        def handle(stream, source):
+            results[source] = list(processor.iter_stream_documents(stream, source))
+        
+        count = ArchiveProcessor(max_depth=2).process(archive_path, handle)
+        assert count == 2
+        assert results[f"{archive_path}!readme.txt"][0]['content'] == 'Top level document'
+        csv_docs = results[f"{archive_path}!inner.tar.gz!data/rows.csv"]
+        assert csv_docs[0]['metadata']['filename'] == 'rows.csv'
+        assert csv_docs[0]['content'] == "id,name\n1,nested"
+        
+    def test_respects_max_depth(self, tmp_path):
+        archive_path = str(tmp_path / 'outer.zip')
+        with zipfile.ZipFile(archive_path, 'w') as zf:
+            zf.writestr('inner.zip', b'')
+            zf.writestr('doc.txt', 'text')
+        
+        sources = []
+        count = ArchiveProcessor(max_depth=1).process(archive_path, lambda stream, source: sources.append(source))
+        assert count == 1
+        assert sources == [f"{archive_path}!doc.txt"]
 
 class TestEmbeddingGenerator:
     def test_generate_embeddings(self):
@@ -57,4 +389,193 @@ class TestWebScraper:
         assert len(results) > 0
         assert results[0]['content'] is not None
         assert results[0]['source'] == "https://example.com"
-        assert results[0]['metadata']['file_type'] == 'web'
\ No newline at end of file
+        assert results[0]['metadata']['file_type'] == 'web'
+        
+    def test_crawl_follows_same_domain_links(self, local_site):
+        async def crawl():
+            crawler = WebCrawler(WebScraper(cache_path=None), max_depth=1, concurrency=4, domain_rate_limit=0)
+            return [page async for page in crawler.crawl([f"{local_site}/index.html"])]
+        
+        pages = {page['url']: page for page in asyncio.run(crawl())}
+        assert set(pages) == {f"{local_site}/index.html", f"{local_site}/a.html", f"{local_site}/b.html"}
+        assert pages[f"{local_site}/a.html"]['depth'] == 1
+        assert "Page A" in pages[f"{local_site}/a.html"]['documents'][0]['content']
+        
+    def test_crawl_sitemap(self, local_site):
+        async def crawl():
+            crawler = WebCrawler(WebScraper(cache_path=None), max_depth=0, domain_rate_limit=0)
+            return [page async for page in crawler.crawl(sitemaps=[f"{local_site}/sitemap.xml"])]
+        
+        pages = asyncio.run(crawl())
+        assert [page['url'] for page in pages] == [f"{local_site}/c.html"]
+        assert pages[0]['documents'][0]['metadata']['title'] == "C"
+        
+    def test_conditional_refetch(self, local_site, tmp_path):
+        scraper = WebScraper(cache_path=str(tmp_path / 'http_cache.sqlite3'))
+        url = f"{local_site}/b.html"
+        
+        first = scraper.fetch(url)
+        assert first['status'] == 'new' and first['documents']
+        scraper.commit([first])
+        
+        # Served as 304 Not Modified from the Last-Modified validator
+        second = scraper.fetch(url)
+        assert second['status'] == 'unchanged'
+        assert second['documents'] == []
+        assert f"{local_site}/index.html" in second['links']
+        
+        page = tmp_path / 'b.html'
+        page.write_text("<html><body><main>Page B, revised</main></body></html>")
+        os.utime(page, (page.stat().st_atime, page.stat().st_mtime + 60))
+        third = scraper.fetch(url)
+        assert third['status'] == 'updated'
+        assert "revised" in third['documents'][0]['content']
+        
+    @pytest.mark.parametrize("backend", available_backends())
+    def test_extraction_backends_agree(self, backend):
+        for html in HTML_CORPUS:
+            assert extract_html_text(html, backend) == extract_html_text(html, 'html.parser')
+        assert extract_html_text(HTML_CORPUS[-1], backend)['text'].split('\n') == [
+            'Price', 'list', 'one', 'two', 'three', 'before', 'after']
+            
+    def test_extractor_joins_text_split_across_blocks(self):
+        extractor = HTMLTextExtractor()
+        extractor.feed('<html><body><main><p>hello wor')
+        assert extractor.drain() == []
+        extractor.feed('ld again</p><p>next')
+        assert extractor.drain() == ['hello world again']
+        extractor.feed('</p></main><p>after</p></body></html>')
+        extractor.close()
+        assert extractor.drain() == ['next']
+        assert extractor.content_lines() == []
+
+
+class TestIngestionJobs:
+    def orchestrator(self, stored):
+        # Only the parts of the pipeline that text ingestion touches
+        orchestrator = RAGOrchestrator.__new__(RAGOrchestrator)
+        orchestrator.text_processor = TextProcessor()
+        orchestrator.supported_extensions = get_supported_extensions()
+        orchestrator.embedding_generator = MagicMock()
+        orchestrator.embedding_generator.generate.side_effect = lambda batch: batch
+        orchestrator.storage = MagicMock()
+        orchestrator.storage.store.side_effect = lambda batch: stored.extend(batch) or True
+        orchestrator.sparse_index = None
+        orchestrator.scheduler = PriorityScheduler()
+        orchestrator.corpus_version = 0
+        orchestrator._stats_lock = threading.Lock()
+        return orchestrator
+        
+    def test_interrupted_job_resumes_without_storing_twice(self, tmp_path):
+        corpus = tmp_path / "corpus"
+        corpus.mkdir()
+        for name in ("a", "b", "c"):
+            (corpus / f"{name}.txt").write_text(f"Notes about {name}. " * 200)
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.create(str(corpus))
+        stored = []
+        orchestrator = self.orchestrator(stored)
+        orchestrator.sparse_index = BM25Index(path=None)
+        
+        # The queue stops after the first stored batch, as if the process went down
+        stopping = threading.Event()
+        orchestrator.storage.store.side_effect = lambda batch: stored.extend(batch) or stopping.set() or True
+        with pytest.raises(JobStopped):
+            orchestrator.ingest(str(corpus), True, IngestionJob(store, store.claim(), stopping))
+        first_run = len(stored)
+        assert store.sources(job_id)
+        
+        store.requeue(job_id)
+        orchestrator.storage.store.side_effect = lambda batch: stored.extend(batch) or True
+        # Nor did the sparse index of the first run reach the disk
+        orchestrator.sparse_index = BM25Index(path=None)
+        job = IngestionJob(store, store.claim(), threading.Event())
+        stats = orchestrator.ingest(str(corpus), True, job)
+        
+        keys = [(doc['source'], doc['metadata']['chunk_index']) for doc in stored]
+        assert len(keys) == len(set(keys)) > first_run
+        assert stats['total_files'] == stats['processed_files'] == 3
+        assert stats['processed_documents'] == len(stored)
+        assert job.progress()['files_done'] == 3 and job.progress()['chunks_done'] == len(stored)
+        assert len(orchestrator.sparse_index) == len(stored)
+        
+    def test_resumed_source_failing_extraction_counts_as_failed(self, tmp_path):
+        path = tmp_path / "notes.txt"
+        path.write_text("Notes about resuming. " * 1000)
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        job_id = store.create(str(path))
+        stored = []
+        orchestrator = self.orchestrator(stored)
+        
+        stopping = threading.Event()
+        orchestrator.storage.store.side_effect = lambda batch: stored.extend(batch) or stopping.set() or True
+        with pytest.raises(JobStopped):
+            orchestrator.ingest(str(path), True, IngestionJob(store, store.claim(), stopping))
+        assert store.sources(job_id)[str(path)][1] == PARTIAL
+        
+        # The partly stored file can no longer be read when the job resumes
+        store.requeue(job_id)
+        orchestrator._extract_documents = MagicMock(side_effect=OSError("unreadable"))
+        stats = orchestrator.ingest(str(path), True, IngestionJob(store, store.claim(), threading.Event()))
+        
+        assert stats['processed_files'] == 0 and stats['failed_files'] == 1
+        assert store.failed_sources(job_id) == [str(path)]
+        
+    def test_queue_runs_and_cancels_jobs(self, tmp_path):
+        started = threading.Event()
+        
+        def ingest(path, recursive, job):
+            started.set()
+            while True:
+                job.batch_committed(path, 1)
+                time.sleep(0.01)
+                
+        queue = JobQueue(ingest, JobStore(str(tmp_path / "jobs.sqlite3")), workers=1)
+        job_id = queue.submit(str(tmp_path))
+        queued = queue.submit(str(tmp_path))
+        queue.start()
+        try:
+            assert started.wait(5)
+            assert queue.get(job_id)['status'] == RUNNING
+            assert queue.get(job_id)['progress']['chunks_done'] > 0
+            assert queue.cancel(queued) and queue.get(queued)['status'] == CANCELLED
+            assert queue.cancel(job_id)
+            deadline = time.time() + 5
+            while queue.get(job_id)['status'] != CANCELLED and time.time() < deadline:
+                time.sleep(0.01)
+            assert queue.get(job_id)['status'] == CANCELLED
+            assert not queue.cancel(job_id)
+        finally:
+            queue.stop()
+            
+    def test_stopped_queue_leaves_job_to_resume(self, tmp_path):
+        started = threading.Event()
+        
+        def ingest(path, recursive, job):
+            started.set()
+            while True:
+                job.check()
+                time.sleep(0.01)
+                
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        queue = JobQueue(ingest, store)
+        job_id = queue.submit(str(tmp_path))
+        queue.start()
+        assert started.wait(5)
+        queue.stop()
+        assert store.get(job_id)['status'] == QUEUED
+        
+        # A job running in a live process is left alone, one whose lease ran out is queued again
+        record = store.claim()
+        assert JobStore(store.path).recover() == 0
+        time.sleep(0.05)
+        other = JobStore(store.path, lease=0.01)
+        assert other.recover() == 1
+        assert store.get(job_id)['status'] == QUEUED and store.get(job_id)['runs'] == 2
+        
+        # The process that lost the job stops at its next checkpoint
+        other.claim()
+        job = IngestionJob(store, record, threading.Event())
+        with pytest.raises(JobStopped):
+            job.batch_committed(str(tmp_path), 1)
+        assert job.lost() and store.sources(job_id) == {}
@@ -1,9 +1,20 @@
 import pytest
 import tempfile
 import os
-from src.retrieval.retriever import Retriever
+import time
+import asyncio
+import threading
+import numpy as np
+from unittest.mock import MagicMock
+from src.retrieval.retriever import Retriever, maximal_marginal_relevance, reciprocal_rank_fusion
+from src.retrieval.semantic_cache import SemanticCache
+from src.retrieval.sparse_index import BM25Index, tokenize
+from src.utils.deadline import Deadline
+from src.utils.single_flight import SingleFlight
+from src.utils.scheduler import PriorityScheduler, BusyError, QUERY, INGEST
 from src.ingestion.storage import MilvusStorage
 from src.ingestion.embedding_generator import EmbeddingGenerator
+from src.pipeline.orchestrator import RAGOrchestrator
 
 class TestRetriever:
     def test_retriever_initialization(self):
@@ -22,4 +33,331 @@ class TestRetriever:
             if results:
                 assert 'content' in results[0]
                 assert 'source' in results[0]
-                assert 'score' in results[0]
\ No newline at end of file
+                assert 'score' in results[0]
+                
+    def test_retrieve_reuses_query_embedding(self):
+        embedding_generator = MagicMock()
+        storage = MagicMock()
+        storage.search.return_value = [{'id': 1, 'content': 'text', 'source': 'a.txt', 'score': 0.9}]
+        retriever = Retriever(embedding_generator, storage)
+        
+        results = retriever.retrieve("test query", top_k=1, query_embedding=[0.1, 0.2])
+        assert results[0]['id'] == 1
+        storage.search.assert_called_once_with([0.1, 0.2], 1)
+        embedding_generator.generate.assert_not_called()
+
+    def test_mmr_prefers_diverse_candidates(self):
+        query = [1.0, 0.0]
+        # Two near-identical relevant candidates and one less relevant but different one
+        candidates = [[0.99, 0.1], [0.99, 0.11], [0.7, -0.7]]
+        assert maximal_marginal_relevance(query, candidates, 2, lambda_mult=1.0) == [0, 1]
+        assert maximal_marginal_relevance(query, candidates, 2, lambda_mult=0.5) == [0, 2]
+        
+    def test_retrieve_diversifies_and_adds_neighbours(self):
+        storage = MagicMock()
+        storage.search.return_value = [
+            {'id': 1, 'source': 'a.txt', 'content': 'a1', 'score': 0.9, 'metadata': {'chunk_index': 1}, 'embedding': [0.96, 0.28]},
+            {'id': 2, 'source': 'a.txt', 'content': 'a1 copy', 'score': 0.89, 'metadata': {'chunk_index': 7}, 'embedding': [0.95, 0.31]},
+            {'id': 3, 'source': 'b.txt', 'content': 'b4', 'score': 0.6, 'metadata': {'chunk_index': 4}, 'embedding': [0.9, -0.436]}
+        ]
+        storage.get_chunks.return_value = [
+            {'id': 4, 'source': 'a.txt', 'content': 'a0', 'metadata': {'chunk_index': 0}},
+            {'id': 5, 'source': 'a.txt', 'content': 'a2', 'metadata': {'chunk_index': 2}},
+            {'id': 6, 'source': 'b.txt', 'content': 'b5', 'metadata': {'chunk_index': 5}}
+        ]
+        retriever = Retriever(MagicMock(), storage)
+        
+        results = retriever.retrieve("test query", top_k=2, query_embedding=[1.0, 0.0],
+                                     diversify=True, neighbours=1)
+        assert storage.search.call_args.kwargs['include_embeddings'] is True
+        assert [doc['id'] for doc in results] == [1, 3, 4, 5, 6]
+        assert 'embedding' not in results[0]
+        assert results[2]['score'] == 0.9 and results[4]['score'] == 0.6
+        storage.get_chunks.assert_called_once()
+        assert set(storage.get_chunks.call_args.args[0]) == {('a.txt', 0), ('a.txt', 2), ('b.txt', 3), ('b.txt', 5)}
+
+    def test_hybrid_retrieve_fuses_sparse_results(self):
+        storage = MagicMock()
+        storage.search.return_value = [
+            {'id': 1, 'source': 'guide.txt', 'content': 'Restart the service after upgrading.', 'score': 0.8, 'metadata': {'chunk_index': 0}},
+            {'id': 2, 'source': 'errors.txt', 'content': 'Error E4012 means the license expired.', 'score': 0.7, 'metadata': {'chunk_index': 3}}
+        ]
+        index = BM25Index(path=None)
+        index.add([
+            {'source': 'errors.txt', 'content': 'Error E4012 means the license expired.', 'metadata': {'chunk_index': 3}},
+            {'source': 'errors.txt', 'content': 'Error E4013 means the disk is full.', 'metadata': {'chunk_index': 4}}
+        ])
+        retriever = Retriever(MagicMock(), storage, index)
+        
+        results = retriever.retrieve("What is E4012?", top_k=2, query_embedding=[0.1, 0.2], hybrid=True)
+        storage.search.assert_called_once_with([0.1, 0.2], 4)
+        # Found by both searches, so it ranks first and keeps its Milvus id
+        assert results[0]['id'] == 2
+        assert len(results) == 2
+        
+    def test_failed_sparse_search_falls_back_to_dense_results(self):
+        storage = MagicMock()
+        storage.search.return_value = [
+            {'id': i, 'source': 'a.txt', 'content': 'x', 'score': 0.9 - i / 10, 'metadata': {}} for i in range(4)
+        ]
+        index = MagicMock()
+        index.search.side_effect = OSError("index file is gone")
+        retriever = Retriever(MagicMock(), storage, index)
+        
+        degradations = []
+        results = retriever.retrieve("query", top_k=2, query_embedding=[0.1, 0.2], hybrid=True,
+                                     degradations=degradations)
+        assert [doc['id'] for doc in results] == [0, 1]
+        assert degradations == ['skipped_sparse_search']
+        
+    def test_reciprocal_rank_fusion(self):
+        dense = [{'source': 'a', 'content': 'x', 'metadata': {'chunk_index': i}} for i in range(3)]
+        sparse = [{'source': 'a', 'content': 'x', 'metadata': {'chunk_index': i}} for i in (2, 5)]
+        fused = reciprocal_rank_fusion([dense, sparse], top_k=3, k=60)
+        # 1 and 5 tie on rank 2 of their lists; the earlier list wins
+        assert [doc['metadata']['chunk_index'] for doc in fused] == [2, 0, 1]
+        assert fused[0]['score'] == pytest.approx(1 / 63 + 1 / 61)
+
+    def test_retrieve_degrades_when_deadline_is_short(self):
+        storage = MagicMock()
+        storage.search.return_value = [
+            {'id': 1, 'source': 'a.txt', 'content': 'a', 'score': 0.9, 'metadata': {'chunk_index': 0}}
+        ]
+        retriever = Retriever(MagicMock(), storage)
+        degradations = []
+        
+        results = retriever.retrieve("test query", top_k=4, query_embedding=[0.1, 0.2], diversify=True,
+                                     neighbours=1, deadline=Deadline(0.01), degradations=degradations)
+        assert len(results) == 1
+        storage.search.assert_called_once_with([0.1, 0.2], 2, ef=16)
+        storage.get_chunks.assert_not_called()
+        assert degradations == ['reduced_search_ef', 'reduced_top_k', 'skipped_diversification',
+                                'skipped_neighbour_chunks']
+        
+class TestSemanticCache:
+    def vector(self, *values):
+        return np.array(values, dtype=np.float32)
+        
+    def test_paraphrase_hits_above_threshold(self):
+        cache = SemanticCache(max_entries=10, threshold=0.95)
+        cache.store("what is rag", self.vector(1, 0, 0), {'response': 'answer', 'documents': []}, 1)
+        
+        hit = cache.lookup(self.vector(0.99, 0.1, 0), 1)
+        assert hit['response'] == 'answer'
+        assert hit['cached_query'] == "what is rag"
+        assert hit['similarity'] > 0.95
+        assert cache.lookup(self.vector(0.7, 0.7, 0), 1) is None
+        
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses']) == (1, 1)
+        
+    def test_corpus_change_drops_entries(self):
+        cache = SemanticCache(max_entries=10, threshold=0.9)
+        cache.store("q", self.vector(1, 0), {'response': 'old answer', 'documents': []}, 1)
+        
+        assert cache.lookup(self.vector(1, 0), 2) is None
+        assert cache.stats()['entries'] == 0
+        
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = SemanticCache(max_entries=2, threshold=0.99)
+        cache.store("a", self.vector(1, 0, 0), {'response': 'a'}, 1)
+        cache.store("b", self.vector(0, 1, 0), {'response': 'b'}, 1)
+        assert cache.lookup(self.vector(1, 0, 0), 1)['response'] == 'a'
+        cache.store("c", self.vector(0, 0, 1), {'response': 'c'}, 1)
+        
+        assert cache.lookup(self.vector(0, 1, 0), 1) is None
+        assert cache.lookup(self.vector(1, 0, 0), 1)['response'] == 'a'
+        assert cache.lookup(self.vector(0, 0, 1), 1)['response'] == 'c'
+
+class TestBM25Index:
+    def test_tokenize_keeps_identifiers_and_their_parts(self):
+        terms = tokenize("Call parseHeader() on ERR-404")
+        assert 'parseheader' in terms and 'header' in terms
+        assert 'err-404' in terms and '404' in terms
+        
+    def test_search_ranks_exact_identifier_first(self):
+        index = BM25Index(path=None)
+        index.add([
+            {'source': 'a.txt', 'content': 'Part PN-7731-B fits the rear axle.', 'metadata': {'chunk_index': 0}},
+            {'source': 'b.txt', 'content': 'Part PN-7732-B fits the front axle.', 'metadata': {'chunk_index': 0}},
+            {'source': 'c.txt', 'content': 'The axle needs grease every year.', 'metadata': {'chunk_index': 0}}
+        ])
+        results = index.search("where does PN-7731-B go", top_k=2)
+        assert results[0]['source'] == 'a.txt'
+        assert results[0]['score'] > results[1]['score']
+        
+    def test_delete_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sparse')
+            index = BM25Index(path=path)
+            index.add([{'source': f'doc{i}.txt', 'content': f'code X{i} here', 'metadata': {'chunk_index': 0}}
+                       for i in range(4)])
+            index.delete_by_source('doc1.txt')
+            assert index.search("X1") == []
+            index.save()
+            
+            loaded = BM25Index(path=path)
+            assert len(loaded) == 3
+            assert loaded.search("X2")[0]['source'] == 'doc2.txt'
+            loaded.add([{'source': 'doc9.txt', 'content': 'code X9', 'metadata': {'chunk_index': 0}}])
+            assert loaded.search("X9")[0]['metadata'] == {'chunk_index': 0}
+            
+    def test_save_writes_only_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sparse')
+            index = BM25Index(path=path)
+            index.add([{'source': f'doc{i}.txt', 'content': f'code X{i} here', 'metadata': {'chunk_index': 0}}
+                       for i in range(4)])
+            index.save()
+            first = set(os.listdir(path))
+            
+            index.add([{'source': 'doc9.txt', 'content': 'code X9', 'metadata': {'chunk_index': 0}}])
+            index.delete_by_source('doc0.txt')
+            index.save()
+            assert first - {'manifest.json'} <= set(os.listdir(path))
+            assert index.stats()['segments'] == 2
+            
+            loaded = BM25Index(path=path)
+            assert len(loaded) == 4
+            assert loaded.search("X0") == []
+            assert loaded.search("X9")[0]['content'] == 'code X9'
+            
+            # Compacting renumbers the documents, so the next save starts a single new segment
+            for i in range(1, 4):
+                loaded.delete_by_source(f'doc{i}.txt')
+            loaded.save()
+            assert loaded.stats()['segments'] == 1 and not first & set(os.listdir(path)) - {'manifest.json'}
+            assert [hit['source'] for hit in BM25Index(path=path).search("code")] == ['doc9.txt']
+            
+class TestSingleFlight:
+    def test_concurrent_threads_share_one_run(self):
+        flights = SingleFlight()
+        release = threading.Event()
+        calls = []
+        
+        def compute():
+            calls.append(1)
+            release.wait(5)
+            return {'response': 'answer'}
+            
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do('q', compute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while flights.stats()['coalesced'] < 4:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+            
+        assert len(calls) == 1
+        assert all(result is results[0] for result in results)
+        assert flights.stats() == {'in_flight': 0, 'started': 1, 'coalesced': 4}
+        # Finished flights are not reused
+        assert flights.do('q', lambda: 'again') == 'again'
+        
+    def test_async_waiters_share_result_and_errors(self):
+        flights = SingleFlight()
+        calls = []
+        
+        async def compute(value):
+            calls.append(value)
+            await asyncio.sleep(0.05)
+            if value == 'bad':
+                raise ValueError(value)
+            return value
+            
+        async def main():
+            return await asyncio.gather(*[flights.ado('a', lambda: compute('a')) for _ in range(3)],
+                                        *[flights.ado('b', lambda: compute('bad')) for _ in range(2)],
+                                        return_exceptions=True)
+            
+        results = asyncio.run(main())
+        assert results[:3] == ['a', 'a', 'a']
+        assert all(isinstance(result, ValueError) for result in results[3:])
+        assert sorted(calls) == ['a', 'bad']
+        
+    def test_cancelled_waiter_leaves_run_to_others(self):
+        flights = SingleFlight()
+        
+        async def compute():
+            await asyncio.sleep(0.05)
+            return 'done'
+            
+        async def main():
+            first = asyncio.ensure_future(flights.ado('q', compute))
+            second = asyncio.ensure_future(flights.ado('q', compute))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+            
+        assert asyncio.run(main()) == 'done'
+        
+    def test_coalesced_queries_keep_case_and_get_own_result(self):
+        orchestrator = RAGOrchestrator.__new__(RAGOrchestrator)
+        orchestrator.corpus_version = 0
+        orchestrator.query_flights = SingleFlight()
+        orchestrator._process_query = MagicMock(return_value={'response': 'answer', 'degradations': []})
+        
+        assert orchestrator._flight_key(" What is  E4012?", 5, 0) == orchestrator._flight_key("What is E4012?", 5, 0)
+        assert orchestrator._flight_key("What is E4012?", 5, 0) != orchestrator._flight_key("what is e4012?", 5, 0)
+        
+        first = orchestrator.process_query("What is E4012?", 5, 0)
+        first['response'] = 'changed'
+        assert orchestrator.process_query("What is E4012?", 5, 0)['response'] == 'answer'
+        
+class TestPriorityScheduler:
+    def scheduler(self, capacity, ingest_limit, query_queue=0):
+        return PriorityScheduler(capacity, {QUERY: capacity, INGEST: ingest_limit}, {QUERY: query_queue, INGEST: 0})
+        
+    def test_queries_overtake_queued_ingestion(self):
+        scheduler = self.scheduler(capacity=1, ingest_limit=1)
+        scheduler.acquire(INGEST)
+        order = []
+        
+        def run(name):
+            with scheduler.slot(name):
+                order.append(name)
+                
+        threads = [threading.Thread(target=run, args=(name,)) for name in (INGEST, QUERY)]
+        for thread, name in zip(threads, (INGEST, QUERY)):
+            thread.start()
+            while scheduler.stats()[name]['queued'] < 1:
+                time.sleep(0.01)
+        scheduler.release(INGEST)
+        for thread in threads:
+            thread.join()
+        assert order == [QUERY, INGEST]
+        
+    def test_ingestion_limit_leaves_slots_for_queries(self):
+        scheduler = self.scheduler(capacity=2, ingest_limit=1)
+        scheduler.acquire(INGEST)
+        waiting = threading.Thread(target=scheduler.acquire, args=(INGEST,))
+        waiting.start()
+        while scheduler.stats()[INGEST]['queued'] < 1:
+            time.sleep(0.01)
+        # The free slot is not taken by the queued ingestion batch
+        scheduler.acquire(QUERY)
+        assert scheduler.stats()[QUERY]['running'] == 1
+        scheduler.release(INGEST)
+        waiting.join()
+        assert scheduler.stats()[INGEST]['running'] == 1
+        
+    def test_full_queue_sheds_requests(self):
+        scheduler = self.scheduler(capacity=1, ingest_limit=1, query_queue=1)
+        
+        async def main():
+            await scheduler.aacquire(QUERY)
+            queued = asyncio.ensure_future(scheduler.aacquire(QUERY))
+            await asyncio.sleep(0.01)
+            with pytest.raises(BusyError):
+                await scheduler.aacquire(QUERY)
+            # A cancelled waiter leaves the queue
+            queued.cancel()
+            await asyncio.sleep(0.01)
+            assert scheduler.stats()[QUERY]['queued'] == 0
+            scheduler.release(QUERY)
+            
+        asyncio.run(main())
+        stats = scheduler.stats()[QUERY]
+        assert stats['shed'] == 1 and stats['running'] == 0